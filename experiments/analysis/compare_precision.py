@@ -0,0 +1,48 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+import numpy as np
+import rstn
+
+# =========================================================================
+# 倍精度 (RSTNBox) と単精度 (RSTNBoxF32) の乖離を計測する
+# 同じ seed・同じ入力で両エンジンを実行し、最終状態の差を集計する
+# =========================================================================
+N = 32
+SEED = 42
+TARGET_F = 25.0
+
+# (学習ステップ数, 推論ステップ数)
+SCHEDULES = [(0, 200), (100, 100), (1000, 200), (3000, 200)]
+
+
+def run_pair(learn_steps, infer_steps):
+    indices = np.arange(N * N, dtype=np.int32)
+    inputs = (indices, np.full(N * N, 100.0), np.full(N * N, TARGET_F))
+
+    states = []
+    for cls in (rstn.RSTNBox, rstn.RSTNBoxF32):
+        box = cls(N, seed=SEED)
+        if learn_steps > 0:
+            box.run(learn_steps, inputs=inputs, is_learning=True)
+        if infer_steps > 0:
+            box.run(infer_steps, inputs=inputs, is_learning=False)
+        states.append((np.array(box.get_amplitudes(), dtype=np.float64),
+                       np.array(box.get_frequencies(), dtype=np.float64)))
+    return states
+
+
+if __name__ == "__main__":
+    print(f"N={N}, seed={SEED}, input={TARGET_F}Hz on Z=0")
+    print(f"{'learn':>6} {'infer':>6} | {'amp max':>10} {'amp rel':>10} | "
+          f"{'f max':>10} {'f median':>10} | {'diverged':>8}")
+    for learn_steps, infer_steps in SCHEDULES:
+        (a64, f64), (a32, f32) = run_pair(learn_steps, infer_steps)
+        da = np.abs(a64 - a32)
+        df = np.abs(f64 - f32)
+        active = np.abs(a64) > 1e-6
+        rel = (da[active] / np.abs(a64[active])).max() if active.any() else 0.0
+        # 閾値 (不感帯・転生) の判定が反転して別の軌道に移ったノードの割合
+        diverged = np.mean(df > 1e-2)
+        print(f"{learn_steps:>6} {infer_steps:>6} | {da.max():>10.3e} {rel:>10.3e} | "
+              f"{df.max():>10.3e} {np.median(df):>10.3e} | {diverged:>8.2%}")
@@ -0,0 +1,267 @@
+"""
+R-STN エンジンのベンチマーク
+
+N・スレッド数・入力パターン・学習/推論の組み合わせごとに box.run() の速度を計測し、
+steps/sec・ノード更新数/sec・実効メモリ帯域を JSON に書き出す。保存済みのベースラインと比較して
+速度低下 (回帰) を検出できる。ネイティブ版 (rstn/cpp_src/bench.cpp) も同じ条件・同じ形式で計測する。
+
+    # Python (rstn_cpp) で計測して保存
+    python experiments/benchmarks/bench_engine.py --threads 1 4 --out bench.json
+    # ベースラインと比較 (steps/sec が tolerance を超えて低下した条件があれば終了コード 1)
+    python experiments/benchmarks/bench_engine.py --threads 1 4 --baseline bench_base.json
+    # ネイティブ版で計測
+    python experiments/benchmarks/bench_engine.py --native ./rstn_bench --out bench_native.json
+    # 保存済みの結果どうしを比較
+    python experiments/benchmarks/bench_engine.py --compare bench.json bench_base.json
+
+スレッド数ごとに OMP_NUM_THREADS を設定した子プロセスで計測する。
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import numpy as np
+
+# steps を省略した場合、1 回の計測がおよそこのノード更新数になるよう N から決める (bench.cpp と同じ)
+NODE_BUDGET = 4.0e7
+
+INPUT_PATTERNS = ("point", "plane", "faces")
+MODES = ("learn", "infer")
+PRECISIONS = ("f64", "f32")
+KEY_FIELDS = ("precision", "n", "threads", "inputs", "mode")
+
+
+def make_inputs(pattern, n):
+    """
+    入力パターン (実験 Case の入力と同じ配置)
+      point: Z=0 中央の送信点と Z=N-1 の受信点 (Case 5 / 6)
+      plane: Z=0 面全体 (Case 1 / 3 / 4)
+      faces: X=0 面と X=N-1 面の対 (Case 2)
+    """
+    if pattern == "point":
+        c, t = n // 2, max(n - 4, 0)
+        indices = np.array([c + c * n, t + t * n + (n - 1) * n * n], dtype=np.int32)
+        freqs = np.full(2, 20.0)
+    elif pattern == "plane":
+        indices = np.arange(n * n, dtype=np.int32)
+        freqs = np.full(n * n, 25.0)
+    elif pattern == "faces":
+        zz, yy = np.meshgrid(np.arange(n), np.arange(n), indexing='ij')
+        base = (yy * n + zz * n * n).ravel()
+        indices = np.stack([base, base + (n - 1)], axis=1).ravel().astype(np.int32)
+        freqs = np.tile([-30.0, 30.0], n * n)
+    else:
+        raise ValueError(f"unknown input pattern: {pattern}")
+    return indices, np.full(indices.size, 100.0), freqs
+
+
+def bytes_per_update(value_bytes, learning):
+    """
+    1 ノード更新あたりの必須メモリ転送量 (各配列を 1 回ずつ読み書きするモデル, 近傍はキャッシュ上で再利用)
+      学習: 読み出し amp, f, v_f, fatigue, fatigue_limit, inactivity / 書き込み amp, f, v_f, fatigue, inactivity
+      推論: 読み出し amp, f / 書き込み amp
+    """
+    return 9 * value_bytes + 2 * 4 if learning else 3 * value_bytes
+
+
+def default_steps(n):
+    return max(10, min(1000, int(NODE_BUDGET / n ** 3)))
+
+
+def run_case(rstn_cpp, precision, n, threads, pattern, mode, steps, warmup, repeat):
+    cls = rstn_cpp.RSTNBox if precision == "f64" else rstn_cpp.RSTNBoxF32
+    learning = (mode == "learn")
+    steps = steps or default_steps(n)
+    inputs = make_inputs(pattern, n)
+
+    box = cls(n, seed=42)
+    if warmup > 0:
+        box.run(warmup, inputs=inputs, is_learning=learning)
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        box.run(steps, inputs=inputs, is_learning=learning)
+        times.append(time.perf_counter() - t0)
+    times.sort()
+
+    seconds = times[len(times) // 2]
+    updates = n ** 3 * steps / seconds
+    value_bytes = 8 if precision == "f64" else 4
+    return {
+        "precision": precision, "n": n, "threads": threads, "inputs": pattern, "mode": mode,
+        "steps": steps, "seconds": seconds, "seconds_min": times[0],
+        "steps_per_sec": steps / seconds,
+        "node_updates_per_sec": updates,
+        "bandwidth_gbs": updates * bytes_per_update(value_bytes, learning) / 1e9,
+    }
+
+
+def worker(args):
+    """1 つのスレッド数 (OMP_NUM_THREADS で設定済み) について全条件を計測し、結果を JSON で標準出力に書く"""
+    import rstn_cpp
+
+    results = []
+    for precision in args.precision:
+        for n in args.sizes:
+            for pattern in args.inputs:
+                for mode in args.modes:
+                    r = run_case(rstn_cpp, precision, n, args.threads[0], pattern, mode,
+                                 args.steps, args.warmup, args.repeat)
+                    print_row(r, file=sys.stderr)
+                    results.append(r)
+    json.dump({"kernel_variant": rstn_cpp.kernel_variant(), "results": results}, sys.stdout)
+
+
+def print_header(file=sys.stdout):
+    print(f"{'prec':<4} {'N':>5} {'threads':>7} {'inputs':>6} {'mode':>5} | "
+          f"{'steps/s':>10} {'updates/s':>12} {'GB/s':>8}", file=file)
+
+
+def print_row(r, file=sys.stdout):
+    print(f"{r['precision']:<4} {r['n']:>5} {r['threads']:>7} {r['inputs']:>6} {r['mode']:>5} | "
+          f"{r['steps_per_sec']:>10.1f} {r['node_updates_per_sec']:>12.4g} {r['bandwidth_gbs']:>8.2f}",
+          file=file, flush=True)
+
+
+def common_args(args):
+    out = ["--sizes", ",".join(map(str, args.sizes)),
+           "--inputs", ",".join(args.inputs),
+           "--modes", ",".join(args.modes),
+           "--precision", ",".join(args.precision),
+           "--warmup", str(args.warmup), "--repeat", str(args.repeat)]
+    if args.steps:
+        out += ["--steps", str(args.steps)]
+    return out
+
+
+def run_python(args):
+    results = []
+    kernel_variant = None
+    print_header(file=sys.stderr)
+    for threads in args.threads:
+        env = dict(os.environ, OMP_NUM_THREADS=str(threads))
+        cmd = [sys.executable, os.path.abspath(__file__), "--worker", "--threads", str(threads)] + common_args(args)
+        proc = subprocess.run(cmd, env=env, stdout=subprocess.PIPE, check=True, text=True)
+        out = json.loads(proc.stdout)
+        kernel_variant = out["kernel_variant"]
+        results += out["results"]
+    return {"driver": "python", "kernel_variant": kernel_variant}, results
+
+
+def run_native(args):
+    # 進捗の表は bench.cpp が標準エラー出力に書く
+    cmd = [args.native, "--threads", ",".join(map(str, args.threads))] + common_args(args) + ["--json", "-"]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, check=True, text=True)
+    out = json.loads(proc.stdout)
+    return out["meta"], out["results"]
+
+
+def compare(results, baseline, tolerance, file=sys.stdout):
+    """steps/sec をベースラインと比較し、tolerance を超えて低下した条件の数を返す"""
+    base = {tuple(r[k] for k in KEY_FIELDS): r for r in baseline["results"]}
+    for key in ("host", "cpu", "kernel_variant", "driver"):
+        a, b = results["meta"].get(key), baseline["meta"].get(key)
+        if a != b:
+            print(f"[warn] {key} differs from baseline: {a!r} vs {b!r}", file=file)
+
+    print(f"{'prec':<4} {'N':>5} {'threads':>7} {'inputs':>6} {'mode':>5} | "
+          f"{'steps/s':>10} {'baseline':>10} {'ratio':>7}", file=file)
+    regressions = 0
+    for r in results["results"]:
+        ref = base.get(tuple(r[k] for k in KEY_FIELDS))
+        if ref is None:
+            continue
+        ratio = r["steps_per_sec"] / ref["steps_per_sec"]
+        flag = ""
+        if ratio < 1.0 - tolerance:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{r['precision']:<4} {r['n']:>5} {r['threads']:>7} {r['inputs']:>6} {r['mode']:>5} | "
+              f"{r['steps_per_sec']:>10.1f} {ref['steps_per_sec']:>10.1f} {ratio:>7.3f}{flag}", file=file)
+    print(f"{regressions} regression(s) beyond {tolerance:.0%}", file=file)
+    return regressions
+
+
+def parse_list(values, cast=str):
+    """'16,32' と 16 32 のどちらの形式でも受け付ける"""
+    out = []
+    for v in values:
+        out += [cast(x) for x in str(v).split(",") if x]
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="R-STN engine benchmark")
+    parser.add_argument("--sizes", nargs="+", default=["16", "32", "64", "128"])
+    parser.add_argument("--threads", nargs="+", default=[str(os.cpu_count() or 1)])
+    parser.add_argument("--inputs", nargs="+", default=list(INPUT_PATTERNS))
+    parser.add_argument("--modes", nargs="+", default=list(MODES))
+    parser.add_argument("--precision", nargs="+", default=["f64"])
+    parser.add_argument("--steps", type=int, default=0, help="steps per measurement (default: from N)")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--quick", action="store_true", help="N = 16, 32 only")
+    parser.add_argument("--native", metavar="BIN", help="measure with the native benchmark binary (bench.cpp)")
+    parser.add_argument("--out", metavar="PATH", help="write results as JSON")
+    parser.add_argument("--baseline", metavar="PATH", help="compare against a stored result")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed slowdown (default 0.10)")
+    parser.add_argument("--compare", nargs=2, metavar=("RESULT", "BASELINE"), help="compare two stored results")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            results = json.load(f)
+        with open(args.compare[1]) as f:
+            baseline = json.load(f)
+        sys.exit(1 if compare(results, baseline, args.tolerance) else 0)
+
+    args.sizes = parse_list(args.sizes, int)
+    args.threads = parse_list(args.threads, int)
+    args.inputs = parse_list(args.inputs)
+    args.modes = parse_list(args.modes)
+    args.precision = parse_list(args.precision)
+    if args.quick:
+        args.sizes = [n for n in args.sizes if n <= 32] or [16]
+    for name, allowed in (("inputs", INPUT_PATTERNS), ("modes", MODES), ("precision", PRECISIONS)):
+        bad = set(getattr(args, name)) - set(allowed)
+        if bad:
+            parser.error(f"unknown {name}: {', '.join(sorted(bad))}")
+
+    if args.worker:
+        worker(args)
+        return
+
+    meta, results = run_native(args) if args.native else run_python(args)
+    meta.update({
+        "host": platform.node(),
+        "cpu": platform.processor() or platform.machine(),
+        "python": platform.python_version(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "warmup": args.warmup,
+        "repeat": args.repeat,
+    })
+    report = {"meta": meta, "results": results}
+
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+最適化エンジンと参照実装の差分検証
+
+ランダムな Box サイズ・パラメータ・入力スケジュール (学習/推論の切り替えを含む) を生成し、
+参照実装 (RSTNReferenceBox: 最適化なしで 1 ノードずつ計算) と最適化された各実行経路
+(命令セット別カーネル x 通常 / 空間ブロッキング / 時間方向ブロッキング / 疎ステップ / step() の逐次呼び出し,
+単精度版を含む) と NumPy バックエンド (rstn/numpy_backend.py) を同じ条件で実行し、一定ステップ毎に全フィールドを比較する。
+
+    python experiments/benchmarks/check_engines.py                   # 既定: 40 ケース x 300 ステップ
+    python experiments/benchmarks/check_engines.py --cases 200 --steps 1000 --seed 7
+    python experiments/benchmarks/check_engines.py --precision f64 --paths dense sparse
+
+最適化版は参照実装とビット単位で一致する前提のため、既定では完全一致を要求する。
+(-ffp-contract を外したビルドなど、丸めが変わることを承知で検証する場合は --rtol / --atol で許容誤差を与える)
+(NumPy バックエンドの単精度版のみ、非正規化数の範囲 (< 1.2e-38) の差を許容する)
+参照実装は 6 近傍のみのため、26 近傍・立方体・球の近傍 (set_stencil) のケースは NumPy バックエンドを基準にする。
+不一致があれば最初に食い違ったステップ・フィールド・ノード座標を表示し、終了コード 1 で終わる。
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import numpy as np
+import rstn_cpp
+from rstn import numpy_backend
+
+FIELDS = ("get_amplitudes", "get_frequencies", "get_velocities", "get_fatigue",
+          "get_fatigue_limits", "get_inactivity_counts")
+PATHS = ("dense", "step", "blocking", "temporal", "sparse", "numpy", "numpy_step")
+# 精度ごとの (最適化版, 参照実装, NumPy バックエンド)
+PRECISIONS = {
+    "f64": (rstn_cpp.RSTNBox, rstn_cpp.RSTNReferenceBox, numpy_backend.RSTNBox),
+    "f32": (rstn_cpp.RSTNBoxF32, rstn_cpp.RSTNReferenceBoxF32, numpy_backend.RSTNBoxF32),
+}
+
+
+def random_case(rng, steps):
+    """1 ケース分の条件 (サイズ・パラメータ・入力スケジュール・学習フラグ) を生成する"""
+    # 1 辺が 1 の退化した形状や 2 のべき乗でない辺も含める
+    shape = tuple(int(rng.choice([1, 2, 3, 4, 5, 7, 8, 12, 16])) for _ in range(3))
+    total = shape[0] * shape[1] * shape[2]
+
+    # 転生 (過労・不活動) やエイジングが検証期間中に起こりやすい範囲から選ぶ
+    lim_min = float(rng.uniform(20.0, 400.0))
+    params = {
+        "sigma_ex": float(rng.uniform(3.0, 20.0)),
+        "sigma_learn": float(rng.uniform(5.0, 40.0)),
+        "inertia": float(rng.uniform(0.5, 0.99)),
+        "viscosity": float(rng.uniform(0.2, 1.0)),
+        "dead_band": float(rng.uniform(0.1, 3.0)),
+        "c_load": float(rng.uniform(1.0, 30.0)),
+        "c_recover": float(rng.uniform(1.0, 20.0)),
+        "a_threshold": float(rng.uniform(0.1, 5.0)),
+        "a_limit": float(rng.uniform(50.0, 200.0)),
+        "attenuation": float(rng.uniform(0.0, 0.5)),
+        "gauss_mode": "FAST_EXP" if rng.random() < 0.3 else "LUT",
+        "lut_step": float(rng.choice([0.05, 0.1, 0.25])),
+        "fatigue_lim_min": lim_min,
+        "fatigue_lim_max": lim_min + float(rng.uniform(0.0, 400.0)),
+        "max_steps": int(rng.integers(max(steps // 4, 1), steps * 2 + 1)),
+        "inactivity_limit": int(rng.integers(2, 40)),
+    }
+
+    # 入力: (steps, K) の配列。固定の入力ノード (周波数は小さく揺らす) を基本とし、
+    # ランダムなノードへの入力・-1 のパディング・同じノードへの重複・入力のないステップを混ぜる
+    k = int(rng.integers(1, min(total, 8) + 1))
+    sources = rng.choice(total, size=k, replace=False).astype(np.int32)
+    indices = np.tile(sources, (steps, 1))
+    scatter = rng.random((steps, k)) < 0.1
+    indices[scatter] = rng.integers(-1, total, size=int(scatter.sum()))
+    indices[rng.random(steps) < 0.05] = -1
+    if k > 1:
+        indices[:, -1] = np.where(rng.random(steps) < 0.1, indices[:, 0], indices[:, -1])
+    amps = rng.uniform(50.0, 150.0, size=k) * rng.choice([-1.0, 1.0], size=(steps, k))
+    freqs = rng.uniform(-40.0, 40.0, size=k) + rng.normal(0.0, 2.0, size=(steps, k))
+
+    # 学習フラグ: 学習と推論の区間を交互に並べる
+    learning = np.empty(steps, dtype=bool)
+    s, flag = 0, True
+    while s < steps:
+        length = int(rng.integers(1, max(steps // 3, 2)))
+        learning[s:s + length] = flag
+        s += length
+        flag = not flag
+
+    # 近傍の形状: 多くは既定の 6 近傍、一部で 26 近傍・半径 r の立方体 / 球
+    stencil = ("von_neumann", 1)
+    if rng.random() < 0.3:
+        kind = str(rng.choice(["moore", "cube", "sphere"]))
+        stencil = (kind, 1 if kind == "moore" else int(rng.integers(1, 4)))
+
+    return {"shape": shape, "params": params, "seed": int(rng.integers(0, 2 ** 31)),
+            "inputs": (indices, amps, freqs), "learning": learning, "stencil": stencil}
+
+
+def make_box(cls, case):
+    nx, ny, nz = case["shape"]
+    box = cls(nx, ny, nz, seed=case["seed"])
+    for name, value in case["params"].items():
+        if name == "gauss_mode":
+            value = type(box.params.gauss_mode).__members__[value]   # バックエンドごとの列挙型
+        setattr(box.params, name, value)
+    box.update_tables()
+    box.reset_states()   # 初期化範囲 (fatigue_lim_*) の変更を反映する
+    if case["stencil"][0] != "von_neumann":
+        box.set_stencil(*case["stencil"])
+    return box
+
+
+def configure(box, path, rng):
+    """実行経路ごとの設定 (タイルサイズなどもランダムに選ぶ)"""
+    if path == "blocking":
+        box.set_blocking(True, int(rng.integers(0, 4)), int(rng.integers(0, 4)), 1)
+    elif path == "temporal":
+        box.set_blocking(True, int(rng.integers(0, 5)), int(rng.integers(0, 5)), int(rng.integers(2, 6)))
+    elif path == "sparse":
+        box.set_sparse(True, float(rng.choice([0.25, 0.5, 1.0])))
+
+
+def advance(box, path, inputs, learning, begin, end):
+    """
+    ステップ [begin, end) を実行する (参照実装と "step" / "numpy_step" 経路は 1 ステップずつ step() を呼ぶ)
+    "step" / "numpy_step" 経路は配列形式 step(indices, amps, freqs, is_learning) と
+    リスト形式 step([(index, (amp, freq)), ...], is_learning) を 1 ステップ毎に交互に使う
+    """
+    indices, amps, freqs = inputs
+    if path == "ref":
+        for s in range(begin, end):
+            box.step(indices[s], amps[s], freqs[s], bool(learning[s]))
+    elif path in ("step", "numpy_step"):
+        for s in range(begin, end):
+            if s % 2 == 0:
+                box.step(indices[s], amps[s], freqs[s], bool(learning[s]))
+            else:
+                pairs = [(int(i), (float(a), float(f))) for i, a, f in zip(indices[s], amps[s], freqs[s])]
+                box.step(pairs, bool(learning[s]))
+    else:
+        box.run(end - begin, inputs=(indices[begin:end], amps[begin:end], freqs[begin:end]),
+                is_learning=learning[begin:end])
+
+
+def compare(ref, box, rtol, atol):
+    """全フィールドを比較し、最初の不一致 (フィールド名, ノード番号, 参照値, 実測値) を返す"""
+    for field in FIELDS:
+        expected = getattr(ref, field)()
+        actual = getattr(box, field)()
+        if rtol == 0.0 and atol == 0.0:
+            # NaN 同士も一致とみなす (参照実装と同じ経路で NaN になった場合)
+            bad = (expected != actual) & ~(np.isnan(expected) & np.isnan(actual)) \
+                if expected.dtype.kind == 'f' else expected != actual
+        else:
+            bad = ~np.isclose(actual, expected, rtol=rtol, atol=atol, equal_nan=True)
+        if bad.any():
+            i = int(np.flatnonzero(bad)[0])
+            return field, i, expected[i], actual[i], int(bad.sum())
+    return None
+
+
+def check_case(case_id, case, precision, paths, variants, check_every, rtol, atol, rng):
+    box_cls, ref_cls, numpy_cls = PRECISIONS[precision]
+    inputs, learning = case["inputs"], case["learning"]
+    # 参照実装は 6 近傍のみのため、それ以外の形状は NumPy バックエンド (同じ加算順序) を基準にする
+    numpy_ref = case["stencil"][0] != "von_neumann"
+    if numpy_ref:
+        ref_cls = numpy_cls
+        paths = [p for p in paths if not p.startswith("numpy")]
+    steps = learning.size
+
+    # 参照実装を一度だけ進め、比較点ごとの状態を控えておく
+    ref = make_box(ref_cls, case)
+    checkpoints = list(range(check_every, steps, check_every)) + [steps]
+    ref_states = []
+    s = 0
+    for end in checkpoints:
+        advance(ref, "ref", inputs, learning, s, end)
+        ref_states.append(_Snapshot(ref))
+        s = end
+
+    failures = 0
+    for variant in variants:
+        rstn_cpp.set_kernel_variant(variant)
+        for path in paths:
+            if path.startswith("numpy") and variant != variants[0]:
+                continue   # 命令セットに依存しないため 1 回のみ
+            box = make_box(numpy_cls if path.startswith("numpy") else box_cls, case)
+            # NumPy の単精度演算は非正規化数を 0 に丸めない (C++ 版は FTZ/DAZ) ため、その範囲の差のみ許容する
+            path_atol = atol
+            if (path.startswith("numpy") or numpy_ref) and precision == "f32":
+                path_atol = max(atol, float(np.finfo(np.float32).tiny))
+            configure(box, path, rng)
+            s = 0
+            for end, snap in zip(checkpoints, ref_states):
+                advance(box, path, inputs, learning, s, end)
+                s = end
+                diff = compare(snap, box, rtol, path_atol)
+                if diff:
+                    field, i, expected, actual, count = diff
+                    nx, ny, _ = case["shape"]
+                    x, y, z = i % nx, (i // nx) % ny, i // (nx * ny)
+                    print(f"  MISMATCH case {case_id} [{precision} {'-' if path.startswith('numpy') else variant} {path}] after step {end}: "
+                          f"{field} at (x={x}, y={y}, z={z}) expected {expected!r} got {actual!r} "
+                          f"({count} nodes differ)")
+                    failures += 1
+                    break
+    return failures
+
+
+class _Snapshot:
+    """参照実装の状態のコピー (box と同じ get_* で参照できる)"""
+
+    def __init__(self, box):
+        self.fields = {field: np.array(getattr(box, field)(), copy=True) for field in FIELDS}
+
+    def __getattr__(self, name):
+        if name in FIELDS:
+            return lambda: self.fields[name]
+        raise AttributeError(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Differential check of optimized engines against the reference")
+    parser.add_argument("--cases", type=int, default=40)
+    parser.add_argument("--steps", type=int, default=300)
+    parser.add_argument("--check-every", type=int, default=25, help="compare all fields every N steps")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--precision", nargs="+", default=list(PRECISIONS), choices=list(PRECISIONS))
+    parser.add_argument("--paths", nargs="+", default=list(PATHS), choices=list(PATHS))
+    parser.add_argument("--variants", nargs="+", default=None,
+                        help="kernel variants to check (default: all available)")
+    parser.add_argument("--rtol", type=float, default=0.0)
+    parser.add_argument("--atol", type=float, default=0.0)
+    args = parser.parse_args()
+
+    variants = args.variants or rstn_cpp.available_kernel_variants()
+    original_variant = rstn_cpp.kernel_variant()
+    rng = np.random.default_rng(args.seed)
+    print(f"variants: {', '.join(variants)} | paths: {', '.join(args.paths)} | "
+          f"precision: {', '.join(args.precision)} | {args.cases} cases x {args.steps} steps")
+
+    failures = 0
+    t0 = time.perf_counter()
+    try:
+        for case_id in range(args.cases):
+            case = random_case(rng, args.steps)
+            for precision in args.precision:
+                failures += check_case(case_id, case, precision, args.paths, variants,
+                                       args.check_every, args.rtol, args.atol, rng)
+            nx, ny, nz = case["shape"]
+            stencil = case["stencil"][0] + ("" if case["stencil"][0] in ("von_neumann", "moore") else f"(r={case['stencil'][1]})")
+            print(f"case {case_id:>3}: {nx}x{ny}x{nz} seed={case['seed']} stencil={stencil} "
+                  f"gauss={case['params']['gauss_mode']} learn={case['learning'].mean():.0%} "
+                  f"-> {'ok' if failures == 0 else f'{failures} failure(s) so far'}", flush=True)
+    finally:
+        rstn_cpp.set_kernel_variant(original_variant)
+
+    print(f"{failures} mismatch(es) in {time.perf_counter() - t0:.1f} s")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
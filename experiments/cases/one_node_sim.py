@@ -9,12 +9,12 @@ from matplotlib.animation import FuncAnimation
 
 # rstnモジュールを正しくインポートするための設定
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
-import rstn_cpp
+import rstn
 
 def run_ultimate_lifecycle_v3():
     # --- 1. 物理パラメータの設定 ---
     # 質量 0.99, 粘性 0.35 (ゲル状) のノードを生成 (Box size=1 で代用)
-    box = rstn_cpp.RSTNBox(1, seed=123)
+    box = rstn.RSTNBox(1, seed=123)
     
     # パラメータ設定 (C++版のパラメータオブジェクト経由)
     box.params.inertia = 0.99
@@ -8,7 +8,7 @@ import numpy as np
 
 # rstnモジュールを正しくインポートするための設定
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
-import rstn_cpp
+import rstn
 
 class RSTNDualReporter:
     def __init__(self):
@@ -54,7 +54,7 @@ class RSTNDualReporter:
                 print(f"\n[Processing Phase {p_id}: {p_name} ({mode_str})]")
                 
                 # node_id=0 で個体初期化 (Box size=1)
-                box = rstn_cpp.RSTNBox(1, seed=master_seed)
+                box = rstn.RSTNBox(1, seed=master_seed)
                 box.params.inertia = 0.99
                 box.params.viscosity = 0.35
                 box.params.dead_band = 1.0 
@@ -3,22 +3,21 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 import time
 import numpy as np
-import rstn_cpp
+import rstn
 
 def run(size=32):
-    box = rstn_cpp.RSTNBox(size, seed=42)
+    box = rstn.RSTNBox(size, seed=42)
     history_f, history_a = [], []
     compute_times = []
-    input_indices = range(size * size)
+    # 入力面 (Z=0) 全体に 25Hz を注入 (NumPy 配列で一度だけ生成)
+    input_indices = np.arange(size * size, dtype=np.int32)
+    input_amps = np.full(size * size, 100.0)
+    input_freqs = np.full(size * size, 25.0)
     accum_t = 0.0
     
     for s in range(400):
-        # Python版: {i: (100.0, 25.0)}
-        # C++版: [(i, (100.0, 25.0)), ...]
-        inputs = [(i, (100.0, 25.0)) for i in input_indices]
-        
         t0 = time.perf_counter()
-        box.step(inputs, is_learning=True)
+        box.step(input_indices, input_amps, input_freqs, is_learning=True)
         t1 = time.perf_counter()
         
         accum_t += (t1 - t0)
@@ -3,25 +3,24 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 import time
 import numpy as np
-import rstn_cpp
+import rstn
 
 def run(size=32):
-    box = rstn_cpp.RSTNBox(size, seed=42)
+    box = rstn.RSTNBox(size, seed=42)
     history_f, history_a = [], []
     compute_times = []
     accum_t = 0.0
+
+    # X=0 面に -30Hz, X=N-1 面に +30Hz (NumPy 配列で一度だけ生成)
+    zz, yy = np.meshgrid(np.arange(size), np.arange(size), indexing='ij')
+    base = (yy * size + zz * size**2).ravel()
+    input_indices = np.stack([base, base + (size - 1)], axis=1).ravel().astype(np.int32)
+    input_amps = np.full(input_indices.size, 100.0)
+    input_freqs = np.tile([-30.0, 30.0], base.size)
     
     for s in range(400):
-        inputs = []
-        for z in range(size):
-            for y in range(size):
-                idx1 = 0 + y*size + z*(size**2)
-                idx2 = (size-1) + y*size + z*(size**2)
-                inputs.append((idx1, (100.0, -30.0)))
-                inputs.append((idx2, (100.0, 30.0)))
-        
         t0 = time.perf_counter()
-        box.step(inputs, is_learning=True)
+        box.step(input_indices, input_amps, input_freqs, is_learning=True)
         t1 = time.perf_counter()
         
         accum_t += (t1 - t0)
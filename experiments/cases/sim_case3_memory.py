@@ -3,21 +3,24 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 import time
 import numpy as np
-import rstn_cpp
+import rstn
 
 def run(size=32):
-    box = rstn_cpp.RSTNBox(size, seed=42)
+    box = rstn.RSTNBox(size, seed=42)
     history_f, history_a = [], []
     compute_times = []
-    input_indices = range(size * size)
+    input_indices = np.arange(size * size, dtype=np.int32)
+    input_amps = np.full(size * size, 100.0)
+    input_freqs = np.full(size * size, 15.0)
+    no_input = (np.empty(0, dtype=np.int32), np.empty(0), np.empty(0))
     accum_t = 0.0
     
     for s in range(400):
         # s < 200 の時だけ入力
-        inputs = [(i, (100.0, 15.0)) for i in input_indices] if s < 200 else []
+        inputs = (input_indices, input_amps, input_freqs) if s < 200 else no_input
         
         t0 = time.perf_counter()
-        box.step(inputs, is_learning=True)
+        box.step(*inputs, is_learning=True)
         t1 = time.perf_counter()
         
         accum_t += (t1 - t0)
@@ -3,35 +3,58 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 import time
 import numpy as np
-import rstn_cpp
+import rstn
+
+# 推論は振幅が収束した時点 (1 ステップでの振幅の変化量の最大値 <= INFER_TOL) で打ち切る (最大 200 ステップ)
+# 打ち切った後のフレームは収束時のフレームで埋めて 400 フレームに揃え、実際に計算した推論ステップ数は infer_steps に保存する
+INFER_TOL = 1e-3
 
 def run(size=32):
-    box = rstn_cpp.RSTNBox(size, seed=42)
+    box = rstn.RSTNBox(size, seed=42)
     history_f, history_a = [], []
     compute_times = []
-    input_indices = range(size * size)
+    input_indices = np.arange(size * size, dtype=np.int32)
+    input_amps = np.full(size * size, 100.0)
+    learn_freqs = np.full(size * size, 20.0)
+    infer_freqs = np.full(size * size, -40.0)
     accum_t = 0.0
+    infer_steps = 0
     
     for s in range(400):
         is_learn = (s < 200)
-        freq = 20.0 if is_learn else -40.0
-        inputs = [(i, (100.0, freq)) for i in input_indices]
+        freqs = learn_freqs if is_learn else infer_freqs
         
         t0 = time.perf_counter()
-        box.step(inputs, is_learning=is_learn)
+        if is_learn:
+            box.step(input_indices, input_amps, freqs, is_learning=True)
+        else:
+            field, _, residual = box.infer_until_converged((input_indices, input_amps, freqs),
+                                                           tol=INFER_TOL, max_steps=1)
+            infer_steps += 1
         t1 = time.perf_counter()
         
         accum_t += (t1 - t0)
         history_f.append(box.get_frequencies().copy())
-        history_a.append(box.get_amplitudes().copy())
+        history_a.append(box.get_amplitudes().copy() if is_learn else field)
         compute_times.append(accum_t)
 
+        if not is_learn and residual <= INFER_TOL:
+            print(f"Case4 inference converged after {infer_steps} steps (max change {residual:.2e})")
+            break
+
+    # 収束後は振幅がほぼ変わらないため、最後のフレームを繰り返す (可視化側のステップ番号を保つ)
+    pad = 400 - len(history_a)
+    history_f += [history_f[-1]] * pad
+    history_a += [history_a[-1]] * pad
+    compute_times += [accum_t] * pad
+
     np.savez("case4_data.npz", 
              freqs=np.array(history_f, dtype=np.float32), 
              amps=np.array(history_a, dtype=np.float32), 
              compute_times=np.array(compute_times), 
              name="Case4_Inference", 
-             size=size)
+             size=size,
+             infer_steps=infer_steps)
     print(f"Case4 Finished. Compute Time: {accum_t:.6f}s")
 
 if __name__ == "__main__":
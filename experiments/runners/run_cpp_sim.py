@@ -2,8 +2,9 @@ import os
 import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
-import rstn_cpp
+import rstn
 import numpy as np
+from experiments import tracing
 import time
 import math
 
@@ -37,6 +38,18 @@ def calc_stats_str(box):
     return active_count, max_amp, avg_fat
 
 
+def print_profile(box):
+    """ step 内部のフェーズ別の所要時間を表示する (計測を除去したビルドや NumPy バックエンドでは何もしない) """
+    profile = box.profile
+    if not profile:
+        return
+    print(f"\n  {'Phase':<9} | {'Calls':>6} | {'Total':>10} | {'Per call':>10} | {'Imbalance':>9}")
+    for name, st in profile.items():
+        imbalance = f"{st['imbalance']:9.2f}" if 'imbalance' in st else f"{'---':>9}"
+        print(f"  {name:<9} | {st['calls']:6d} | {st['seconds']*1000:7.1f} ms | "
+              f"{st['seconds']/st['calls']*1e6:7.1f} us | {imbalance}")
+
+
 def setup_params(box, mode="SuperConductive"):
     """ 
     物理パラメータの一括設定 
@@ -85,10 +98,10 @@ def run_case6_discrete():
     というサイクルを自動化する。
     """
     case_name = "Case6_Discrete"
-    print(f"\n=== Running {case_name} (N={N}) ===")
+    print(f"\n=== Running {case_name} (N={N}, backend={rstn.backend_name()}) ===")
     
     # 1. Box初期化
-    box = rstn_cpp.RSTNBox(N, seed=42)
+    box = rstn.RSTNBox(N, seed=42)
     
     # 2. パラメータ適用 (超伝導モード)
     setup_params(box, mode="SuperConductive")
@@ -110,7 +123,8 @@ def run_case6_discrete():
     # 各フェーズの持続カウンタ
     phase_timer = 0
     LEARN_DURATION = 150  # 学習にかける固定ステップ数
-    INFER_DURATION = 50   # 推論データを取るステップ数
+    INFER_DURATION = 50   # 推論データを取る最大ステップ数
+    INFER_TOL = 1e-3      # 推論の収束判定 (1 ステップでの振幅の変化量の最大値がこれ以下なら打ち切る)
     
     # データ保存用
     history_f = []
@@ -124,6 +138,20 @@ def run_case6_discrete():
     # 無限ループ防止用の安全リミット
     MAX_TOTAL_STEPS = 2000 
     s = 0
+
+    # 保存待ちのスナップショット (次のステップの計算中にコピーする)
+    pending_save = None
+
+    def flush_save():
+        nonlocal pending_save
+        if pending_save is None:
+            return
+        snap, t = pending_save
+        with tracing.span("snapshot"):
+            history_f.append(snap.get_frequencies().copy())
+            history_a.append(snap.get_amplitudes().copy())
+            compute_times.append(t)
+        pending_save = None
     
     # --- メインループ ---
     while s < MAX_TOTAL_STEPS:
@@ -174,7 +202,22 @@ def run_case6_discrete():
             if avg_f < COOLING_THRESHOLD:
                 phase = "INFER"
                 phase_timer = 0
-                
+            else:
+                # ログ・保存のないステップはまとめて進める (残響が消えた後は C++ 側で早送りされる)
+                gap = 0
+                while (s + gap < MAX_TOTAL_STEPS and (s + gap) % LOG_INTERVAL != 0
+                       and (s + gap) % SAVE_INTERVAL != 0):
+                    gap += 1
+                if gap > 0:
+                    flush_save()
+                    t0 = time.perf_counter()
+                    with tracing.span("advance_until_quiet", step=s):
+                        n = box.advance_until_quiet(
+                            lambda b: np.mean(b.get_fatigue()) < COOLING_THRESHOLD, max_steps=gap)
+                    accum_time += time.perf_counter() - t0
+                    s += n
+                    continue
+
         elif phase == "INFER":
             # -------------------------------------------------
             # 推論フェーズ: 入力あり(-40Hz), 学習OFF
@@ -190,9 +233,28 @@ def run_case6_discrete():
             # inputs.append((idx_tgt, (100.0, -40.0)))
             
             status_str = f"INFER (-40Hz)"
-            
-            phase_timer += 1
-            if phase_timer >= INFER_DURATION:
+
+            # ログ・保存のないステップは infer_until_converged でまとめて進め、振幅が収束したら推論を打ち切る
+            gap = 0
+            while (gap < INFER_DURATION - phase_timer and (s + gap) % LOG_INTERVAL != 0
+                   and (s + gap) % SAVE_INTERVAL != 0):
+                gap += 1
+            converged = False
+            if gap > 0:
+                flush_save()
+                infer_inputs = (np.array([i for i, _ in inputs], dtype=np.int32),
+                                np.array([v[0] for _, v in inputs]),
+                                np.array([v[1] for _, v in inputs]))
+                t0 = time.perf_counter()
+                with tracing.span("infer_until_converged", step=s):
+                    _, n, residual = box.infer_until_converged(infer_inputs, tol=INFER_TOL, max_steps=gap)
+                accum_time += time.perf_counter() - t0
+                s += n
+                phase_timer += n
+                converged = residual <= INFER_TOL
+            else:
+                phase_timer += 1
+            if converged or phase_timer >= INFER_DURATION:
                 # 推論終了 -> 次のターゲットへ
                 target_idx += 1
                 if target_idx >= len(targets):
@@ -202,10 +264,16 @@ def run_case6_discrete():
                 # 次のターゲットへ向けて学習開始
                 phase = "LEARN"
                 phase_timer = 0
+            if gap > 0:
+                continue
 
         # --- 物理演算 (C++ Backend) ---
+        # ステップはワーカースレッドで進め、その間に前回のステップ後の状態 (スナップショット) を保存する
         t0 = time.perf_counter()
-        box.step(inputs, is_learning=is_learning)
+        with tracing.span("step", step=s):
+            future = box.step_async(inputs, is_learning=is_learning, publish=(s % SAVE_INTERVAL == 0))
+            flush_save()
+            future.result()
         t1 = time.perf_counter()
         
         step_time = t1 - t0
@@ -215,27 +283,31 @@ def run_case6_discrete():
         if s % LOG_INTERVAL == 0:
             print(f"{s:5d} | {phase:>10} | {status_str:>20} | {step_time*1000:6.2f} ms | {act:7d} | {mx:6.1f} | {avg_f:6.1f}")
 
-        # --- データ保存 ---
+        # --- データ保存 (コピーは次のステップの計算中に行う) ---
         if s % SAVE_INTERVAL == 0:
-            history_f.append(box.get_frequencies().copy())
-            history_a.append(box.get_amplitudes().copy())
-            compute_times.append(accum_time)
+            pending_save = (box.snapshot(), accum_time)
             
         s += 1
 
+    flush_save()
+
+    # フェーズ別の計測値 (C++ 側で step 内部を計測)
+    print_profile(box)
+
     # .npzファイル書き出し
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
     DATA_DIR = os.path.join(BASE_DIR, "..", "data", "cpp_output")
     os.makedirs(DATA_DIR, exist_ok=True)
     save_path = os.path.join(DATA_DIR, f"{case_name}.npz")
     
-    np.savez(save_path, 
-             freqs=np.array(history_f, dtype=np.float32),
-             amps=np.array(history_a, dtype=np.float32),
-             compute_times=np.array(compute_times),
-             name=case_name,
-             size=N,
-             save_interval=SAVE_INTERVAL)
+    with tracing.span("save"):
+        np.savez(save_path,
+                 freqs=np.array(history_f, dtype=np.float32),
+                 amps=np.array(history_a, dtype=np.float32),
+                 compute_times=np.array(compute_times),
+                 name=case_name,
+                 size=N,
+                 save_interval=SAVE_INTERVAL)
     print(f"\n  Saved to {save_path}")
 
 
@@ -248,6 +320,9 @@ if __name__ == "__main__":
     DATA_DIR = os.path.join(BASE_DIR, "..", "data", "cpp_output")
     os.makedirs(DATA_DIR, exist_ok=True)
     
+    # RSTN_TRACE=<出力パス> で実行するとトレース (Chrome / Perfetto 形式) を書き出す
+    tracing.start_from_env()
+
     # Case 6 を実行 (保存先パスを調整する必要があるため関数側も少し修正が必要だが、
     # run_case6_discrete 内で data_cpp ハードコードがあるため修正する)
     run_case6_discrete()
\ No newline at end of file
@@ -2,11 +2,13 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
-import rstn_cpp
+import rstn
 import numpy as np
+from experiments import tracing
 import time
 import math
 import itertools
+import collections
 import concurrent.futures
 
 # =========================================================================
@@ -16,6 +18,12 @@ N = 32
 STEPS = 200
 DATA_DIR = "experiment_data"
 
+# 同時に進める Box の数と、Box ごとの OpenMP スレッド数 (環境変数で上書き可)
+# N=32 の Box は単体では数スレッドまでしか速くならないため、Box を並べてコアを埋める
+CPU_COUNT = os.cpu_count() or 1
+THREADS_PER_BOX = int(os.environ.get("RSTN_THREADS_PER_BOX", min(4, CPU_COUNT)))
+PARALLEL_BOXES = int(os.environ.get("RSTN_PARALLEL_BOXES", max(1, CPU_COUNT // THREADS_PER_BOX)))
+
 # ★保存判定の閾値 (Sticky Path基準)
 # 100点満点からの減点方式。
 # 経路が途切れると一気に30〜50点引かれるため、75点以上なら
@@ -80,6 +88,14 @@ def inputs_case5(s, size):
     inputs.append((idx_tgt, (100.0, 20.0)))
     return inputs
 
+def schedule_case5(size):
+    """inputs_case5 の全ステップ分を box.run 用の (T, K) 配列スケジュールに変換"""
+    rows = [inputs_case5(s, size) for s in range(STEPS)]
+    indices = np.array([[idx for idx, _ in row] for row in rows], dtype=np.int32)
+    amps = np.array([[a for _, (a, f) in row] for row in rows], dtype=np.float64)
+    freqs = np.array([[f for _, (a, f) in row] for row in rows], dtype=np.float64)
+    return indices, amps, freqs
+
 def get_filename(v, i, a, r):
     return f"Visc{v:.2f}_Inert{i:.2f}_Attn{a:.2f}_Res{r:02d}.npz"
 
@@ -166,9 +182,28 @@ def quick_evaluate(amps_np, size):
     
     return final_score
 
+def simulate_worker(idx, params, schedule):
+    """1 組のパラメータでシミュレーションと評価を行う (Box ごとに THREADS_PER_BOX スレッド, GIL は run 中解放)"""
+    with tracing.span("simulate", index=idx):
+        box = rstn.RSTNBox(N, seed=42, num_threads=THREADS_PER_BOX)
+        apply_params(box, params)
+
+        # 全ステップを C++ 内で一括実行し、毎ステップの振幅を記録
+        history_a, _ = box.run(STEPS, inputs=schedule, is_learning=True, record_every=1)
+
+    # --- 評価 ---
+    with tracing.span("to_float16"):
+        amps_np = history_a.astype(np.float16)
+
+    # グリア脳基準で評価
+    with tracing.span("evaluate"):
+        score = quick_evaluate(amps_np, N)
+    return amps_np, score
+
 def save_worker(filepath, payload):
     try:
-        np.savez_compressed(filepath, **payload)
+        with tracing.span("save", file=os.path.basename(filepath)):
+            np.savez_compressed(filepath, **payload)
         return True
     except Exception as e:
         print(f"[Error] Save failed for {filepath}: {e}")
@@ -196,52 +231,37 @@ def run_simulation_phase():
 
     stats = {"saved": 0, "rejected": 0}
 
-    # 非同期保存用Executor
-    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+    # 入力スケジュールはパラメータに依存しないため一度だけ生成
+    schedule = schedule_case5(N)
+
+    print(f"Parallel Boxes: {PARALLEL_BOXES} x {THREADS_PER_BOX} threads")
+
+    # シミュレーション用 (Box を並列に進める) と非同期保存用の Executor
+    with concurrent.futures.ThreadPoolExecutor(max_workers=PARALLEL_BOXES) as sim_executor, \
+         concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
         futures = []
+        # 実行中のシミュレーション (投入順に結果を処理する)
+        in_flight = collections.deque()
         start_time = time.time()
         print("Starting simulation... (Press Ctrl+C to abort)")
 
-        for idx, (a, r, i, v) in enumerate(combinations):
+        def handle_result(idx, current_params, sim_future):
+            nonlocal futures
+            a, r, i, v = (current_params[k] for k in ('attenuation', 'sigma_ex', 'inertia', 'viscosity'))
             filename = get_filename(v, i, a, int(r))
             filepath = os.path.join(DATA_DIR, filename)
+            amps_np, score = sim_future.result()
 
-            # 再開機能
-            if os.path.exists(filepath):
-                if idx % 500 == 0: print(f"[{idx+1}/{total}] Skip (Exists): {filename}")
-                continue
-
-            # --- シミュレーション ---
-            current_params = BASE_PARAMS.copy()
-            current_params['viscosity'] = v
-            current_params['inertia'] = i
-            current_params['attenuation'] = a
-            current_params['sigma_ex'] = r 
-
-            box = rstn_cpp.RSTNBox(N, seed=42)
-            apply_params(box, current_params)
-            
-            history_a = []
-            for s in range(STEPS):
-                inputs = inputs_case5(s, N)
-                box.step(inputs, is_learning=True)
-                history_a.append(box.get_amplitudes().copy())
-
-            # --- 評価 & 足切り ---
-            amps_np = np.array(history_a, dtype=np.float16)
-            
-            # グリア脳基準で評価
-            score = quick_evaluate(amps_np, N)
-            
             # ログ用コンテキスト文字列
             param_str = f"Attn={a:.2f} Res={int(r):02d} Inert={i:.2f} Visc={v:.2f}"
             
+            # --- 足切り ---
             if score < SAVE_THRESHOLD:
                 stats["rejected"] += 1
                 # 不合格ログ (間引いて表示)
                 if (idx + 1) % 200 == 0:
                      print(f"[{idx+1}/{total}] Rejected: {param_str} (Score {score:.1f})")
-                continue
+                return
 
             # --- 合格：非同期保存 ---
             stats["saved"] += 1
@@ -258,6 +278,9 @@ def run_simulation_phase():
             # メモリ掃除
             if len(futures) > 100:
                 futures = [f for f in futures if not f.done()]
+            # 保存待ちの件数 (増え続ける場合は保存がシミュレーションに追いついていない)
+            if tracing.enabled():
+                tracing.counter("pending_saves", sum(1 for f in futures if not f.done()))
 
             # --- 進捗ログ表示 ---
             if (idx + 1) % 50 == 0:
@@ -268,6 +291,30 @@ def run_simulation_phase():
                 
                 print(f"[{idx+1}/{total}] {param_str} | Saved: {stats['saved']} ({rate:.1f}%) | ETA: {eta/60:.1f} min")
 
+        for idx, (a, r, i, v) in enumerate(combinations):
+            filename = get_filename(v, i, a, int(r))
+            filepath = os.path.join(DATA_DIR, filename)
+
+            # 再開機能
+            if os.path.exists(filepath):
+                if idx % 500 == 0: print(f"[{idx+1}/{total}] Skip (Exists): {filename}")
+                continue
+
+            # --- シミュレーション (PARALLEL_BOXES 個を同時に実行) ---
+            current_params = BASE_PARAMS.copy()
+            current_params['viscosity'] = v
+            current_params['inertia'] = i
+            current_params['attenuation'] = a
+            current_params['sigma_ex'] = r 
+
+            in_flight.append((idx, current_params, sim_executor.submit(simulate_worker, idx, current_params, schedule)))
+            # 結果の処理待ちが溜まりすぎないよう、古いものから処理する
+            if len(in_flight) >= 2 * PARALLEL_BOXES:
+                handle_result(*in_flight.popleft())
+
+        while in_flight:
+            handle_result(*in_flight.popleft())
+
         print("Waiting for pending saves...")
     
     print("\nPhase 1 Complete.")
@@ -277,6 +324,8 @@ def run_simulation_phase():
 # メイン実行ブロック
 # =========================================================================
 if __name__ == "__main__":
+    # RSTN_TRACE=<出力パス> で実行するとトレース (Chrome / Perfetto 形式) を書き出す
+    tracing.start_from_env()
     run_simulation_phase()
     
     print("\n" + "="*50)
@@ -3,24 +3,20 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 import numpy as np
 import time
-import rstn_cpp
+import rstn
 
 # =========================================================================
 
 def run_experiment(size=4, steps=500, target_f=20.0, output_name="exp_data"):
-    box = rstn_cpp.RSTNBox(size, seed=42)
-    history_f, history_a = [], []
+    box = rstn.RSTNBox(size, seed=42)
     print(f"Running Experiment: Size={size}, Target={target_f}Hz, Steps={steps}")
 
     input_count = size * size
-    
-    for s in range(steps):
-        # 入力面 (Z=0) の N*N 個のノードに信号を注入
-        inputs = [(i, (100.0, target_f)) for i in range(input_count)]
-        box.step(inputs, is_learning=True)
-        
-        history_f.append(box.get_frequencies().copy())
-        history_a.append(box.get_amplitudes().copy())
+
+    # 入力面 (Z=0) の N*N 個のノードに信号を注入 (全ステップ共通の (K,) スケジュール)
+    indices = np.arange(input_count, dtype=np.int32)
+    inputs = (indices, np.full(input_count, 100.0), np.full(input_count, target_f))
+    history_a, history_f = box.run(steps, inputs=inputs, is_learning=True, record_every=1)
 
     np.savez(f"{output_name}.npz", 
              freqs=np.array(history_f, dtype=np.float32), 
@@ -0,0 +1,196 @@
+"""
+実行パイプラインのトレース (Chrome / Perfetto の JSON 形式)
+
+Python 側の処理 (シミュレーション・評価・保存・描画など) のスパンと、rstn_cpp エンジン内部の
+フェーズ (step / kernel など, OpenMP の各スレッドを含む) のスパンを 1 つのタイムラインにまとめて書き出す。
+出力ファイルは chrome://tracing または https://ui.perfetto.dev で開く。
+
+使い方:
+    from experiments import tracing
+
+    tracing.start()                      # 記録開始 (rstn_cpp が import 可能ならエンジン側も記録)
+    with tracing.span("evaluate", score=score):
+        ...
+    tracing.counter("pending_saves", len(futures))
+    tracing.save("trace.json")           # 記録を終了して書き出す
+
+スクリプトでは環境変数 RSTN_TRACE=<出力パス> を設定すると start_from_env() が記録を開始し、
+終了時に自動で書き出す。記録していない間の span() は何もしない。
+"""
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+
+_lock = threading.Lock()
+_events = []
+_enabled = False
+_engine = None          # 記録中の rstn_cpp モジュール (エンジン側のスパンを取り出す)
+_engine_offset_ns = 0   # エンジンの時計 -> time.monotonic_ns() への補正
+_thread_names = {}      # native_id -> スレッド名 (終了したスレッドの名前も残すため記録時に控える)
+
+
+def _now_ns():
+    return time.monotonic_ns()
+
+
+def enabled():
+    return _enabled
+
+
+def start(engine=True):
+    """記録を開始する (それまでの記録は破棄する)。engine=True なら rstn_cpp のスパンも記録する"""
+    global _enabled, _engine, _engine_offset_ns
+    with _lock:
+        _events.clear()
+        _thread_names.clear()
+    _engine = None
+    if engine:
+        try:
+            import rstn_cpp
+        except ImportError:
+            rstn_cpp = None
+        if rstn_cpp is not None and hasattr(rstn_cpp, "trace_start"):
+            # 両方の時計を続けて読み、エンジンの時刻をこちらの時計に合わせる
+            # (同じ時計 (Linux の CLOCK_MONOTONIC など) なら読み取り値が前後の間に収まるため補正しない)
+            before = _now_ns()
+            engine_now = rstn_cpp.trace_clock_ns()
+            after = _now_ns()
+            same_clock = before <= engine_now <= after
+            _engine_offset_ns = 0 if same_clock else (before + after) // 2 - engine_now
+            rstn_cpp.trace_start()
+            _engine = rstn_cpp
+    _enabled = True
+
+
+def _add(event):
+    with _lock:
+        _events.append(event)
+        if event["tid"] not in _thread_names:
+            _thread_names[event["tid"]] = threading.current_thread().name
+
+
+class span:
+    """with 文の範囲を 1 つのスパンとして記録する (args はトレースビューアの詳細欄に表示される)"""
+
+    __slots__ = ("name", "args", "t0")
+
+    def __init__(self, name, **args):
+        self.name = name
+        self.args = args
+        self.t0 = 0
+
+    def __enter__(self):
+        if _enabled:
+            self.t0 = _now_ns()
+        return self
+
+    def __exit__(self, *exc):
+        if _enabled and self.t0:
+            t1 = _now_ns()
+            event = {"name": self.name, "cat": "python", "ph": "X",
+                     "ts": self.t0 / 1000.0, "dur": (t1 - self.t0) / 1000.0,
+                     "tid": threading.get_native_id()}
+            if self.args:
+                event["args"] = {k: _jsonable(v) for k, v in self.args.items()}
+            _add(event)
+        return False
+
+
+def traced(name=None):
+    """関数の呼び出しをスパンとして記録するデコレータ"""
+    def decorator(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def counter(name, value):
+    """時系列の値 (キューの長さなど) を記録する"""
+    if not _enabled:
+        return
+    _add({"name": name, "cat": "python", "ph": "C", "ts": _now_ns() / 1000.0,
+          "tid": threading.get_native_id(), "args": {name: value}})
+
+
+def _jsonable(value):
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    try:
+        return float(value)    # NumPy のスカラーなど
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def stop():
+    """記録を終了し、Chrome トレース形式の dict を返す"""
+    global _enabled, _engine
+    _enabled = False
+    with _lock:
+        events = list(_events)
+        _events.clear()
+
+    dropped = 0
+    engine_tids = {}
+    if _engine is not None:
+        _engine.trace_stop()
+        spans, dropped = _engine.trace_collect()
+        for name, cat, tid, omp_thread, ts_ns, dur_ns in spans:
+            events.append({"name": name, "cat": cat, "ph": "X",
+                           "ts": (ts_ns + _engine_offset_ns) / 1000.0, "dur": dur_ns / 1000.0,
+                           "tid": tid})
+            engine_tids.setdefault(tid, omp_thread)
+        _engine = None
+
+    pid = os.getpid()
+    for event in events:
+        event["pid"] = pid
+
+    # スレッド名 (Python のスレッド名を優先し、エンジンのみが使ったスレッドは OpenMP の番号で表示)
+    with _lock:
+        names = dict(_thread_names)
+    seen = {event["tid"] for event in events}
+    for tid in sorted(seen):
+        label = names.get(tid)
+        if label is None:
+            label = f"omp-{engine_tids[tid]}" if tid in engine_tids else f"thread-{tid}"
+        events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": label}})
+
+    events.sort(key=lambda e: e.get("ts", 0.0))
+    trace = {"traceEvents": events, "displayTimeUnit": "ms"}
+    if dropped:
+        trace["otherData"] = {"rstn_cpp_dropped_events": dropped}
+    return trace
+
+
+def save(path):
+    """記録を終了して JSON に書き出す"""
+    trace = stop()
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(trace, f)
+    n_spans = sum(1 for e in trace["traceEvents"] if e.get("ph") == "X")
+    print(f"[trace] {n_spans} spans written to {path}")
+    return path
+
+
+def start_from_env(var="RSTN_TRACE"):
+    """環境変数 var に出力パスが設定されていれば記録を開始し、終了時に書き出す"""
+    path = os.environ.get(var)
+    if not path:
+        return False
+    start()
+
+    def _save_at_exit():
+        if _enabled:
+            save(path)
+    atexit.register(_save_at_exit)
+    return True
@@ -1,10 +1,12 @@
 import sys
 import numpy as np
 import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
+from experiments import tracing
 
 def visualize(file_path):
     if not os.path.exists(file_path): 
@@ -13,15 +15,16 @@ def visualize(file_path):
 
     print(f"Processing {file_path} ...")
     try:
-        loader = np.load(file_path)
-        freqs = loader['freqs'] 
-        amps = loader['amps']
-        fats = loader['fats'] if 'fats' in loader else np.zeros_like(amps)
-        times = loader['compute_times']
-        name = str(loader['name'])
-        size = int(loader['size'])
-        # 間引き間隔を取得（なければ1とみなす）
-        interval = int(loader['save_interval']) if 'save_interval' in loader else 1
+        with tracing.span("load", file=os.path.basename(file_path)):
+            loader = np.load(file_path)
+            freqs = loader['freqs']
+            amps = loader['amps']
+            fats = loader['fats'] if 'fats' in loader else np.zeros_like(amps)
+            times = loader['compute_times']
+            name = str(loader['name'])
+            size = int(loader['size'])
+            # 間引き間隔を取得（なければ1とみなす）
+            interval = int(loader['save_interval']) if 'save_interval' in loader else 1
     except Exception as e:
         print(f"Error loading {file_path}: {e}")
         return
@@ -44,6 +47,7 @@ def visualize(file_path):
     fig = plt.figure(figsize=(14, 10)) # 横幅を広げて情報スペース確保
     ax = fig.add_subplot(111, projection='3d')
 
+    @tracing.traced("render_frame")
     def save_frame(idx):
         ax.clear()
         
@@ -61,12 +65,12 @@ def visualize(file_path):
         active_ratio = (active_count / (size**3)) * 100.0
         
         # --- 描画 (軽量化のため閾値フィルタ) ---
-        mask = current_amps > 5.0
-        if np.any(mask):
+        with tracing.span("mask"):
+            mask = current_amps > 5.0
             c_d = coords[mask]
             f_d = current_freqs[mask]
             a_d = current_amps[mask]
-            
+        if np.any(mask):
             ax.scatter(c_d[:, 2], c_d[:, 1], c_d[:, 0],
                        c=f_d, s=a_d * 1.5,
                        cmap='coolwarm', vmin=-50, vmax=50,
@@ -107,7 +111,8 @@ def visualize(file_path):
         
         # 保存
         out_name = os.path.join(reports_dir, f"{name}_step{real_step:03d}.png")
-        plt.savefig(out_name, facecolor='black', bbox_inches='tight')
+        with tracing.span("savefig"):
+            plt.savefig(out_name, facecolor='black', bbox_inches='tight')
         print(f"  > Generated: {out_name} (Fatigue: {avg_fat:.1f})")
 
     # 全フレーム出力 (動画にするならここをループ)
@@ -120,6 +125,9 @@ def visualize(file_path):
     plt.close()
 
 if __name__ == "__main__":
+    # RSTN_TRACE=<出力パス> で実行するとトレース (Chrome / Perfetto 形式) を書き出す
+    tracing.start_from_env()
+
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
     target_dir = os.path.join(BASE_DIR, "..", "data", "cpp_output")
     if os.path.exists(target_dir):
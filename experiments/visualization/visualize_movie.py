@@ -1,11 +1,13 @@
 import numpy as np
 import os
 import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 import matplotlib
 matplotlib.use('Agg') # 画面表示せずバックグラウンドで描画
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 import matplotlib.animation as animation
+from experiments import tracing
 
 # === 設定 ===
 TARGET_FREQ = 20.0    # 可視化したいターゲット周波数
@@ -22,13 +24,14 @@ def create_movie(file_path):
 
     print(f"Creating movie for {file_path} ...")
     try:
-        loader = np.load(file_path)
-        freqs = loader['freqs'] 
-        amps = loader['amps']
-        times = loader['compute_times']
-        name = str(loader['name'])
-        size = int(loader['size'])
-        interval = int(loader['save_interval']) if 'save_interval' in loader else 1
+        with tracing.span("load", file=os.path.basename(file_path)):
+            loader = np.load(file_path)
+            freqs = loader['freqs']
+            amps = loader['amps']
+            times = loader['compute_times']
+            name = str(loader['name'])
+            size = int(loader['size'])
+            interval = int(loader['save_interval']) if 'save_interval' in loader else 1
     except Exception as e:
         print(f"Error loading {file_path}: {e}")
         return
@@ -56,7 +59,8 @@ def create_movie(file_path):
     # 背景色設定
     fig.patch.set_facecolor('black')
 
-    # フレーム更新関数
+    # フレーム更新関数 (描画結果のエンコードは anim.save 側で行われる)
+    @tracing.traced("render_frame")
     def update(frame_idx):
         real_step = frame_idx * interval
         current_amps = amps[frame_idx]
@@ -77,9 +81,10 @@ def create_movie(file_path):
 
         # --- 左画面: Target Path (特定周波数抽出) ---
         # TARGET_FREQ に近く、かつ活動しているノードのみ抽出
-        freq_mask = np.abs(current_freqs - TARGET_FREQ) < FREQ_TOLERANCE
-        amp_mask = current_amps > 2.0 # ノイズカット閾値
-        mask1 = freq_mask & amp_mask
+        with tracing.span("mask"):
+            freq_mask = np.abs(current_freqs - TARGET_FREQ) < FREQ_TOLERANCE
+            amp_mask = current_amps > 2.0 # ノイズカット閾値
+            mask1 = freq_mask & amp_mask
         
         if np.any(mask1):
             c = coords[mask1]
@@ -134,19 +139,24 @@ def create_movie(file_path):
         out_mp4 = f"{out_base}.mp4"
         print(f"\nSaving to {out_mp4} (High Quality)...")
         # bitrateを上げると画質向上
-        anim.save(out_mp4, writer='ffmpeg', fps=FPS, dpi=100, extra_args=['-vcodec', 'libx264', '-pix_fmt', 'yuv420p', '-b:v', '5000k'])
+        with tracing.span("encode", writer="ffmpeg"):
+            anim.save(out_mp4, writer='ffmpeg', fps=FPS, dpi=100, extra_args=['-vcodec', 'libx264', '-pix_fmt', 'yuv420p', '-b:v', '5000k'])
         print("Done!")
     except Exception as e:
         print(f"\nFFmpeg not found or failed ({e}). Falling back to GIF.")
         out_gif = f"{out_base}.gif"
         print(f"Saving to {out_gif} (may take time)...")
         # GIFは容量削減のためFPSを落とす
-        anim.save(out_gif, writer='pillow', fps=15, dpi=80)
+        with tracing.span("encode", writer="pillow"):
+            anim.save(out_gif, writer='pillow', fps=15, dpi=80)
         print("Done!")
 
     plt.close()
 
 if __name__ == "__main__":
+    # RSTN_TRACE=<出力パス> で実行するとトレース (Chrome / Perfetto 形式) を書き出す
+    tracing.start_from_env()
+
     # Case 5 or 6 のデータを探す
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
     target_dir = os.path.join(BASE_DIR, "..", "data", "cpp_output")
@@ -0,0 +1,72 @@
+"""
+R-STN エンジンのバックエンド選択
+
+    import rstn
+    box = rstn.RSTNBox(32, seed=42)      # 選択中のバックエンドの RSTNBox
+    rstn.backend_name()                  # 'cpp' / 'numpy'
+    rstn.set_backend("numpy")            # 以降の rstn.RSTNBox などは NumPy 版
+
+バックエンド:
+  cpp   : C++ 拡張 rstn_cpp (setup.py でビルド)
+  numpy : 純粋な NumPy 実装 (rstn/numpy_backend.py, 小さい N の実行・解析用)
+既定 ("auto") は rstn_cpp が import できれば cpp、できなければ numpy。
+環境変数 RSTN_BACKEND (cpp / numpy / auto) で import 時の選択を上書きできる。
+"""
+import importlib
+import os
+
+BACKENDS = ("cpp", "numpy")
+
+# バックエンドから再公開する名前 (rstn.RSTNBox などで参照できる)
+_EXPORTS = ("RSTNBox", "RSTNBoxF32", "RSTNParams", "GaussMode",
+            "kernel_variant", "available_kernel_variants", "PROFILE_ENABLED")
+
+_MODULES = {"cpp": "rstn_cpp", "numpy": "rstn.numpy_backend"}
+_backend = None
+_backend_name = None
+
+
+def load_backend(name="auto"):
+    """バックエンドのモジュールを返す (選択中のバックエンドは変更しない)"""
+    if name == "auto":
+        try:
+            return importlib.import_module(_MODULES["cpp"])
+        except ImportError:
+            return importlib.import_module(_MODULES["numpy"])
+    if name not in _MODULES:
+        raise ValueError(f"unknown backend: {name!r} (expected one of {', '.join(BACKENDS)} or 'auto')")
+    return importlib.import_module(_MODULES[name])
+
+
+def set_backend(name="auto"):
+    """rstn.RSTNBox などが参照するバックエンドを切り替える"""
+    global _backend, _backend_name
+    module = load_backend(name)
+    _backend = module
+    _backend_name = "numpy" if module.__name__ == _MODULES["numpy"] else "cpp"
+    return module
+
+
+def backend_name():
+    return _backend_name
+
+
+def available_backends():
+    """import できるバックエンドの一覧"""
+    out = []
+    for name in BACKENDS:
+        try:
+            load_backend(name)
+        except ImportError:
+            continue
+        out.append(name)
+    return out
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(_backend, name)
+    raise AttributeError(f"module 'rstn' has no attribute {name!r}")
+
+
+set_backend(os.environ.get("RSTN_BACKEND", "auto") or "auto")
@@ -0,0 +1,155 @@
+#pragma once
+#include <condition_variable>
+#include <cstdint>
+#include <deque>
+#include <functional>
+#include <future>
+#include <memory>
+#include <mutex>
+#include <thread>
+#include <vector>
+#include "RSTNState.hpp"
+
+// 非同期実行 (step_async / run_async) の土台
+//   RSTNWorker        : Box ごとに 1 本のワーカースレッドで、投入されたジョブを順に実行する
+//   RSTNSnapshotT     : ある世代の状態のコピー (公開後は書き換えない)
+//   RSTNSnapshotBufferT : スナップショットの二重バッファ (書き込み中でない側だけを公開する)
+
+// ジョブを投入順に 1 つずつ実行するワーカースレッド
+// OpenMP のスレッドチームはジョブを実行するスレッドごとに作られるため、スレッドはジョブ毎に作らず使い回す。
+// 破棄時は投入済みのジョブをすべて実行してから終了する。
+class RSTNWorker {
+public:
+    RSTNWorker() : thread([this] { loop(); }) {}
+    ~RSTNWorker() {
+        {
+            std::lock_guard<std::mutex> lock(mutex);
+            stopping = true;
+        }
+        wake.notify_all();
+        thread.join();
+    }
+    RSTNWorker(const RSTNWorker&) = delete;
+    RSTNWorker& operator=(const RSTNWorker&) = delete;
+
+    // ジョブを投入し、完了 (または例外) を受け取る future を返す
+    std::shared_future<void> submit(std::function<void()> job) {
+        std::packaged_task<void()> task(std::move(job));
+        std::shared_future<void> result = task.get_future().share();
+        {
+            std::lock_guard<std::mutex> lock(mutex);
+            queue.push_back(std::move(task));
+            ++pending;
+        }
+        wake.notify_all();
+        return result;
+    }
+
+    // 投入済みのジョブがすべて終わるまで待つ (ワーカースレッド自身から呼んだ場合は何もしない)
+    void wait_idle() {
+        if (on_worker_thread()) return;
+        std::unique_lock<std::mutex> lock(mutex);
+        idle.wait(lock, [this] { return pending == 0; });
+    }
+
+    bool on_worker_thread() const { return std::this_thread::get_id() == thread.get_id(); }
+
+private:
+    void loop() {
+        for (;;) {
+            std::packaged_task<void()> task;
+            {
+                std::unique_lock<std::mutex> lock(mutex);
+                wake.wait(lock, [this] { return stopping || !queue.empty(); });
+                if (queue.empty()) return;  // 停止要求があり、残りのジョブもない
+                task = std::move(queue.front());
+                queue.pop_front();
+            }
+            task();  // 例外は future 側に格納される
+            {
+                std::lock_guard<std::mutex> lock(mutex);
+                --pending;
+            }
+            idle.notify_all();
+        }
+    }
+
+    std::mutex mutex;
+    std::condition_variable wake;   // ジョブの投入・停止要求
+    std::condition_variable idle;   // ジョブの完了
+    std::deque<std::packaged_task<void()>> queue;
+    size_t pending = 0;             // 未完了のジョブ数 (実行中を含む)
+    bool stopping = false;
+    std::thread thread;             // 他のメンバの初期化後に起動するため最後に置く
+};
+
+// ある世代の状態のコピー (フィールドは RSTNStateT と同じ, 全ノード分の連続配列)
+template <typename T>
+struct RSTNSnapshotT {
+    uint64_t generation = 0;    // 生成時点までの通算ステップ数 (reset_states でも戻らない)
+    long long step = 0;         // エイジングのステップ (reset_states で 0 に戻る)
+    int nx = 0, ny = 0, nz = 0;
+    std::vector<T> f_self;
+    std::vector<T> amplitude;
+    std::vector<T> v_f;
+    std::vector<T> fatigue;
+    std::vector<T> fatigue_limit;
+    std::vector<int> inactivity_count;
+};
+
+// スナップショットの二重バッファ
+// publish は裏側のバッファに書き込んでから表と入れ替えるため、latest() で得たスナップショットが
+// 書き換えられることはない。裏側がまだ読み手に参照されている場合は新しいバッファを確保する
+// (読み手が保持している間はそのスナップショットは有効なまま)。
+template <typename T>
+class RSTNSnapshotBufferT {
+public:
+    using Snapshot = RSTNSnapshotT<T>;
+
+    // 状態をコピーして公開する (num_threads スレッドで並列コピー, publish を呼ぶスレッドは同時に 1 つまで)
+    void publish(const RSTNStateT<T>& state, int nx, int ny, int nz, uint64_t generation, long long step,
+                 int num_threads) {
+        // 裏側は表になったことのあるバッファで、読み手が参照を持つのは表のときに latest() で得た場合のみ
+        // (参照数 1 = このオブジェクトだけが保持している場合は、以後も読み手が増えることはない)
+        if (!back || back.use_count() > 1) back = std::make_shared<Snapshot>();
+        Snapshot& s = *back;
+        const size_t nodes = static_cast<size_t>(nx) * ny * nz;
+        s.generation = generation;
+        s.step = step;
+        s.nx = nx;
+        s.ny = ny;
+        s.nz = nz;
+        for (std::vector<T>* v : {&s.f_self, &s.amplitude, &s.v_f, &s.fatigue, &s.fatigue_limit}) v->resize(nodes);
+        s.inactivity_count.resize(nodes);
+        const long long n = static_cast<long long>(nodes);
+        #pragma omp parallel num_threads(num_threads)
+        {
+            #pragma omp for schedule(static) nowait
+            for (long long i = 0; i < n; ++i) s.f_self[i] = state.f_self[i];
+            #pragma omp for schedule(static) nowait
+            for (long long i = 0; i < n; ++i) s.amplitude[i] = state.amplitude[i];
+            #pragma omp for schedule(static) nowait
+            for (long long i = 0; i < n; ++i) s.v_f[i] = state.v_f[i];
+            #pragma omp for schedule(static) nowait
+            for (long long i = 0; i < n; ++i) s.fatigue[i] = state.fatigue[i];
+            #pragma omp for schedule(static) nowait
+            for (long long i = 0; i < n; ++i) s.fatigue_limit[i] = state.fatigue_limit[i];
+            #pragma omp for schedule(static) nowait
+            for (long long i = 0; i < n; ++i) s.inactivity_count[i] = state.inactivity_count[i];
+        }
+
+        std::lock_guard<std::mutex> lock(mutex);
+        std::swap(front, back);
+    }
+
+    // 最後に公開されたスナップショット (未公開なら nullptr)
+    std::shared_ptr<const Snapshot> latest() const {
+        std::lock_guard<std::mutex> lock(mutex);
+        return front;
+    }
+
+private:
+    mutable std::mutex mutex;
+    std::shared_ptr<Snapshot> front;   // 公開中
+    std::shared_ptr<Snapshot> back;    // 次の publish の書き込み先
+};
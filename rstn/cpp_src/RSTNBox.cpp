@@ -1,211 +1,1070 @@
 #include "RSTNBox.hpp"
+#include "RSTNKernel.hpp"
+#include "RSTNRandom.hpp"
 #include "RSTNNode.hpp"
 #include <stdexcept>
 #include <iostream>
-#include <cstring> // memset用
+#include <cstring> // memcpy用
 #include <cmath>   // std::abs用
+#include <algorithm>
+#include <limits>
 
-RSTNBox::RSTNBox(int n, int seed) : N(n), current_step(0) {
-    if (n <= 0 || (n & (n - 1)) != 0) {
-        throw std::invalid_argument("Size N must be a power of 2.");
-    }
-    total_nodes = static_cast<size_t>(n) * n * n;
+namespace {
+// n が2のべき乗なら log2(n)、そうでなければ -1
+int exact_log2(int n) {
+    if ((n & (n - 1)) != 0) return -1;
+    int k = 0;
+    while ((1 << k) < n) k++;
+    return k;
+}
+} // namespace
 
-    // メモリ確保
-    states = std::make_unique<RSTNState[]>(total_nodes);
-    prev_amp = std::make_unique<double[]>(total_nodes);
-    prev_f = std::make_unique<double[]>(total_nodes);
-    random_pool = std::make_unique<double[]>(total_nodes);
+template <typename T>
+RSTNBoxT<T>::RSTNBoxT(int n, int seed) : RSTNBoxT(n, n, n, seed) {}
 
-    // 入力バッファ確保
-    input_map_amp = std::make_unique<double[]>(total_nodes);
-    input_map_freq = std::make_unique<double[]>(total_nodes);
-    input_map_active = std::make_unique<bool[]>(total_nodes);
+template <typename T>
+RSTNBoxT<T>::RSTNBoxT(int nx_, int ny_, int nz_, int seed, int num_threads_, bool huge_pages_)
+    : nx(nx_), ny(ny_), nz(nz_), current_step(0), f_gen(0), amp_gen(0),
+      rng_seed(static_cast<uint32_t>(seed)), rng_tick(0), reset_count(0),
+      blocking_enabled(false), tile_y(0), tile_z(0), time_block(1),
+      sparse_enabled(false), sparse_dense_threshold(0.5), last_active_fraction(1.0), num_threads(0),
+      huge_pages(huge_pages_) {
+    if (nx <= 0 || ny <= 0 || nz <= 0) {
+        throw std::invalid_argument("Box dimensions must be positive.");
+    }
+    set_num_threads(num_threads_);
+    total_nodes = static_cast<size_t>(nx) * ny * nz;
+    // ノード番号は int で扱う
+    if (total_nodes > static_cast<size_t>(std::numeric_limits<int>::max())) {
+        throw std::invalid_argument("Box has too many nodes (max 2^31 - 1).");
+    }
+    x_shift = exact_log2(nx);
+    y_shift = exact_log2(ny);
+    total_rows = ny * nz;
 
-    // RNG初期化
-    int max_threads = omp_get_max_threads();
-    thread_rngs.resize(max_threads);
-    for(int i=0; i<max_threads; ++i) {
-        thread_rngs[i].seed(seed + i);
+    // メモリ確保 (SoA, 行単位の並列 first touch)
+    for (int g = 0; g < 2; ++g) {
+        f_buf[g] = alloc_nodes<T>();
+        amp_buf[g] = alloc_nodes<T>();
     }
+    v_f = alloc_nodes<T>();
+    fatigue = alloc_nodes<T>();
+    fatigue_limit = alloc_nodes<T>();
+    inactivity_count = alloc_nodes<int>();
+
+    // 入力バッファ確保
+    input_map_amp = alloc_nodes<T>();
+    input_map_freq = alloc_nodes<T>();
+    input_map_active = alloc_nodes<bool>();
+    input_rows.assign(static_cast<size_t>(total_rows), 0);
 
     // LUTの初期化
     update_tables();
     reset_states();
 }
 
-void RSTNBox::update_tables() {
+template <typename T>
+void RSTNBoxT<T>::update_tables() {
     // 1. パラメータの内部係数更新
     m_params.update_derived();
 
-    // 2. ガウス関数LUTの事前計算
-    lut_ex.resize(LUT_SIZE);
-    lut_learn.resize(LUT_SIZE);
-    
-    // diff は 0.0 から刻み幅(1/LUT_RESOLUTION)ずつ増加
-    double step_val = 1.0 / (double)LUT_RESOLUTION;
-    
-    #pragma omp parallel for
-    for (int i = 0; i < LUT_SIZE; ++i) {
-        double diff = i * step_val;
-        double diff_sq = diff * diff;
-        
-        // Excitation Curve
-        lut_ex[i] = std::exp(diff_sq * m_params._coeff_ex);
-        
-        // Learning Q-Curve
-        lut_learn[i] = std::exp(diff_sq * m_params._coeff_learn);
-    }
-
-    // 3. エイジングスケジュールの事前計算
-    size_t schedule_size = static_cast<size_t>(m_params.max_steps) + 1;
-    schedule_lr.resize(schedule_size);
-    schedule_limit.resize(schedule_size);
-
-    #pragma omp parallel for
-    for (size_t s = 0; s < schedule_size; ++s) {
-        double p = static_cast<double>(s) / static_cast<double>(m_params.max_steps);
-        
-        // Learning Rate Decay (Pareto)
-        schedule_lr[s] = 1.0 / std::pow(1.0 + p / m_params.p_critical, m_params.decay_alpha);
-        
-        // Fatigue Limit Growth (Pareto)
-        schedule_limit[s] = std::pow(1.0 + p / m_params.p_mature, m_params.growth_beta);
-    }
-}
-
-void RSTNBox::reset_states() {
+    // 2. 共鳴曲線 (励起・学習のガウス関数) の補間テーブル
+    gauss_table.build(m_params);
+
+    // 3. エイジングスケジュールのパラメータ (値は apply_aging でステップ毎に計算する)
+    aging = AgingSchedule{m_params.max_steps, m_params.p_critical, m_params.p_mature,
+                          m_params.decay_alpha, m_params.growth_beta};
+}
+
+template <typename T>
+int RSTNBoxT<T>::get_size() const {
+    if (nx != ny || ny != nz) {
+        throw std::logic_error("get_size() is only defined for cubic boxes; use nx / ny / nz.");
+    }
+    return nx;
+}
+
+template <typename T>
+void RSTNBoxT<T>::reset_states() {
     current_step = 0; // Reset aging
-    m_params.current_learning_rate = schedule_lr[0];
-    m_params.current_limit_multiplier = schedule_limit[0];
+    apply_aging(0);
 
-    #pragma omp parallel
-    {
-        int tid = omp_get_thread_num();
-        std::uniform_real_distribution<double> dist_f(m_params.f_min, m_params.f_max);
-        std::uniform_real_distribution<double> dist_lim(m_params.fatigue_lim_min, m_params.fatigue_lim_max);
+    T* f_self = get_f_self_ptr();
+    T* amplitude = get_amplitude_ptr();
+
+    // 初期値もノード番号とリセット回数から決まるため、スレッド数に依存しない
+    const uint64_t tick = reset_count++;
 
-        #pragma omp for
+    #pragma omp parallel num_threads(team_size())
+    {
+        affinity.bind();
+        #pragma omp for schedule(static)
         for (size_t i = 0; i < total_nodes; ++i) {
-            states[i].f_self = dist_f(thread_rngs[tid]);
-            states[i].fatigue_limit = dist_lim(thread_rngs[tid]);
-            states[i].amplitude = 0.0;
-            states[i].v_f = 0.0;
-            states[i].fatigue = 0.0;
-            states[i].inactivity_count = 0;
-            random_pool[i] = dist_f(thread_rngs[tid]);
+            f_self[i] = rstn_random::uniform(rng_seed, rstn_random::STREAM_INIT_F, i, tick,
+                                             m_params.f_min, m_params.f_max);
+            fatigue_limit[i] = rstn_random::uniform(rng_seed, rstn_random::STREAM_INIT_LIMIT, i, tick,
+                                                    m_params.fatigue_lim_min, m_params.fatigue_lim_max);
+            amplitude[i] = 0.0;
+            v_f[i] = 0.0;
+            fatigue[i] = 0.0;
+            inactivity_count[i] = 0;
         }
     }
+
+    // 次世代側のバッファも揃えておく (疎ステップで初回から静止領域を省略できるようにするため)
+    std::fill(amp_buf[1 - amp_gen].get(), amp_buf[1 - amp_gen].get() + total_nodes, T(0));
+    std::copy(f_self, f_self + total_nodes, f_buf[1 - f_gen].get());
+    if (sparse_enabled) sync_activity();
 }
 
-void RSTNBox::step(const std::vector<std::pair<int, std::pair<double, double>>>& inputs, bool is_learning) {
-    
-    // --- Phase 0: エイジング更新 (LUT参照による高速化) ---
-    if (is_learning) {
-        if (current_step < (long long)schedule_lr.size() - 1) {
-            current_step++;
-            m_params.current_learning_rate = schedule_lr[current_step];
-            m_params.current_limit_multiplier = schedule_limit[current_step];
+template <typename T>
+void RSTNBoxT<T>::step(const std::vector<std::pair<int, std::pair<double, double>>>& inputs, bool is_learning) {
+    RSTNPhaseTimer step_timer(profiler, PHASE_STEP);
+    {
+        // --- Phase 0.5: 入力データの高速マッピング ---
+        RSTNPhaseTimer timer(profiler, PHASE_INPUTS);
+        clear_inputs();
+        for (const auto& inp : inputs) {
+            map_input(inp.first, inp.second.first, inp.second.second);
+        }
+    }
+    {
+        RSTNPhaseTimer timer(profiler, PHASE_AGING);
+        advance_aging(is_learning);
+    }
+    compute_step(is_learning);
+    settle_buffers();
+}
+
+template <typename T>
+void RSTNBoxT<T>::step_arrays(const int* indices, const double* amps, const double* freqs, size_t count, bool is_learning) {
+    advance_step(indices, amps, freqs, count, is_learning);
+    settle_buffers();
+}
+
+template <typename T>
+void RSTNBoxT<T>::advance_step(const int* indices, const double* amps, const double* freqs, size_t count, bool is_learning) {
+    RSTNPhaseTimer step_timer(profiler, PHASE_STEP);
+    {
+        RSTNPhaseTimer timer(profiler, PHASE_INPUTS);
+        clear_inputs();
+        for (size_t k = 0; k < count; ++k) {
+            map_input(indices[k], amps[k], freqs[k]);
+        }
+    }
+    {
+        RSTNPhaseTimer timer(profiler, PHASE_AGING);
+        advance_aging(is_learning);
+    }
+    compute_step(is_learning);
+}
+
+template <typename T>
+void RSTNBoxT<T>::run(int steps, const RSTNInputSchedule& inputs,
+                  const bool* learning_schedule, bool is_learning,
+                  int record_every, T* rec_amp, T* rec_f, int snapshot_every) {
+    if (inputs.rows > 1 && inputs.rows != static_cast<size_t>(steps)) {
+        throw std::invalid_argument("Input schedule must have 1 or `steps` rows.");
+    }
+    // 途中で例外を投げて中途半端な状態にならないよう、先に全インデックスを検証する
+    for (size_t k = 0; k < inputs.rows * inputs.cols; ++k) {
+        if (inputs.indices[k] >= 0 && static_cast<size_t>(inputs.indices[k]) >= total_nodes) {
+            throw std::out_of_range("Input node index out of range.");
+        }
+    }
+
+    size_t frame = 0;
+    int s = 0;
+    while (s < steps) {
+        // 時間方向ブロッキング: 次の記録ステップを越えない範囲で time_block ステップずつ進める
+        int block = 1;
+        if (blocking_enabled && time_block > 1 && !sparse_enabled && !stencil.precomputed()) {
+            block = std::min(time_block, steps - s);
+            if (record_every > 0) {
+                int next_record = ((s + record_every - 1) / record_every) * record_every;
+                block = std::min(block, next_record - s + 1);
+            }
+            if (snapshot_every > 0) {
+                block = std::min(block, snapshot_every - s % snapshot_every);
+            }
+        }
+
+        if (block > 1) {
+            RSTNPhaseTimer timer(profiler, PHASE_TEMPORAL, true);
+            run_temporal_block(block, inputs, s, learning_schedule, is_learning);
         } else {
-            // max_steps超過時は最終値を維持
-            m_params.current_learning_rate = schedule_lr.back();
-            m_params.current_limit_multiplier = schedule_limit.back();
+            const bool learn = learning_schedule ? learning_schedule[s] : is_learning;
+            const size_t row = (inputs.rows > 1) ? static_cast<size_t>(s) : 0;
+            const size_t offset = row * inputs.cols;
+
+            if (inputs.rows > 0) {
+                advance_step(inputs.indices + offset, inputs.amps + offset, inputs.freqs + offset, inputs.cols, learn);
+            } else {
+                advance_step(nullptr, nullptr, nullptr, 0, learn);
+            }
+        }
+        s += block;
+
+        // --- フレーム記録 ---
+        const int last = s - 1;
+        if (record_every > 0 && last % record_every == 0) {
+            RSTNPhaseTimer timer(profiler, PHASE_RECORD);
+            if (rec_amp) std::memcpy(rec_amp + frame * total_nodes, get_amplitude_ptr(), total_nodes * sizeof(T));
+            if (rec_f) std::memcpy(rec_f + frame * total_nodes, get_f_self_ptr(), total_nodes * sizeof(T));
+            frame++;
         }
+
+        // --- スナップショットの公開 ---
+        if (snapshot_every > 0 && (s % snapshot_every == 0 || s == steps)) publish_snapshot();
     }
+    settle_buffers();
+}
+
+template <typename T>
+void RSTNBoxT<T>::pin_buffers() {
+    pinned.fetch_add(1);
+    settle_buffers();
+}
 
-    // --- Phase 0.5: 入力データの高速マッピング ---
-    std::memset(input_map_active.get(), 0, total_nodes * sizeof(bool));
-    
-    for (const auto& inp : inputs) {
-        int idx = inp.first;
-        input_map_amp[idx] = inp.second.first;
-        input_map_freq[idx] = inp.second.second;
-        input_map_active[idx] = true;
+template <typename T>
+void RSTNBoxT<T>::settle_buffers() {
+    if (pinned.load() == 0) return;
+    const bool move_amp = (amp_gen != 0);
+    const bool move_f = (f_gen != 0);
+    if (!move_amp && !move_f) return;
+    RSTNPhaseTimer timer(profiler, PHASE_SETTLE, true);
+    T* amp0 = amp_buf[0].get();
+    T* f0 = f_buf[0].get();
+    const T* amp1 = amp_buf[1].get();
+    const T* f1 = f_buf[1].get();
+    #pragma omp parallel num_threads(team_size())
+    {
+        affinity.bind();
+        RSTNThreadTimer thread_timer(profiler, PHASE_SETTLE);
+        #pragma omp for schedule(static) nowait
+        for (int row = 0; row < total_rows; ++row) {
+            const size_t base = static_cast<size_t>(row) * nx;
+            if (move_amp) std::copy(amp1 + base, amp1 + base + nx, amp0 + base);
+            if (move_f) std::copy(f1 + base, f1 + base + nx, f0 + base);
+        }
     }
+    // 両方のバッファが同じ内容になる (疎ステップの行フラグも同じものを使う)
+    if (move_amp) {
+        amp_gen = 0;
+        if (sparse_enabled) row_amp_zero[0] = row_amp_zero[1];
+    }
+    if (move_f) f_gen = 0;
+}
+
+template <typename T>
+std::shared_future<void> RSTNBoxT<T>::submit(std::function<void()> job) {
+    if (!worker) {
+        // ジョブの実行中に読めるよう、開始時点の状態を公開しておく
+        if (!snapshots.latest()) publish_snapshot();
+        worker = std::make_unique<RSTNWorker>();
+    }
+    return worker->submit(std::move(job));
+}
+
+template <typename T>
+void RSTNBoxT<T>::wait_async() {
+    if (worker) worker->wait_idle();
+}
+
+template <typename T>
+void RSTNBoxT<T>::publish_snapshot() {
+    RSTNPhaseTimer timer(profiler, PHASE_SNAPSHOT);
+    snapshots.publish(get_state(), nx, ny, nz, rng_tick, current_step, team_size());
+}
+
+template <typename T>
+std::shared_ptr<const RSTNSnapshotT<T>> RSTNBoxT<T>::get_snapshot() {
+    std::shared_ptr<const RSTNSnapshotT<T>> latest = snapshots.latest();
+    if (latest) return latest;
+    wait_async();
+    publish_snapshot();
+    return snapshots.latest();
+}
+
+template <typename T>
+int RSTNBoxT<T>::advance_until_quiet(const std::function<bool()>& condition, int max_steps, bool is_learning) {
+    if (max_steps < 0) {
+        throw std::invalid_argument("max_steps must be >= 0.");
+    }
+    if (condition()) return 0;
+
+    // 振幅が残っている間は通常どおり 1 ステップずつ進める
+    int done = 0;
+    while (done < max_steps && !is_quiet()) {
+        advance_step(nullptr, nullptr, nullptr, 0, is_learning);
+        ++done;
+        if (condition()) {
+            settle_buffers();
+            return done;
+        }
+    }
+
+    // 静止状態: 1, 2, 4, ... ステップずつ早送りし、条件が成立した区間を二分探索で詰める
+    // (区間の開始状態を控えておき、探索中はそこから必要なステップ数だけ進め直す)
+    std::vector<T> saved_f(total_nodes), saved_v(total_nodes), saved_fat(total_nodes);
+    std::vector<int> saved_inact(total_nodes);
+    long long saved_step = 0;
+    uint64_t saved_tick = 0;
+    double saved_lr = 0.0, saved_mult = 0.0;
+    auto save = [&]() {
+        std::copy(f_buf[f_gen].get(), f_buf[f_gen].get() + total_nodes, saved_f.begin());
+        std::copy(v_f.get(), v_f.get() + total_nodes, saved_v.begin());
+        std::copy(fatigue.get(), fatigue.get() + total_nodes, saved_fat.begin());
+        std::copy(inactivity_count.get(), inactivity_count.get() + total_nodes, saved_inact.begin());
+        saved_step = current_step;
+        saved_tick = rng_tick;
+        saved_lr = m_params.current_learning_rate;
+        saved_mult = m_params.current_limit_multiplier;
+    };
+    auto restore = [&]() {
+        std::copy(saved_f.begin(), saved_f.end(), f_buf[f_gen].get());
+        std::copy(saved_v.begin(), saved_v.end(), v_f.get());
+        std::copy(saved_fat.begin(), saved_fat.end(), fatigue.get());
+        std::copy(saved_inact.begin(), saved_inact.end(), inactivity_count.get());
+        current_step = saved_step;
+        rng_tick = saved_tick;
+        m_params.current_learning_rate = saved_lr;
+        m_params.current_limit_multiplier = saved_mult;
+    };
+
+    int chunk = 1;
+    while (done < max_steps) {
+        const int k = std::min(chunk, max_steps - done);
+        save();
+        fast_forward_quiet(k, is_learning);
+        if (condition()) {
+            int lo = 0, hi = k;   // lo ステップ後 (控えた状態) は不成立, hi ステップ後は成立
+            while (hi - lo > 1) {
+                const int mid = lo + (hi - lo) / 2;
+                restore();
+                fast_forward_quiet(mid - lo, is_learning);
+                if (condition()) {
+                    hi = mid;
+                } else {
+                    lo = mid;
+                    save();
+                }
+            }
+            restore();
+            fast_forward_quiet(hi - lo, is_learning);
+            done += hi;
+            break;
+        }
+        done += k;
+        chunk = (chunk > max_steps / 2) ? max_steps : chunk * 2;
+    }
+    if (sparse_enabled) sync_activity();
+    settle_buffers();
+    return done;
+}
+
+template <typename T>
+int RSTNBoxT<T>::infer_until_converged(const int* indices, const double* amps, const double* freqs, size_t count,
+                                       double tol, int max_steps, double* residual) {
+    if (max_steps < 0) {
+        throw std::invalid_argument("max_steps must be >= 0.");
+    }
+    if (!(tol >= 0.0)) {
+        throw std::invalid_argument("tol must be >= 0.");
+    }
+    // 入力は全ステップで同じため、入力マップは最初に 1 回だけ設定する
+    // (推論ではエイジングも進まないため、以後は step_arrays のうちカーネル部分のみを繰り返す)
+    {
+        RSTNPhaseTimer timer(profiler, PHASE_INPUTS);
+        clear_inputs();
+        for (size_t k = 0; k < count; ++k) {
+            map_input(indices[k], amps[k], freqs[k]);
+        }
+    }
+    double change = std::numeric_limits<double>::infinity();
+    int done = 0;
+    while (done < max_steps) {
+        {
+            RSTNPhaseTimer step_timer(profiler, PHASE_STEP);
+            compute_step(false);
+        }
+        ++done;
+        change = max_amplitude_change();
+        if (change <= tol) break;
+    }
+    if (residual) *residual = change;
+    settle_buffers();
+    return done;
+}
 
-    // --- Phase 1: バッファリング & 乱数生成 ---
-    #pragma omp parallel
+template <typename T>
+double RSTNBoxT<T>::max_amplitude_change() {
+    // compute_step の後は amp_buf[amp_gen] が新しい世代, もう一方が 1 つ前の世代
+    const T* cur = amp_buf[amp_gen].get();
+    const T* prev = amp_buf[1 - amp_gen].get();
+    RSTNPhaseTimer timer(profiler, PHASE_CONVERGE, true);
+    T result = T(0);
+    bool has_nan = false;
+    #pragma omp parallel num_threads(team_size())
     {
-        int tid = omp_get_thread_num();
-        std::uniform_real_distribution<double> dist_f(m_params.f_min, m_params.f_max);
+        affinity.bind();
+        RSTNThreadTimer thread_timer(profiler, PHASE_CONVERGE);
+        T local = T(0);
+        int nan = 0;
+        #pragma omp for schedule(static) nowait
+        for (int row = 0; row < total_rows; ++row) {
+            const size_t base = static_cast<size_t>(row) * nx;
+            for (int x = 0; x < nx; ++x) {
+                const T d = std::abs(cur[base + x] - prev[base + x]);
+                local = std::max(local, d);   // d が NaN の場合は local のまま (下で別に検出する)
+                nan |= (d != d);
+            }
+        }
+        #pragma omp critical
+        {
+            result = std::max(result, local);
+            has_nan = has_nan || (nan != 0);
+        }
+    }
+    return has_nan ? std::numeric_limits<double>::infinity() : static_cast<double>(result);
+}
 
-        #pragma omp for
-        for (size_t i = 0; i < total_nodes; ++i) {
-            prev_amp[i] = states[i].amplitude;
-            prev_f[i] = states[i].f_self;
-            random_pool[i] = dist_f(thread_rngs[tid]);
+template <typename T>
+bool RSTNBoxT<T>::is_quiet() const {
+    // 入力なしで振幅 0 が保たれるパラメータか (a = min(0 * 効率, a_limit) = 0)
+    if (!std::isfinite(static_cast<T>(1.0 - m_params.attenuation)) || !(static_cast<T>(m_params.a_limit) >= T(0))) {
+        return false;
+    }
+    const T* amp = amp_buf[amp_gen].get();
+    const T* f = f_buf[f_gen].get();
+    int quiet = 1;
+    #pragma omp parallel num_threads(team_size())
+    {
+        affinity.bind();
+        #pragma omp for reduction(&:quiet) schedule(static)
+        for (long long i = 0; i < static_cast<long long>(total_nodes); ++i) {
+            quiet &= (amp[i] == T(0)) & static_cast<int>(std::isfinite(f[i]));
+        }
+    }
+    return quiet != 0;
+}
+
+template <typename T>
+void RSTNBoxT<T>::fast_forward_quiet(int steps, bool is_learning) {
+    if (steps <= 0) return;
+    RSTNPhaseTimer timer(profiler, PHASE_QUIET, true);
+    // 推論時は振幅が 0 のまま何も変化しない (転生用ティックのみ進む)
+    if (is_learning) {
+        std::vector<T> limit_multiplier(steps);
+        for (int j = 0; j < steps; ++j) {
+            advance_aging(true);
+            limit_multiplier[j] = static_cast<T>(m_params.current_limit_multiplier);
+        }
+        // f は現世代のバッファをその場で更新する (次世代側は次の step で上書きされる)
+        T* f = f_buf[f_gen].get();
+        #pragma omp parallel num_threads(team_size())
+        {
+            affinity.bind();
+            RSTNThreadTimer thread_timer(profiler, PHASE_QUIET);
+            #pragma omp for schedule(static) nowait
+            for (int row = 0; row < total_rows; ++row) {
+                const size_t base = static_cast<size_t>(row) * nx;
+                RSTNNode::update_row_quiet(m_params, f, v_f.get(), fatigue.get(), fatigue_limit.get(),
+                                           inactivity_count.get(), base, static_cast<size_t>(nx), steps,
+                                           limit_multiplier.data(), rng_seed, rng_tick, base, gauss_table);
+            }
         }
     }
-    
-    // LUT用ポインタ取得 (OpenMP内での参照用)
-    const double* p_lut_ex = lut_ex.data();
-    const double* p_lut_learn = lut_learn.data();
-    const double lut_res = (double)LUT_RESOLUTION;
-    const int lut_max_idx = LUT_SIZE - 1;
+    rng_tick += static_cast<uint64_t>(steps);
+}
+
+template <typename T>
+void RSTNBoxT<T>::set_stencil(const std::string& shape, int radius) {
+    const RSTNStencil parsed = RSTNStencil::parse(shape, radius);
+    stencil_sums.configure(parsed, nx, ny, nz, team_size());
+    stencil = parsed;
+}
+
+template <typename T>
+void RSTNBoxT<T>::set_num_threads(int n) {
+    if (n < 0) {
+        throw std::invalid_argument("num_threads must be >= 0 (0 = OpenMP default).");
+    }
+    const bool changed = (n != num_threads);
+    num_threads = n;
+    profiler.set_team_size(n);
+    // 行の分割が変わるため、配列を新しい分割で配置し直す (コンストラクタからの呼び出しでは未確保)
+    if (changed && f_buf[0]) {
+        affinity.refresh();
+        place_arrays(huge_pages);
+    }
+}
+
+template <typename T>
+void RSTNBoxT<T>::set_huge_pages(bool enabled) {
+    if (enabled == huge_pages) return;
+    huge_pages = enabled;
+    place_arrays(!enabled);
+}
+
+template <typename T>
+void RSTNBoxT<T>::set_affinity(const std::vector<int>& cpus) {
+    affinity.set(cpus);
+    // 固定後のスレッドで first touch し直す
+    place_arrays(huge_pages);
+}
+
+template <typename T>
+void RSTNBoxT<T>::place_arrays(bool was_huge_pages) {
+    // 配列は解放しない (get_amplitudes などのビューがこのアドレスを指している)
+    auto place = [this, was_huge_pages](auto& array) {
+        if (array) {
+            rstn_place_rows(array.get(), static_cast<size_t>(total_rows), static_cast<size_t>(nx), placement(),
+                            was_huge_pages);
+        }
+    };
+    for (int g = 0; g < 2; ++g) {
+        place(f_buf[g]);
+        place(amp_buf[g]);
+    }
+    place(v_f);
+    place(fatigue);
+    place(fatigue_limit);
+    place(inactivity_count);
+    place(input_map_amp);
+    place(input_map_freq);
+    place(input_map_active);
+    place(v_f_next);
+    place(fatigue_next);
+    place(inactivity_next);
+}
+
+template <typename T>
+void RSTNBoxT<T>::set_blocking(bool enabled, int ty, int tz, int tb) {
+    if (ty < 0 || tz < 0 || tb < 1) {
+        throw std::invalid_argument("tile sizes must be >= 0 and time_block >= 1.");
+    }
+    blocking_enabled = enabled;
+    tile_y = ty;
+    tile_z = tz;
+    time_block = tb;
+}
+
+template <typename T>
+void RSTNBoxT<T>::set_sparse(bool enabled, double dense_threshold) {
+    if (!(dense_threshold >= 0.0 && dense_threshold <= 1.0)) {
+        throw std::invalid_argument("dense_threshold must be in [0, 1].");
+    }
+    sparse_enabled = enabled;
+    sparse_dense_threshold = dense_threshold;
+    if (enabled) {
+        const size_t rows = static_cast<size_t>(total_rows);
+        row_amp_zero[0].assign(rows, 0);
+        row_amp_zero[1].assign(rows, 0);
+        row_stable.assign(rows, 0);
+        sync_activity();
+    } else {
+        // 無効時はフラグを保持しない (再有効化時に再計算する)
+        row_amp_zero[0].clear();
+        row_amp_zero[1].clear();
+        row_stable.clear();
+    }
+}
+
+template <typename T>
+void RSTNBoxT<T>::sync_activity() {
+    if (!sparse_enabled) return;
+    #pragma omp parallel num_threads(team_size())
+    {
+        affinity.bind();
+        #pragma omp for schedule(static)
+        for (int row = 0; row < total_rows; ++row) {
+            const size_t base = static_cast<size_t>(row) * nx;
+            int nz0 = 0, nz1 = 0, changed = 0;
+            for (int x = 0; x < nx; ++x) {
+                const size_t i = base + x;
+                nz0 |= (amp_buf[0][i] != T(0));
+                nz1 |= (amp_buf[1][i] != T(0));
+                changed |= (v_f[i] != T(0)) | (fatigue[i] != T(0)) | (f_buf[0][i] != f_buf[1][i]);
+            }
+            row_amp_zero[0][row] = !nz0;
+            row_amp_zero[1][row] = !nz1;
+            row_stable[row] = !changed;
+        }
+    }
+}
+
+template <typename T>
+void RSTNBoxT<T>::advance_aging(bool is_learning) {
+    // --- Phase 0: エイジング更新 ---
+    // max_steps超過時は最終値を維持
+    if (is_learning) {
+        if (current_step < aging.max_steps) current_step++;
+        apply_aging(current_step);
+    }
+}
+
+template <typename T>
+void RSTNBoxT<T>::apply_aging(long long step) {
+    const double p = static_cast<double>(step) / static_cast<double>(aging.max_steps);
+
+    // Learning Rate Decay (Pareto)
+    m_params.current_learning_rate = 1.0 / std::pow(1.0 + p / aging.p_critical, aging.decay_alpha);
+
+    // Fatigue Limit Growth (Pareto)
+    m_params.current_limit_multiplier = std::pow(1.0 + p / aging.p_mature, aging.growth_beta);
+}
+
+template <typename T>
+void RSTNBoxT<T>::clear_inputs() {
+    // 全ノードを memset せず、前ステップで設定した箇所のみクリアする (O(入力数))
+    for (int idx : active_inputs) {
+        input_map_active[idx] = false;
+        input_rows[row_of(idx)] = 0;
+    }
+    active_inputs.clear();
+}
+
+template <typename T>
+void RSTNBoxT<T>::map_input(int idx, double amp, double freq) {
+    if (idx < 0) return; // パディング
+    if (static_cast<size_t>(idx) >= total_nodes) {
+        throw std::out_of_range("Input node index out of range.");
+    }
+    input_map_amp[idx] = static_cast<T>(amp);
+    input_map_freq[idx] = static_cast<T>(freq);
+    input_map_active[idx] = true;
+    input_rows[row_of(idx)] = 1;
+    active_inputs.push_back(idx);
+}
+
+template <typename T>
+RSTNStepArgsT<T> RSTNBoxT<T>::make_step_args(bool is_learning, int next_f_gen) {
+    RSTNStepArgsT<T> args;
+    args.nx = nx;
+    args.ny = ny;
+    args.nz = nz;
+    args.y_shift = y_shift;
+    args.y_mask = ny - 1;
+    args.prev_amp = amp_buf[amp_gen].get();
+    args.prev_f = f_buf[f_gen].get();
+    args.next = get_state();
+    args.next.amplitude = amp_buf[1 - amp_gen].get();
+    args.next.f_self = f_buf[next_f_gen].get();
+    args.input_active = input_map_active.get();
+    args.input_rows = input_rows.data();
+    args.input_amp = input_map_amp.get();
+    args.input_freq = input_map_freq.get();
+    args.rng_seed = rng_seed;
+    args.rng_tick = rng_tick;
+    args.origin_y = 0;
+    args.origin_z = 0;
+    args.global_ny = ny;
+    args.params = &m_params;
+    args.is_learning = is_learning;
+    args.row_amp_zero = nullptr;
+    args.row_stable = nullptr;
+    args.gauss = &gauss_table;
+    args.stencil_sum_a = nullptr;
+    args.stencil_sum_f = nullptr;
+    args.stencil_count = nullptr;
+    return args;
+}
+
+template <typename T>
+void RSTNBoxT<T>::compute_step(bool is_learning) {
+    // --- 世代バッファ ---
+    // 近傍参照は現世代 (t) から読み、更新結果は次世代 (t+1) に書き込む (スナップショットコピー不要)
+    // 推論時は周波数が変化しないため f は入れ替えず、現世代をそのまま参照する
+    const int next_f_gen = is_learning ? 1 - f_gen : f_gen;
+    RSTNStepArgsT<T> args = make_step_args(is_learning, next_f_gen);
+
+    // 疎ステップ: カーネルで計算した行の活動フラグを更新しつつ、静止行は簡略更新で済ませる
+    if (sparse_enabled) {
+        args.row_amp_zero = row_amp_zero[1 - amp_gen].data();
+        args.row_stable = is_learning ? row_stable.data() : nullptr;
+    }
+    // 6 近傍以外の近傍形状: 現世代の近傍和を先に全ノード分求めておく
+    if (stencil.precomputed()) {
+        stencil_sums.compute(args.prev_amp, args.prev_f, profiler, team_size());
+        args.stencil_sum_a = stencil_sums.sum_a();
+        args.stencil_sum_f = stencil_sums.sum_f();
+        args.stencil_count = stencil_sums.count();
+    }
+
+    bool use_sparse = false;
+    if (sparse_enabled && !stencil.precomputed() && RSTNNode::idle_is_stationary<T>(m_params)) {
+        RSTNPhaseTimer timer(profiler, PHASE_SCHEDULE);
+        use_sparse = build_sparse_schedule(is_learning);
+    }
 
     // --- Phase 2: 物理演算ループ (Spatial Filtering & Physics) ---
-    #pragma omp parallel for
-    for (int i = 0; i < (int)total_nodes; ++i) {
-        // 座標計算
-        int x = i % N;
-        int y = (i / N) % N;
-        int z = i / (N * N);
-
-        // 集計用変数
-        double w_f_sum = 0.0; // 周波数の重み付き和
-        double w_a_sum = 0.0; // 振幅の単純和（平均計算用）
-        int neighbor_count = 0; // 近傍数
-
-        // ラムダ関数: 近傍情報の収集
-        auto add_neighbor = [&](int ni) {
-            double a = prev_amp[ni];
-            double f = prev_f[ni];
-            double abs_a = std::abs(a);
-            
-            w_a_sum += abs_a;       // 振幅の合計
-            w_f_sum += abs_a * f;   // 周波数の加重合計
-            neighbor_count++;
-        };
-
-        // 6近傍アクセス
-        if (x > 0)   add_neighbor(i - 1);
-        if (x < N-1) add_neighbor(i + 1);
-        if (y > 0)   add_neighbor(i - N);
-        if (y < N-1) add_neighbor(i + N);
-        if (z > 0)   add_neighbor(i - N*N);
-        if (z < N-1) add_neighbor(i + N*N);
-
-        double a_syn = 0.0;
-        double f_syn = 0.0;
-
-        // 入力がある場合とない場合で処理を分岐
-        if (input_map_active[i]) {
-            // 直接入力 (Attenuationなし、純粋な入力値)
-            a_syn = std::abs(input_map_amp[i]);
-            f_syn = input_map_freq[i];
-        } else {
-            // 空間伝播 (Spatial Propagation)
-            double avg_amp = (neighbor_count > 0) ? (w_a_sum / neighbor_count) : 0.0;
-            
-            // 減衰 (Attenuation)
-            a_syn = avg_amp * (1.0 - m_params.attenuation);
-            
-            // 周波数の重心計算
-            f_syn = (w_a_sum > 1e-9) ? (w_f_sum / w_a_sum) : prev_f[i];
-        }
-
-        // 状態更新 (RSTNNodeへ委譲 - LUT版)
-        RSTNNode::update_state_lut(
-            m_params,
-            states[i],
-            a_syn,
-            f_syn,
-            random_pool[i],
-            is_learning,
-            p_lut_ex,
-            p_lut_learn,
-            lut_res,
-            lut_max_idx
-        );
-    }
-}
\ No newline at end of file
+    // 並列領域はスレッド毎の実行時間を計測するため parallel + for nowait の形で書く
+    // (反復の割り当ては parallel for schedule(static) と同じ)
+    if (use_sparse) {
+        const int n_active = static_cast<int>(sparse_active_rows.size());
+        const int n_idle = static_cast<int>(sparse_idle_rows.size());
+
+        {
+            RSTNPhaseTimer timer(profiler, PHASE_KERNEL, true);
+            #pragma omp parallel num_threads(team_size())
+            {
+                affinity.bind();
+                RSTNThreadTimer thread_timer(profiler, PHASE_KERNEL);
+                #pragma omp for schedule(static) nowait
+                for (int i = 0; i < n_active; ++i) {
+                    const int row = sparse_active_rows[i];
+                    rstn_step_rows(args, row, row + 1);
+                }
+            }
+        }
+
+        // 静止行: 振幅は両世代とも 0 のまま。学習時は不活動カウンタと転生のみ更新する
+        T* next_amp = amp_buf[1 - amp_gen].get();
+        unsigned char* next_zero = row_amp_zero[1 - amp_gen].data();
+        {
+            RSTNPhaseTimer timer(profiler, PHASE_IDLE, true);
+            #pragma omp parallel num_threads(team_size())
+            {
+                affinity.bind();
+                RSTNThreadTimer thread_timer(profiler, PHASE_IDLE);
+                #pragma omp for schedule(static) nowait
+                for (int i = 0; i < n_idle; ++i) {
+                    const int row = sparse_idle_rows[i];
+                    const size_t base = static_cast<size_t>(row) * nx;
+                    if (!next_zero[row]) {
+                        std::fill(next_amp + base, next_amp + base + nx, T(0));
+                        next_zero[row] = 1;
+                    }
+                    if (is_learning) {
+                        RSTNNode::update_row_idle(m_params, f_buf[0].get(), f_buf[1].get(), inactivity_count.get(),
+                                                  base, static_cast<size_t>(nx), rng_seed, rng_tick, base);
+                    }
+                }
+            }
+        }
+        last_active_fraction = static_cast<double>(n_active) / total_rows;
+    } else if (blocking_enabled) {
+        // y-タイル内で z を進めることで、z±1 面の行をキャッシュ上で再利用する
+        int ty, tz;
+        resolve_tiles(0, ty, tz);
+        const int tiles_y = (ny + ty - 1) / ty;
+        const int tiles_z = (nz + tz - 1) / tz;
+        const int total_tiles = tiles_y * tiles_z;
+
+        RSTNPhaseTimer timer(profiler, PHASE_KERNEL, true);
+        #pragma omp parallel num_threads(team_size())
+        {
+            affinity.bind();
+            RSTNThreadTimer thread_timer(profiler, PHASE_KERNEL);
+            #pragma omp for schedule(static) nowait
+            for (int t = 0; t < total_tiles; ++t) {
+                const int y0 = (t % tiles_y) * ty;
+                const int z0 = (t / tiles_y) * tz;
+                const int y1 = std::min(y0 + ty, ny);
+                const int z1 = std::min(z0 + tz, nz);
+                for (int z = z0; z < z1; ++z) {
+                    rstn_step_rows(args, z * ny + y0, z * ny + y1);
+                }
+            }
+        }
+    } else {
+        // 行 (x 方向の連続区間) 単位で並列化する
+        RSTNPhaseTimer timer(profiler, PHASE_KERNEL, true);
+        #pragma omp parallel num_threads(team_size())
+        {
+            affinity.bind();
+            RSTNThreadTimer thread_timer(profiler, PHASE_KERNEL);
+            #pragma omp for schedule(static) nowait
+            for (int row = 0; row < total_rows; ++row) {
+                rstn_step_rows(args, row, row + 1);
+            }
+        }
+    }
+    if (!use_sparse) last_active_fraction = 1.0;
+
+    // 世代の入れ替え
+    amp_gen = 1 - amp_gen;
+    f_gen = next_f_gen;
+    rng_tick++;
+}
+
+template <typename T>
+bool RSTNBoxT<T>::build_sparse_schedule(bool is_learning) {
+    // 行 r を省略できる条件:
+    //   自身と y±1, z±1 の行の振幅 (現世代) がすべて 0 (=> 合成入力 a_syn = 0)
+    //   直接入力がない
+    //   学習時は v_f = fatigue = 0 かつ f の両世代が一致 (=> 振幅・周波数・v_f・fatigue が不変)
+    const unsigned char* zero = row_amp_zero[amp_gen].data();
+    const size_t max_active = static_cast<size_t>(sparse_dense_threshold * total_rows);
+
+    sparse_active_rows.clear();
+    sparse_idle_rows.clear();
+    for (int z = 0; z < nz; ++z) {
+        for (int y = 0; y < ny; ++y) {
+            const int row = z * ny + y;
+            bool idle = zero[row] && !input_rows[row] && (!is_learning || row_stable[row]);
+            if (idle && y > 0)      idle = zero[row - 1];
+            if (idle && y < ny - 1) idle = zero[row + 1];
+            if (idle && z > 0)      idle = zero[row - ny];
+            if (idle && z < nz - 1) idle = zero[row + ny];
+            if (idle) {
+                sparse_idle_rows.push_back(row);
+            } else {
+                sparse_active_rows.push_back(row);
+                if (sparse_active_rows.size() > max_active) return false; // 密な更新の方が速い
+            }
+        }
+    }
+    return true;
+}
+
+// ----------------------------------------------------------------------
+// キャッシュブロッキング
+// ----------------------------------------------------------------------
+
+namespace {
+
+// タイルの作業領域がこのサイズ (典型的な L2 容量) に収まるよう自動決定する
+constexpr size_t BLOCKING_CACHE_BYTES = 1 << 20;
+// 1ノードあたりのおおよそのバイト数 (振幅/周波数 2世代 + 単一バッファ状態 + 入力マップ)
+constexpr size_t BYTES_PER_NODE = 72;
+
+// 時間方向ブロッキングでタイル (ハロー込み) を処理する作業領域
+template <typename T>
+struct TileScratch {
+    std::vector<T> amp[2];
+    std::vector<T> f[2];
+    std::vector<T> v_f;
+    std::vector<T> fatigue;
+    std::vector<T> fatigue_limit;
+    std::vector<int>    inactivity;
+    std::vector<T> input_amp;
+    std::vector<T> input_freq;
+    std::vector<char>   input_active;   // bool 配列として参照 (std::vector<bool> はビット詰めのため不可)
+    std::vector<unsigned char> input_rows;
+
+    void resize(size_t n, size_t rows) {
+        for (int g = 0; g < 2; ++g) { amp[g].resize(n); f[g].resize(n); }
+        v_f.resize(n); fatigue.resize(n); fatigue_limit.resize(n); inactivity.resize(n);
+        input_amp.resize(n); input_freq.resize(n);
+        input_active.assign(n, 0);
+        input_rows.assign(rows, 0);
+    }
+};
+
+} // namespace
+
+template <typename T>
+void RSTNBoxT<T>::resolve_tiles(int halo, int& ty, int& tz) const {
+    ty = tile_y;
+    tz = tile_z;
+    if (ty > 0 && tz > 0) return;
+
+    // 作業領域 (ty + 2*halo) * (tz + 2*halo) 行が L2 に収まる最大の正方タイル
+    // (空間ブロッキングのみの場合は z±1 の3面分の行が収まるよう y を決める)
+    const size_t row_bytes = static_cast<size_t>(nx) * BYTES_PER_NODE;
+    const long long rows_fit = std::max<long long>(1, BLOCKING_CACHE_BYTES / row_bytes);
+    int t;
+    if (halo == 0) {
+        t = static_cast<int>(std::max<long long>(1, rows_fit / 3));
+    } else {
+        // ハローの重複計算が支配的にならないよう、中心部分は最低でもハロー幅の 4 倍を確保する
+        t = static_cast<int>(std::sqrt(static_cast<double>(rows_fit))) - 2 * halo;
+        t = std::max(t, 4 * halo);
+    }
+    if (ty <= 0) ty = std::min(t, ny);
+    if (tz <= 0) tz = (halo == 0) ? nz : std::min(t, nz);
+}
+
+template <typename T>
+void RSTNBoxT<T>::run_temporal_block(int steps, const RSTNInputSchedule& inputs, int step_offset,
+                                 const bool* learning_schedule, bool is_learning) {
+    // 各タイルを halo = steps 面/行の重なりを持たせて取り出し、steps ステップ進めてから
+    // 中心部分のみを書き戻す (overlapped tiling)。ハロー内の誤差は1ステップに1セルずつしか
+    // 内側へ伝播しないため、中心部分は逐次実行と完全に一致する。
+    const int halo = steps;
+    const size_t plane = static_cast<size_t>(nx) * ny;
+
+    // --- 1. サブステップ毎のパラメータを準備 (逐次実行と同じ順序) ---
+    std::vector<RSTNParams> sub_params(steps);
+    std::vector<char> sub_learn(steps);
+    bool any_learning = false;
+    for (int s = 0; s < steps; ++s) {
+        const bool learn = learning_schedule ? learning_schedule[step_offset + s] : is_learning;
+        advance_aging(learn);
+        sub_params[s] = m_params;
+        sub_learn[s] = learn;
+        any_learning = any_learning || learn;
+    }
+    clear_inputs(); // 全体の入力マップはこのブロックでは使用しない
+
+    if (any_learning && !v_f_next) {
+        v_f_next = alloc_nodes<T>();
+        fatigue_next = alloc_nodes<T>();
+        inactivity_next = alloc_nodes<int>();
+    }
+
+    // 書き戻し先 (現世代は他タイルのハロー読み出しに使われるため上書きしない)
+    T* out_amp = amp_buf[1 - amp_gen].get();
+    T* out_f = f_buf[1 - f_gen].get();
+
+    int ty, tz;
+    resolve_tiles(halo, ty, tz);
+    const int tiles_y = (ny + ty - 1) / ty;
+    const int tiles_z = (nz + tz - 1) / tz;
+    const int total_tiles = tiles_y * tiles_z;
+
+    #pragma omp parallel num_threads(team_size())
+    {
+        affinity.bind();
+        RSTNThreadTimer thread_timer(profiler, PHASE_TEMPORAL);
+        TileScratch<T> sc;
+
+        #pragma omp for schedule(dynamic) nowait
+        for (int t = 0; t < total_tiles; ++t) {
+            // 中心領域 [y0, y1) x [z0, z1) とハロー込みの領域 [ya, yb) x [za, zb)
+            const int y0 = (t % tiles_y) * ty;
+            const int z0 = (t / tiles_y) * tz;
+            const int y1 = std::min(y0 + ty, ny);
+            const int z1 = std::min(z0 + tz, nz);
+            const int ya = std::max(y0 - halo, 0);
+            const int za = std::max(z0 - halo, 0);
+            const int yb = std::min(y1 + halo, ny);
+            const int zb = std::min(z1 + halo, nz);
+            const int ly = yb - ya;
+            const int lz = zb - za;
+            const size_t lrow = static_cast<size_t>(nx);
+            const size_t lplane = lrow * ly;
+            sc.resize(lplane * lz, static_cast<size_t>(ly) * lz);
+
+            // --- 2. 現世代をタイル作業領域へコピー ---
+            auto copy_in = [&](T* dst, const T* src) {
+                for (int z = 0; z < lz; ++z)
+                    std::memcpy(dst + z * lplane, src + (za + z) * plane + static_cast<size_t>(ya) * nx, lplane * sizeof(T));
+            };
+            copy_in(sc.amp[0].data(), amp_buf[amp_gen].get());
+            copy_in(sc.f[0].data(), f_buf[f_gen].get());
+            copy_in(sc.v_f.data(), v_f.get());
+            copy_in(sc.fatigue.data(), fatigue.get());
+            copy_in(sc.fatigue_limit.data(), fatigue_limit.get());
+            for (int z = 0; z < lz; ++z)
+                std::memcpy(sc.inactivity.data() + z * lplane, inactivity_count.get() + (za + z) * plane + static_cast<size_t>(ya) * nx, lplane * sizeof(int));
+
+            // --- 3. タイル内で steps ステップ進める ---
+            int la = 0, lf = 0; // 作業領域内の現世代
+            for (int s = 0; s < steps; ++s) {
+                const bool learn = sub_learn[s];
+                const int nf = learn ? 1 - lf : lf;
+
+                // このサブステップで正しく計算できる範囲 (ハロー側から1ステップずつ狭まる)
+                const int cy0 = (ya == 0) ? 0 : s + 1;
+                const int cy1 = (yb == ny) ? ly : ly - (s + 1);
+                const int cz0 = (za == 0) ? 0 : s + 1;
+                const int cz1 = (zb == nz) ? lz : lz - (s + 1);
+
+                // 入力マップ (タイル内に落ちるもののみ)
+                std::vector<size_t> mapped;
+                if (inputs.rows > 0) {
+                    const size_t row = (inputs.rows > 1) ? static_cast<size_t>(step_offset + s) : 0;
+                    const size_t offset = row * inputs.cols;
+                    for (size_t k = 0; k < inputs.cols; ++k) {
+                        const int idx = inputs.indices[offset + k];
+                        if (idx < 0) continue;
+                        const int gx = idx % nx;
+                        const int gy = (idx / nx) % ny;
+                        const int gz = idx / static_cast<int>(plane);
+                        if (gy < ya || gy >= yb || gz < za || gz >= zb) continue;
+                        const size_t li = static_cast<size_t>(gz - za) * lplane + static_cast<size_t>(gy - ya) * nx + gx;
+                        sc.input_amp[li] = static_cast<T>(inputs.amps[offset + k]);
+                        sc.input_freq[li] = static_cast<T>(inputs.freqs[offset + k]);
+                        sc.input_active[li] = 1;
+                        sc.input_rows[li / nx] = 1;
+                        mapped.push_back(li);
+                    }
+                }
+
+                RSTNStepArgsT<T> args;
+                args.nx = nx;
+                args.ny = ly;
+                args.nz = lz;
+                args.y_shift = -1;
+                args.y_mask = 0;
+                args.prev_amp = sc.amp[la].data();
+                args.prev_f = sc.f[lf].data();
+                args.next = RSTNStateT<T>{sc.f[nf].data(), sc.amp[1 - la].data(), sc.v_f.data(),
+                                      sc.fatigue.data(), sc.fatigue_limit.data(), sc.inactivity.data()};
+                args.input_active = reinterpret_cast<const bool*>(sc.input_active.data());
+                args.input_rows = sc.input_rows.data();
+                args.input_amp = sc.input_amp.data();
+                args.input_freq = sc.input_freq.data();
+                args.rng_seed = rng_seed;
+                args.rng_tick = rng_tick + s;
+                args.origin_y = ya;
+                args.origin_z = za;
+                args.global_ny = ny;
+                args.params = &sub_params[s];
+                args.is_learning = learn;
+                args.row_amp_zero = nullptr;
+                args.row_stable = nullptr;
+                args.gauss = &gauss_table;
+                args.stencil_sum_a = nullptr;
+                args.stencil_sum_f = nullptr;
+                args.stencil_count = nullptr;
+
+                for (int z = cz0; z < cz1; ++z) {
+                    rstn_step_rows(args, z * ly + cy0, z * ly + cy1);
+                }
+
+                for (size_t li : mapped) {
+                    sc.input_active[li] = 0;
+                    sc.input_rows[li / nx] = 0;
+                }
+                la = 1 - la;
+                lf = nf;
+            }
+
+            // --- 4. 中心領域を書き戻す ---
+            auto copy_out = [&](T* dst, const T* src) {
+                for (int z = z0; z < z1; ++z)
+                    std::memcpy(dst + z * plane + static_cast<size_t>(y0) * nx,
+                                src + (z - za) * lplane + static_cast<size_t>(y0 - ya) * nx,
+                                static_cast<size_t>(y1 - y0) * nx * sizeof(T));
+            };
+            copy_out(out_amp, sc.amp[la].data());
+            if (any_learning) {
+                copy_out(out_f, sc.f[lf].data());
+                copy_out(v_f_next.get(), sc.v_f.data());
+                copy_out(fatigue_next.get(), sc.fatigue.data());
+                for (int z = z0; z < z1; ++z)
+                    std::memcpy(inactivity_next.get() + z * plane + static_cast<size_t>(y0) * nx,
+                                sc.inactivity.data() + (z - za) * lplane + static_cast<size_t>(y0 - ya) * nx,
+                                static_cast<size_t>(y1 - y0) * nx * sizeof(int));
+            }
+        }
+
+        // --- 5. 単一バッファのフィールドを書き戻す ---
+        // 全タイルがハローの読み出しを終えてから、書き戻し先の内容を本体の配列にコピーする
+        // (入れ替えるとビュー・ポインタが古い配列を指したままになるため)
+        if (any_learning) {
+            #pragma omp barrier
+            #pragma omp for schedule(static) nowait
+            for (int row = 0; row < ny * nz; ++row) {
+                const size_t base = static_cast<size_t>(row) * nx;
+                std::copy(v_f_next.get() + base, v_f_next.get() + base + nx, v_f.get() + base);
+                std::copy(fatigue_next.get() + base, fatigue_next.get() + base + nx, fatigue.get() + base);
+                std::copy(inactivity_next.get() + base, inactivity_next.get() + base + nx,
+                          inactivity_count.get() + base);
+            }
+        }
+    }
+
+    // --- 6. 世代の入れ替え (振幅・周波数のみ) ---
+    amp_gen = 1 - amp_gen;
+    rng_tick += steps;
+    if (any_learning) f_gen = 1 - f_gen;
+}
+
+// 倍精度版と単精度版を明示的にインスタンス化する
+template class RSTNBoxT<double>;
+template class RSTNBoxT<float>;
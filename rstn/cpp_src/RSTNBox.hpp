@@ -1,57 +1,296 @@
 #pragma once
 
+#include <atomic>
+#include <functional>
+#include <string>
 #include <memory>
-#include <random>
+#include <cstdint>
 #include <vector>
 #include <omp.h>
 #include "RSTNParams.hpp"
 #include "RSTNState.hpp"
+#include "RSTNKernel.hpp"
+#include "RSTNProfile.hpp"
+#include "RSTNStencil.hpp"
+#include "RSTNAsync.hpp"
+#include "RSTNMemory.hpp"
 
-class RSTNBox {
+// 複数ステップ実行用の入力スケジュール (T行 x K列, 行優先の連続配列)
+// rows == 1 の場合は全ステップで同じ行を使い回す。index < 0 の要素はパディングとして無視される。
+struct RSTNInputSchedule {
+    const int* indices = nullptr;
+    const double* amps = nullptr;
+    const double* freqs = nullptr;
+    size_t rows = 0;
+    size_t cols = 0;
+};
+
+// T: 状態・カーネルの演算精度 (double または float)
+// パラメータ (RSTNParams) と入力値は常に double で受け取り、内部で T に変換する。
+template <typename T>
+class RSTNBoxT {
 private:
-    int N;
+    // 格子サイズ (ノード番号 = x + y * nx + z * nx * ny, 行番号 = y + z * ny)
+    int nx, ny, nz;
+    int x_shift;  // log2(nx)  (ノード番号 -> 行番号の算出用, nx が2のべき乗でない場合は -1)
+    int y_shift;  // log2(ny)  (行番号 -> z の算出用, ny が2のべき乗でない場合は -1)
+    int total_rows;
     size_t total_nodes;
     RSTNParams m_params;
     long long current_step; // エイジング管理用ステップカウンタ
 
-    // メモリ管理 (AoS)
-    std::unique_ptr<RSTNState[]> states;
+    // メモリ管理 (SoA: フィールドごとの連続配列)
+    // 振幅と周波数は近傍参照のため2世代分を保持し、ステップ毎にポインタを入れ替える (ピンポン)
+    // ノード配列はすべて行単位の並列 first touch で確保する (RSTNMemory.hpp, place_arrays)
+    RSTNArray<T> f_buf[2];
+    RSTNArray<T> amp_buf[2];
+    int f_gen;   // 現世代の f_buf インデックス
+    int amp_gen; // 現世代の amp_buf インデックス
+    RSTNArray<T> v_f;
+    RSTNArray<T> fatigue;
+    RSTNArray<T> fatigue_limit;
+    RSTNArray<int>    inactivity_count;
 
-    // バッファ
-    std::unique_ptr<double[]> prev_amp;
-    std::unique_ptr<double[]> prev_f;
-    std::unique_ptr<double[]> random_pool; 
-    
     // 入力高速化マップ
-    std::unique_ptr<double[]> input_map_amp;
-    std::unique_ptr<double[]> input_map_freq;
-    std::unique_ptr<bool[]>   input_map_active;
+    RSTNArray<T> input_map_amp;
+    RSTNArray<T> input_map_freq;
+    RSTNArray<bool>   input_map_active;
+    std::vector<int>          active_inputs;   // 直前ステップで入力が設定されたインデックス (疎リセット用)
+    std::vector<unsigned char> input_rows;     // 行 (y, z) ごとの入力有無 (入力のない行は入力マップを読まない)
     
-    std::vector<std::mt19937> thread_rngs;
+    // カウンタベース乱数 (RSTNRandom.hpp) のキー
+    // 乱数は (seed, ノード番号, ティック) から直接計算するため、スレッド数に依存しない
+    uint32_t rng_seed;
+    uint64_t rng_tick;      // compute_step 毎に進む転生用ティック
+    uint64_t reset_count;   // reset_states の呼び出し回数 (初期化用ティック)
 
-    // --- 高速化用 Look-Up Tables (LUT) ---
-    // 解像度: 周波数差 0.001 単位でマッピング
-    static constexpr int LUT_RESOLUTION = 1000;
-    static constexpr int LUT_SIZE = 100 * LUT_RESOLUTION; // 差分100.0までカバー
-    
-    std::vector<double> lut_ex;          // 励起用ガウス関数テーブル
-    std::vector<double> lut_learn;       // 学習用ガウス関数テーブル
+    // --- 共鳴曲線の Look-Up Table (LUT) ---
+    // 励起用・学習用を float32 で交互に格納し、epsilon 未満の裾は打ち切る (RSTNGauss.hpp)
+    RSTNGaussTable gauss_table;
     
     // エイジングスケジュール (Step -> Value)
-    std::vector<double> schedule_lr;     // 学習率スケジュール
-    std::vector<double> schedule_limit;  // 疲労限界スケジュール
+    // テーブルは持たず、update_tables() 時点のパラメータを保持してステップ毎に閉形式で評価する
+    struct AgingSchedule {
+        long long max_steps;
+        double p_critical;
+        double p_mature;
+        double decay_alpha;
+        double growth_beta;
+    };
+    AgingSchedule aging;
+
+    // --- キャッシュブロッキング設定 ---
+    bool blocking_enabled;
+    int tile_y;       // タイルの y 方向の行数 (0: L2 に収まるよう自動決定)
+    int tile_z;       // タイルの z 方向の面数 (0: 自動)
+    int time_block;   // run() で1タイルを連続して進めるステップ数 (1: 時間方向ブロッキングなし)
+
+    // 時間方向ブロッキングの書き戻し先 (単一バッファのフィールド用, 必要時に確保)
+    RSTNArray<T> v_f_next;
+    RSTNArray<T> fatigue_next;
+    RSTNArray<int>    inactivity_next;
+
+    // --- 疎ステップ (振幅が 0 でない領域とその近傍の行のみを更新) ---
+    bool sparse_enabled;
+    double sparse_dense_threshold;                 // 更新対象の行の割合がこれを超えたら全行を更新する
+    double last_active_fraction;                   // 直前のステップで更新した行の割合
+    std::vector<unsigned char> row_amp_zero[2];    // amp_buf[g] の各行の振幅がすべて 0 か
+    std::vector<unsigned char> row_stable;         // 各行の v_f / fatigue がすべて 0 かつ f の両世代が一致するか
+    std::vector<int> sparse_active_rows;
+    std::vector<int> sparse_idle_rows;
+
+    // --- 近傍の形状 (6 近傍以外は近傍和をカーネルの前に一括計算する) ---
+    RSTNStencil stencil;
+    RSTNStencilSums<T> stencil_sums;
+
+    // 並列領域のスレッド数 (0: OpenMP の既定 = omp_get_max_threads())
+    int num_threads;
+    // ノード配列の配置 (huge page の指定, スレッドの CPU 固定)
+    bool huge_pages;
+    RSTNAffinity affinity;
+
+    // 振幅・周波数のバッファを参照しているビュー・ポインタの数 (pin_buffers)
+    // 0 でなければ、ステップを進める公開メソッドの終わりに現世代をバッファ 0 に揃える
+    std::atomic<int> pinned{0};
+
+    // フェーズ別の計測 (RSTNProfile.hpp, RSTN_PROFILE=0 で無効化)
+    RSTNProfiler profiler;
+
+    // --- 非同期実行 (RSTNAsync.hpp) ---
+    RSTNSnapshotBufferT<T> snapshots;
+    // 最初の submit で起動する。破棄時に実行中のジョブを待ってから他のメンバを解放するため最後に置く
+    std::unique_ptr<RSTNWorker> worker;
+
+    // step の内部フェーズ
+    void advance_aging(bool is_learning);
+    void apply_aging(long long step);
+    void clear_inputs();
+    // 入力を設定して 1 ステップ進める (step_arrays の本体, 現世代をバッファ 0 に揃えない)
+    void advance_step(const int* indices, const double* amps, const double* freqs, size_t count, bool is_learning);
+    // pin 中なら、振幅・周波数の現世代がバッファ 1 にある場合にバッファ 0 へコピーする (計測フェーズ "settle")
+    void settle_buffers();
+    void map_input(int idx, double amp, double freq);
+    int row_of(int idx) const { return (x_shift >= 0) ? (idx >> x_shift) : (idx / nx); }
+    // 並列領域 (num_threads 節) に渡すスレッド数
+    int team_size() const { return (num_threads > 0) ? num_threads : omp_get_max_threads(); }
+    RSTNPlacement placement() const { return RSTNPlacement{team_size(), huge_pages, &affinity}; }
+    template <typename U> RSTNArray<U> alloc_nodes(const U* src = nullptr) const {
+        return rstn_alloc_rows<U>(static_cast<size_t>(total_rows), static_cast<size_t>(nx), placement(), src);
+    }
+    // ノード配列を同じアドレスのまま現在の設定 (スレッド数・huge page・CPU 固定) で配置し直す
+    // (was_huge_pages: 変更前の huge page の指定)
+    void place_arrays(bool was_huge_pages);
+    RSTNStepArgsT<T> make_step_args(bool is_learning, int next_f_gen);
+    void compute_step(bool is_learning);
+    bool build_sparse_schedule(bool is_learning);
+
+    // ブロッキング実行
+    void resolve_tiles(int halo, int& ty, int& tz) const;
+    void run_temporal_block(int steps, const RSTNInputSchedule& inputs, int step_offset,
+                            const bool* learning_schedule, bool is_learning);
+
+    // 入力なしの静止状態 (advance_until_quiet)
+    bool is_quiet() const;
+    void fast_forward_quiet(int steps, bool is_learning);
+
+    // 直前のステップでの振幅の変化量の最大値 (NaN を含む場合は無限大)
+    double max_amplitude_change();
 
 public:
-    RSTNBox(int n, int seed = 42);
+    using value_type = T;
+
+    // 任意サイズの直方体 (各辺が2のべき乗の場合はシフト/マスクで座標を求める)
+    // num_threads: 並列領域のスレッド数 (0 は OpenMP の既定, set_num_threads と同じ)
+    // huge_pages: ノード配列を transparent huge page で確保する (set_huge_pages と同じ)
+    RSTNBoxT(int nx, int ny, int nz, int seed = 42, int num_threads = 0, bool huge_pages = false);
+    // 一辺 n の立方体
+    RSTNBoxT(int n, int seed = 42);
 
     void step(const std::vector<std::pair<int, std::pair<double, double>>>& inputs, bool is_learning);
+
+    // 配列形式の入力による1ステップ (count 個の index/amp/freq, index < 0 は無視)
+    void step_arrays(const int* indices, const double* amps, const double* freqs, size_t count, bool is_learning);
+
+    // steps ステップを C++ 内で連続実行する
+    // learning_schedule: ステップ毎の学習フラグ (nullptr の場合は is_learning を全ステップに適用)
+    // record_every > 0 の場合、s % record_every == 0 のステップ後の振幅/周波数を
+    // rec_amp / rec_f (各 ceil(steps / record_every) x 全ノード数) に書き出す (nullptr なら記録しない)
+    // snapshot_every > 0 の場合、snapshot_every ステップ毎と最後のステップの後に状態をスナップショットとして公開する
+    void run(int steps, const RSTNInputSchedule& inputs,
+             const bool* learning_schedule, bool is_learning,
+             int record_every, T* rec_amp, T* rec_f, int snapshot_every = 0);
     void reset_states();
+
+    // 入力なしで condition() が真になるまで (最大 max_steps ステップ) 進め、進めたステップ数を返す
+    // (condition は開始時点と各ステップ後の状態で評価され、最初に真になった時点で止まる)
+    // 振幅がすべて 0 の静止状態に入った後は、近傍参照なしのノード単位の更新でまとめて進める。
+    // 結果は step() を同じ回数呼んだ場合とビット単位で一致する。
+    // 静止状態では condition を一部のステップでしか評価しない (倍々に進めて二分探索する) ため、
+    // 一度真になったら真のままの条件 (疲労の閾値など, 静止状態では疲労は増えない) を与えること。
+    int advance_until_quiet(const std::function<bool()>& condition, int max_steps, bool is_learning = true);
+
+    // 同じ入力 (count 個の index/amp/freq, index < 0 は無視) で推論ステップを繰り返し、
+    // 1 ステップでの振幅の変化量の最大値が tol 以下になった時点 (最大 max_steps ステップ) で止める。
+    // 進めたステップ数を返し、residual には最後のステップの変化量を書き込む (0 ステップなら無限大)。
+    // 結果は step_arrays(..., false) を同じ回数呼んだ場合とビット単位で一致する。
+    int infer_until_converged(const int* indices, const double* amps, const double* freqs, size_t count,
+                              double tol, int max_steps, double* residual = nullptr);
+
+    // キャッシュブロッキングの設定
+    // enabled: z-スラブ x y-タイル単位で走査する (tile_y / tile_z = 0 は L2 サイズから自動決定)
+    // time_block > 1: run() において各タイルをハロー付きで time_block ステップずつ進める
+    void set_blocking(bool enabled, int tile_y = 0, int tile_z = 0, int time_block = 1);
+    bool get_blocking_enabled() const { return blocking_enabled; }
+    int get_tile_y() const { return tile_y; }
+    int get_tile_z() const { return tile_z; }
+    int get_time_block() const { return time_block; }
+
+    // 疎ステップの設定
+    // enabled: 振幅が 0 の静止領域の行をカーネルで計算せず、結果が厳密に同じになる簡略更新のみ行う
+    // dense_threshold: 更新が必要な行の割合がこれを超えたステップは通常どおり全行を更新する
+    // (時間方向ブロッキングとは併用できず、有効な間 run() は 1 ステップずつ進める)
+    void set_sparse(bool enabled, double dense_threshold = 0.5);
+    bool get_sparse_enabled() const { return sparse_enabled; }
+    double get_dense_threshold() const { return sparse_dense_threshold; }
+    double get_active_fraction() const { return last_active_fraction; }
+    // 状態ビュー経由で配列を書き換えた後に、行ごとの活動フラグを実データから再計算する
+    void sync_activity();
     
+    // 空間伝播の近傍の形状 ("von_neumann" (既定, 6 近傍) / "moore" (26 近傍) / "cube" / "sphere" (半径 radius))
+    // 合成振幅は実際の近傍数 (境界では少なくなる) で正規化する。
+    // 6 近傍以外では疎ステップの行の省略と時間方向ブロッキングは使用されない (近傍が 1 セルを超えるため)
+    void set_stencil(const std::string& shape, int radius = 1);
+    const char* get_stencil() const { return stencil.name(); }
+    int get_stencil_radius() const { return stencil.radius; }
+
+    // 非同期実行
+    // job をワーカースレッドで実行する (投入順に 1 つずつ)。初回の投入時に現在の状態をスナップショットとして公開する。
+    // ジョブが残っている間は他のメソッドを呼ばず、状態は get_snapshot() で読むか wait_async() で完了を待ってから参照する
+    std::shared_future<void> submit(std::function<void()> job);
+    // 投入済みのジョブがすべて終わるまで待つ (ジョブの中から呼んだ場合は何もしない)
+    void wait_async();
+    // 現在の状態をコピーしてスナップショットとして公開する (計測フェーズ "snapshot")
+    void publish_snapshot();
+    // 最後に公開されたスナップショット (一度も公開していなければ、現在の状態を公開して返す)
+    // 公開済みのスナップショットは書き換えられないため、ジョブの実行中でも読める
+    std::shared_ptr<const RSTNSnapshotT<T>> get_snapshot();
+
+    // この Box の並列領域 (step / run / reset_states など全て) のスレッド数
+    // 0 は OpenMP の既定 (omp_get_max_threads())。複数の Box を別々のスレッドから同時に進める場合に、
+    // Box ごとにコアを割り当てるために使う。結果はスレッド数に依存しない
+    void set_num_threads(int n);
+    int get_num_threads() const { return num_threads; }
+
+    // ノード配列のメモリ配置 (NUMA・TLB 対策, 結果には影響しない)
+    // 配列はステップの行ループと同じ静的分割で各スレッドが初期化する (first touch)。
+    // 設定を変えると配列を同じアドレスのまま配置し直す (set_num_threads でスレッド数が変わった場合も同様)。
+    // huge_pages: madvise(MADV_HUGEPAGE) を指定する (N >= 128 で TLB ミスを減らす)
+    void set_huge_pages(bool enabled);
+    bool get_huge_pages() const { return huge_pages; }
+    // cpus: 並列領域のスレッド番号 i (>= 1) を cpus[i % cpus.size()] に固定する (Linux のみ)
+    // 呼び出し元のスレッド (チームのスレッド 0) は固定しない。空にすると固定したスレッドを元の CPU マスクに戻す
+    void set_affinity(const std::vector<int>& cpus);
+    const std::vector<int>& get_affinity() const { return affinity.cpus(); }
+
     // パラメータ変更時にLUTを再計算する
     void update_tables();
+    // 共鳴曲線テーブルのサイズ (バイト)
+    size_t get_lut_bytes() const { return gauss_table.bytes(); }
 
     RSTNParams& get_params() { return m_params; }
-    RSTNState* get_states_ptr() { return states.get(); }
+    RSTNStateT<T> get_state() {
+        return RSTNStateT<T>{f_buf[f_gen].get(), amp_buf[amp_gen].get(), v_f.get(),
+                         fatigue.get(), fatigue_limit.get(), inactivity_count.get()};
+    }
+
+    // 振幅・周波数のポインタを保持する間は pin_buffers() / unpin_buffers() で囲む (入れ子可)
+    // pin 中は step / run / advance_until_quiet / infer_until_converged の終わりに現世代をバッファ 0 に置くため、
+    // get_f_self_ptr() / get_amplitude_ptr() のポインタが常に現世代を指す (Python のビューは自動で pin する)。
+    // pin していない間はバッファをコピーせずに入れ替える (ポインタは取得時点の世代を指す)
+    void pin_buffers();
+    void unpin_buffers() { pinned.fetch_sub(1); }
+
+    // フィールド配列への直接アクセス (ゼロコピー参照用)
+    // f_self / amplitude は現世代のバッファを指す (保持し続ける場合は pin_buffers を参照)
+    T* get_f_self_ptr() { return f_buf[f_gen].get(); }
+    T* get_amplitude_ptr() { return amp_buf[amp_gen].get(); }
+    T* get_v_f_ptr() { return v_f.get(); }
+    T* get_fatigue_ptr() { return fatigue.get(); }
+    T* get_fatigue_limit_ptr() { return fatigue_limit.get(); }
+    int* get_inactivity_count_ptr() { return inactivity_count.get(); }
     size_t get_total_nodes() const { return total_nodes; }
-    int get_size() const { return N; }
-};
\ No newline at end of file
+    // フェーズ別の計測値 (reset() で 0 に戻す)
+    RSTNProfiler& get_profiler() { return profiler; }
+
+    int get_nx() const { return nx; }
+    int get_ny() const { return ny; }
+    int get_nz() const { return nz; }
+    // 立方体の一辺 (直方体の場合は例外)
+    int get_size() const;
+};
+
+extern template class RSTNBoxT<double>;
+extern template class RSTNBoxT<float>;
+
+using RSTNBox = RSTNBoxT<double>;      // 倍精度 (既定)
+using RSTNBoxF32 = RSTNBoxT<float>;    // 単精度 (1ノードあたりのメモリ量・帯域が半分)
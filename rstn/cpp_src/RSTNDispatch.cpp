@@ -0,0 +1,121 @@
+#include "RSTNDispatch.hpp"
+#include <atomic>
+#include <cstdlib>
+#include <mutex>
+#include <stdexcept>
+
+// setup.py が命令セット別の実装をリンクした場合に RSTN_KERNEL_AVX2 / RSTN_KERNEL_AVX512 を定義する
+#ifdef RSTN_KERNEL_AVX2
+namespace rstn_isa_avx2 { RSTNKernelVariant kernel_variant(); }
+#endif
+#ifdef RSTN_KERNEL_AVX512
+namespace rstn_isa_avx512 { RSTNKernelVariant kernel_variant(); }
+#endif
+
+namespace {
+
+#if defined(__GNUC__) && (defined(__x86_64__) || defined(__i386__))
+#define RSTN_HAS_CPU_SUPPORTS 1
+#endif
+
+// 命令セットの実行時判定 (OS による AVX / AVX-512 レジスタ退避の有無も含めて libgcc が判定する)
+bool cpu_supports_avx2() {
+#ifdef RSTN_HAS_CPU_SUPPORTS
+    __builtin_cpu_init();
+    return __builtin_cpu_supports("avx2") && __builtin_cpu_supports("fma");
+#else
+    return false;
+#endif
+}
+
+bool cpu_supports_avx512() {
+#ifdef RSTN_HAS_CPU_SUPPORTS
+    __builtin_cpu_init();
+    return __builtin_cpu_supports("avx512f") && __builtin_cpu_supports("avx512dq") &&
+           __builtin_cpu_supports("avx512bw") && __builtin_cpu_supports("avx512vl");
+#else
+    return false;
+#endif
+}
+
+// 使用可能な実装 (baseline から順に)
+const std::vector<RSTNKernelVariant>& usable_variants() {
+    static const std::vector<RSTNKernelVariant> variants = [] {
+        std::vector<RSTNKernelVariant> v;
+        v.push_back(rstn_isa_baseline::kernel_variant());
+#ifdef RSTN_KERNEL_AVX2
+        if (cpu_supports_avx2()) v.push_back(rstn_isa_avx2::kernel_variant());
+#endif
+#ifdef RSTN_KERNEL_AVX512
+        if (cpu_supports_avx512()) v.push_back(rstn_isa_avx512::kernel_variant());
+#endif
+        return v;
+    }();
+    return variants;
+}
+
+std::atomic<const RSTNKernelVariant*> g_active{nullptr};
+std::once_flag g_env_once;
+
+const RSTNKernelVariant* find_variant(const std::string& name) {
+    const auto& variants = usable_variants();
+    if (name == "auto") return &variants.back();
+    for (const auto& v : variants) {
+        if (name == v.name) return &v;
+    }
+    return nullptr;
+}
+
+// 初回の呼び出し時に環境変数の指定を適用する (Python からの import 時にも呼ばれる)
+const RSTNKernelVariant& active() {
+    const RSTNKernelVariant* v = g_active.load(std::memory_order_acquire);
+    if (v) return *v;
+    std::call_once(g_env_once, [] { rstn_dispatch::init_from_env(); });
+    return *g_active.load(std::memory_order_acquire);
+}
+
+} // namespace
+
+namespace rstn_dispatch {
+
+const char* active_variant() {
+    return active().name;
+}
+
+std::vector<std::string> available_variants() {
+    std::vector<std::string> names;
+    for (const auto& v : usable_variants()) names.emplace_back(v.name);
+    return names;
+}
+
+void select_variant(const std::string& name) {
+    const RSTNKernelVariant* v = find_variant(name);
+    if (!v) {
+        throw std::invalid_argument("Kernel variant '" + name + "' is not available on this CPU/build.");
+    }
+    g_active.store(v, std::memory_order_release);
+}
+
+std::string init_from_env() {
+    const char* requested = std::getenv(ENV_VAR);
+    const RSTNKernelVariant* v = (requested && *requested) ? find_variant(requested) : nullptr;
+    std::string message;
+    if (requested && *requested && !v) {
+        message = std::string(ENV_VAR) + "=" + requested +
+                  " is not available on this CPU/build; using the automatic selection.";
+    }
+    if (!v) v = find_variant("auto");
+    g_active.store(v, std::memory_order_release);
+    return message;
+}
+
+} // namespace rstn_dispatch
+
+// RSTNKernel.hpp で宣言した共通の入口: 選択中の実装へ委譲する
+void rstn_step_rows(const RSTNStepArgsT<double>& args, int row_begin, int row_end) {
+    active().step_rows_f64(args, row_begin, row_end);
+}
+
+void rstn_step_rows(const RSTNStepArgsT<float>& args, int row_begin, int row_end) {
+    active().step_rows_f32(args, row_begin, row_end);
+}
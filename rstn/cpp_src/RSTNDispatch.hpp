@@ -0,0 +1,27 @@
+#pragma once
+#include <string>
+#include <vector>
+#include "RSTNKernel.hpp"
+
+// カーネルの命令セット別実装 (baseline / avx2 / avx512) の実行時選択
+// 同じソースを命令セットごとにコンパイルした実装から、CPUID で使用可能なもののうち最も新しいものを選ぶ。
+// 演算順序はすべての実装で同一 (FMA への縮約も行わない) のため、どれを選んでも結果はビット単位で一致する。
+namespace rstn_dispatch {
+
+// 実装を指定する環境変数 (baseline / avx2 / avx512 / auto)
+constexpr const char* ENV_VAR = "RSTN_KERNEL";
+
+// 使用中の実装名
+const char* active_variant();
+
+// このモジュールに含まれ、かつ実行中の CPU で使用できる実装 (baseline から順に)
+std::vector<std::string> available_variants();
+
+// 実装を切り替える ("auto" は自動選択)。使用できない名前の場合は std::invalid_argument
+void select_variant(const std::string& name);
+
+// 環境変数 RSTN_KERNEL の指定を適用する
+// 指定が使用できない場合は自動選択のままにして理由を返す (問題がなければ空文字列)
+std::string init_from_env();
+
+} // namespace rstn_dispatch
@@ -0,0 +1,136 @@
+#pragma once
+#include <algorithm>
+#include <cmath>
+#include <cstdint>
+#include <cstring>
+#include <stdexcept>
+#include <vector>
+#include "RSTNParams.hpp"
+
+// 共鳴曲線 (励起用・学習用ガウス関数) の評価
+//   GAUSS_LUT      : 線形補間テーブル (既定)
+//   GAUSS_FAST_EXP : 多項式近似の exp を毎回計算する
+// どちらも値が lut_epsilon を下回る範囲は 0 として扱う。
+//
+// テーブルは周波数差 |Δf| の刻み lut_step ごとに {励起値, 励起の傾き, 学習値, 学習の傾き} を
+// float32 で交互に並べ (1 エントリ 16 バイト)、1 回のギャザーで両曲線の補間に必要な値がそろう。
+// 範囲は両曲線が lut_epsilon を下回る位置までで、既定値 (sigma_learn = 20, lut_step = 0.1,
+// lut_epsilon = 1e-6) では約 1,000 エントリ (16 KB) と L1 に収まる。
+// 範囲外の差分は末尾のエントリ (値・傾きとも 0) を参照する。
+struct RSTNGaussTable {
+    static constexpr int STRIDE = 4;         // 1 エントリあたりの float 数
+    static constexpr int MAX_ENTRIES = 1 << 22;
+
+    std::vector<float> entries;
+    float inv_step = 0.0f;    // 1 / lut_step
+    int max_idx = 0;          // 末尾 (値 0) のエントリ番号
+    int mode = GAUSS_LUT;
+
+    // fast exp 用 (exp の引数 = diff^2 * coeff, log_epsilon 未満は 0)
+    double coeff_ex = 0.0;
+    double coeff_learn = 0.0;
+    double log_epsilon = 0.0;
+
+    void build(const RSTNParams& p) {
+        if (!(p.lut_epsilon > 0.0 && p.lut_epsilon < 1.0)) {
+            throw std::invalid_argument("lut_epsilon must be in (0, 1).");
+        }
+        if (!(p.lut_step > 0.0)) {
+            throw std::invalid_argument("lut_step must be positive.");
+        }
+        if (p.gauss_mode != GAUSS_LUT && p.gauss_mode != GAUSS_FAST_EXP) {
+            throw std::invalid_argument("Unknown gauss_mode.");
+        }
+        mode = p.gauss_mode;
+        coeff_ex = p._coeff_ex;
+        coeff_learn = p._coeff_learn;
+        log_epsilon = std::log(p.lut_epsilon);
+
+        // 両曲線が epsilon を下回る |Δf| (exp(d^2 * coeff) = epsilon)
+        const double coeff_min = std::max(coeff_ex, coeff_learn);   // 負の値のうち 0 に近い方 (裾が広い曲線)
+        const double cutoff = std::sqrt(log_epsilon / coeff_min);
+        const double n_intervals = std::ceil(cutoff / p.lut_step);
+        if (!(n_intervals < MAX_ENTRIES)) {
+            throw std::invalid_argument("Gaussian LUT too large; increase lut_step or lut_epsilon.");
+        }
+        max_idx = static_cast<int>(n_intervals) + 1;
+        inv_step = static_cast<float>(1.0 / p.lut_step);
+
+        // 各点の値 (epsilon 未満は 0) を求め、隣接点との差を傾きとする
+        std::vector<double> ex(max_idx + 1), learn(max_idx + 1);
+        for (int i = 0; i <= max_idx; ++i) {
+            const double d = i * p.lut_step;
+            const double e = std::exp(d * d * coeff_ex);
+            const double l = std::exp(d * d * coeff_learn);
+            ex[i] = (e >= p.lut_epsilon && i < max_idx) ? e : 0.0;
+            learn[i] = (l >= p.lut_epsilon && i < max_idx) ? l : 0.0;
+        }
+        entries.assign(static_cast<size_t>(max_idx + 1) * STRIDE, 0.0f);
+        for (int i = 0; i < max_idx; ++i) {
+            float* e = &entries[static_cast<size_t>(i) * STRIDE];
+            e[0] = static_cast<float>(ex[i]);
+            e[1] = static_cast<float>(ex[i + 1] - ex[i]);
+            e[2] = static_cast<float>(learn[i]);
+            e[3] = static_cast<float>(learn[i + 1] - learn[i]);
+        }
+    }
+
+    size_t bytes() const { return entries.size() * sizeof(float); }
+};
+
+namespace rstn_gauss {
+
+// exp(x) の多項式近似 (x <= 0 を想定, 相対誤差 1e-8 程度)
+// x = n ln2 + r (|r| <= ln2 / 2) に分解し、exp(r) を 7 次の多項式、2^n を指数部の直接構築で求める。
+// 分岐・ライブラリ呼び出しを含まないため、呼び出し側のループはそのままベクトル化される。
+template <typename T>
+inline T fast_exp(T x) {
+    constexpr T LOG2E = T(1.4426950408889634);
+    constexpr T LN2_HI = T(0.693145751953125);
+    constexpr T LN2_LO = T(1.428606820309417e-06);
+    x = std::max(x, T(-87));   // float の正規化数の範囲 (2^-126 以上) に収める
+    // 四捨五入 (x <= 0 なので -y + 0.5 >= 0 の切り捨てで求まる)
+    const int n = -static_cast<int>(-(x * LOG2E) + T(0.5));
+    const T r = (x - T(n) * LN2_HI) - T(n) * LN2_LO;
+    T p = T(1.0 / 5040);
+    p = p * r + T(1.0 / 720);
+    p = p * r + T(1.0 / 120);
+    p = p * r + T(1.0 / 24);
+    p = p * r + T(1.0 / 6);
+    p = p * r + T(0.5);
+    p = p * r + T(1);
+    p = p * r + T(1);
+    T scale;
+    if constexpr (sizeof(T) == 4) {
+        const int32_t bits = (n + 127) << 23;
+        std::memcpy(&scale, &bits, sizeof(scale));
+    } else {
+        const int64_t bits = static_cast<int64_t>(n + 1023) << 52;
+        std::memcpy(&scale, &bits, sizeof(scale));
+    }
+    return p * scale;
+}
+
+// テーブル上の位置 (|diff| / lut_step, 末尾のエントリ max_pos でクリップ)
+template <typename T>
+inline T lut_position(T diff, T inv_step, T max_pos) {
+    return std::min(std::abs(diff) * inv_step, max_pos);
+}
+
+// テーブルの線形補間 (curve: 0 = 励起, 2 = 学習)
+template <typename T>
+inline T lut_interp(const float* table, T pos, int curve) {
+    const int i = static_cast<int>(pos);
+    const T t = pos - static_cast<T>(i);
+    const float* e = table + i * RSTNGaussTable::STRIDE + curve;
+    return static_cast<T>(e[0]) + t * static_cast<T>(e[1]);
+}
+
+// exp(diff^2 * coeff) を fast_exp で評価 (log_epsilon 未満は 0)
+template <typename T>
+inline T exp_curve(T diff_sq, T coeff, T log_epsilon) {
+    const T x = diff_sq * coeff;
+    return (x >= log_epsilon) ? fast_exp(x) : T(0);
+}
+
+} // namespace rstn_gauss
@@ -0,0 +1,9 @@
+#pragma once
+
+// カーネルをコンパイルする命令セットごとの名前空間
+// 通常のビルドでは baseline。setup.py は RSTNKernelVariant.cpp を -mavx2 などの命令セット指定と
+// この名前空間を変えて複数回コンパイルし、1つのモジュールに複数の実装を同居させる (RSTNDispatch.cpp)。
+#ifndef RSTN_ISA_NAMESPACE
+#define RSTN_ISA_NAMESPACE rstn_isa_baseline
+#define RSTN_ISA_NAME "baseline"
+#endif
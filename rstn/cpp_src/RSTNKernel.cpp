@@ -0,0 +1,264 @@
+#include "RSTNKernel.hpp"
+#include "RSTNNode.hpp"
+#include <algorithm>
+#include <cmath>
+#include <type_traits>
+#if defined(__SSE__) || defined(_M_X64)
+#include <xmmintrin.h>
+#define RSTN_HAS_MXCSR 1
+#endif
+
+namespace RSTN_ISA_NAMESPACE {
+
+namespace {
+
+// 一度に処理する x 方向の要素数 (スタック上の作業配列サイズ)
+constexpr int ROW_CHUNK = 256;
+
+// 近傍情報の収集 (1ノード分, 境界判定付き)
+// 加算順序は x-1, x+1, y-1, y+1, z-1, z+1 に固定する (ベクトル版と結果を一致させるため)
+template <typename T>
+inline void gather_node(const T* pa, const T* pf, int x, int nx,
+                        const T* const* na, const T* const* nf, int nr,
+                        T& w_a_sum, T& w_f_sum, int& neighbor_count) {
+    w_a_sum = T(0);
+    w_f_sum = T(0);
+    neighbor_count = 0;
+    auto add_neighbor = [&](T a, T f) {
+        T abs_a = std::abs(a);
+        w_a_sum += abs_a;       // 振幅の合計
+        w_f_sum += abs_a * f;   // 周波数の加重合計
+        neighbor_count++;
+    };
+    if (x > 0)      add_neighbor(pa[x - 1], pf[x - 1]);
+    if (x < nx - 1) add_neighbor(pa[x + 1], pf[x + 1]);
+    for (int r = 0; r < nr; ++r) add_neighbor(na[r][x], nf[r][x]);
+}
+
+// x 方向の両近傍が存在する区間 [x_begin, x_end) の収集 (NR = 存在する行近傍の数)
+template <int NR, typename T>
+inline void gather_span(const T* __restrict pa, const T* __restrict pf,
+                        const T* const* na, const T* const* nf,
+                        int x_begin, int x_end, int x0,
+                        T* __restrict w_a, T* __restrict w_f) {
+    const T* __restrict na0 = na[0]; const T* __restrict nf0 = nf[0];
+    const T* __restrict na1 = na[1]; const T* __restrict nf1 = nf[1];
+    const T* __restrict na2 = na[2]; const T* __restrict nf2 = nf[2];
+    const T* __restrict na3 = na[3]; const T* __restrict nf3 = nf[3];
+
+    #pragma omp simd
+    for (int x = x_begin; x < x_end; ++x) {
+        T sa = T(0);
+        T sf = T(0);
+        T a;
+        a = std::abs(pa[x - 1]); sa += a; sf += a * pf[x - 1];
+        a = std::abs(pa[x + 1]); sa += a; sf += a * pf[x + 1];
+        if (NR > 0) { a = std::abs(na0[x]); sa += a; sf += a * nf0[x]; }
+        if (NR > 1) { a = std::abs(na1[x]); sa += a; sf += a * nf1[x]; }
+        if (NR > 2) { a = std::abs(na2[x]); sa += a; sf += a * nf2[x]; }
+        if (NR > 3) { a = std::abs(na3[x]); sa += a; sf += a * nf3[x]; }
+        w_a[x - x0] = sa;
+        w_f[x - x0] = sf;
+    }
+}
+
+// 単精度版では減衰していく振幅がすぐに非正規化数 (< 1.2e-38) の範囲に入り、
+// x86 ではその演算が極端に遅くなるため、カーネル実行中のみ FTZ/DAZ を有効にする。
+// (呼び出し元スレッドの浮動小数点モードは終了時に元へ戻す)
+template <typename T>
+class ScopedFlushDenormals {
+public:
+    ScopedFlushDenormals() {
+#ifdef RSTN_HAS_MXCSR
+        if (std::is_same<T, float>::value) {
+            saved_ = _mm_getcsr();
+            _mm_setcsr(saved_ | 0x8040u); // FTZ (bit 15) | DAZ (bit 6)
+        }
+#endif
+    }
+    ~ScopedFlushDenormals() {
+#ifdef RSTN_HAS_MXCSR
+        if (std::is_same<T, float>::value) _mm_setcsr(saved_);
+#endif
+    }
+private:
+    unsigned int saved_ = 0;
+};
+
+// 行 [row_begin, row_end) の更新本体
+// Learning = false (推論) の場合は振幅のみを書き込み、学習用の状態・LUT には一切触れない
+template <typename T, bool Learning>
+void step_rows_impl(const RSTNStepArgsT<T>& args, int row_begin, int row_end) {
+    const int nx = args.nx;
+    const int ny = args.ny;
+    const int nz = args.nz;
+    const size_t plane = static_cast<size_t>(nx) * ny;
+    const T attenuation_gain = static_cast<T>(1.0 - args.params->attenuation);
+    const ScopedFlushDenormals<T> flush_denormals;
+
+    alignas(64) T w_a[ROW_CHUNK];
+    alignas(64) T w_f[ROW_CHUNK];
+    alignas(64) T a_syn[ROW_CHUNK];
+    alignas(64) T f_syn[ROW_CHUNK];
+    alignas(64) T cnt[ROW_CHUNK];   // 近傍数 (ベクトル演算用に浮動小数点で保持)
+
+    for (int row = row_begin; row < row_end; ++row) {
+        // 座標計算 (ny が2のべき乗ならシフト/マスクで求める)
+        const int y = (args.y_shift >= 0) ? (row & args.y_mask) : (row % ny);
+        const int z = (args.y_shift >= 0) ? (row >> args.y_shift) : (row / ny);
+        const size_t base = static_cast<size_t>(row) * nx;
+        const uint64_t global_base =
+            (static_cast<uint64_t>(z + args.origin_z) * args.global_ny + (y + args.origin_y)) * nx;
+        const bool has_input = (args.input_rows == nullptr) || args.input_rows[row];
+        int amp_nonzero = 0;   // 行フラグ集計用
+        int changed = 0;
+
+        const T* pa = args.prev_amp + base;
+        const T* pf = args.prev_f + base;
+
+        // 存在する行方向の近傍 (y-1, y+1, z-1, z+1 の順)
+        const T* na[4] = {pa, pa, pa, pa};
+        const T* nf[4] = {pf, pf, pf, pf};
+        int nr = 0;
+        if (y > 0)      { na[nr] = pa - nx;    nf[nr] = pf - nx;    nr++; }
+        if (y < ny - 1) { na[nr] = pa + nx;    nf[nr] = pf + nx;    nr++; }
+        if (z > 0)      { na[nr] = pa - plane; nf[nr] = pf - plane; nr++; }
+        if (z < nz - 1) { na[nr] = pa + plane; nf[nr] = pf + plane; nr++; }
+
+        for (int x0 = 0; x0 < nx; x0 += ROW_CHUNK) {
+            const int x1 = std::min(x0 + ROW_CHUNK, nx);
+            const int len = x1 - x0;
+
+            if (args.stencil_sum_a) {
+                // 近傍和は計算済み (26 近傍・半径 r の立方体 / 球)
+                const size_t g = global_base + x0;
+                std::copy(args.stencil_sum_a + g, args.stencil_sum_a + g + len, w_a);
+                std::copy(args.stencil_sum_f + g, args.stencil_sum_f + g + len, w_f);
+                std::copy(args.stencil_count + g, args.stencil_count + g + len, cnt);
+            } else {
+                // --- 近傍集計: 両端 (x=0, x=nx-1) 以外はベクトル化された区間処理 ---
+                const int xs = std::max(x0, 1);
+                const int xe = std::min(x1, nx - 1);
+                if (xs < xe) {
+                    switch (nr) {
+                        case 4: gather_span<4>(pa, pf, na, nf, xs, xe, x0, w_a, w_f); break;
+                        case 3: gather_span<3>(pa, pf, na, nf, xs, xe, x0, w_a, w_f); break;
+                        case 2: gather_span<2>(pa, pf, na, nf, xs, xe, x0, w_a, w_f); break;
+                        case 1: gather_span<1>(pa, pf, na, nf, xs, xe, x0, w_a, w_f); break;
+                        default: gather_span<0>(pa, pf, na, nf, xs, xe, x0, w_a, w_f); break;
+                    }
+                }
+                const int count_mid = 2 + nr;
+                for (int x = xs; x < xe; ++x) cnt[x - x0] = static_cast<T>(count_mid);
+
+                // 両端ノードは境界判定付きで個別に集計
+                for (int x = x0; x < x1; ++x) {
+                    if (x >= xs && x < xe) continue;
+                    const int k = x - x0;
+                    int neighbor_count;
+                    gather_node(pa, pf, x, nx, na, nf, nr, w_a[k], w_f[k], neighbor_count);
+                    cnt[k] = static_cast<T>(neighbor_count);
+                }
+            }
+
+            // --- 合成入力 (a_syn, f_syn) の算出 ---
+            const T* __restrict pf_row = pf + x0;
+
+            #pragma omp simd
+            for (int k = 0; k < len; ++k) {
+                // 分岐をマスク選択に変換できるよう、読み出しはすべて無条件に行う
+                const T sa = w_a[k];
+                const T sf = w_f[k];
+                const T c = cnt[k];
+                const T f_own = pf_row[k];
+                // 空間伝播 (Spatial Propagation) と減衰 (Attenuation)
+                T avg_amp = (c > T(0)) ? (sa / c) : T(0);
+                a_syn[k] = avg_amp * attenuation_gain;
+                // 周波数の重心計算
+                f_syn[k] = (sa > T(1e-9)) ? (sf / sa) : f_own;
+            }
+
+            // 直接入力 (Attenuationなし、純粋な入力値) で置き換え
+            // 入力のない行は入力マップを読まずに済ませる
+            if (has_input) {
+                const bool* in_active = args.input_active + base + x0;
+                const T* in_amp = args.input_amp + base + x0;
+                const T* in_freq = args.input_freq + base + x0;
+                for (int k = 0; k < len; ++k) {
+                    if (in_active[k]) {
+                        a_syn[k] = std::abs(in_amp[k]);
+                        f_syn[k] = in_freq[k];
+                    }
+                }
+            }
+
+            // --- 状態更新 (RSTNNodeへ委譲 - 行単位) ---
+            if (Learning) {
+                RSTNNode::update_row_learning(
+                    *args.params,
+                    args.next,
+                    args.prev_f,
+                    base + x0,
+                    static_cast<size_t>(len),
+                    a_syn,
+                    f_syn,
+                    args.rng_seed,
+                    args.rng_tick,
+                    global_base + x0,
+                    *args.gauss
+                );
+            } else {
+                RSTNNode::update_row_inference(
+                    *args.params,
+                    args.next.amplitude,
+                    args.prev_f,
+                    base + x0,
+                    static_cast<size_t>(len),
+                    a_syn,
+                    f_syn,
+                    *args.gauss
+                );
+            }
+
+            // --- 疎ステップ用の行フラグ (書き込んだ結果は L1 上にある) ---
+            if (args.row_amp_zero) {
+                const T* __restrict a_out = args.next.amplitude + base + x0;
+                #pragma omp simd reduction(|:amp_nonzero)
+                for (int k = 0; k < len; ++k) amp_nonzero |= (a_out[k] != T(0));
+            }
+            if (Learning && args.row_stable) {
+                const T* __restrict f_in = args.prev_f + base + x0;
+                const T* __restrict f_out = args.next.f_self + base + x0;
+                const T* __restrict v_out = args.next.v_f + base + x0;
+                const T* __restrict fat_out = args.next.fatigue + base + x0;
+                #pragma omp simd reduction(|:changed)
+                for (int k = 0; k < len; ++k) {
+                    changed |= (f_out[k] != f_in[k]) | (v_out[k] != T(0)) | (fat_out[k] != T(0));
+                }
+            }
+        }
+
+        if (args.row_amp_zero) args.row_amp_zero[row] = !amp_nonzero;
+        if (Learning && args.row_stable) args.row_stable[row] = !changed;
+    }
+}
+
+} // namespace
+
+template <typename T>
+void step_rows(const RSTNStepArgsT<T>& args, int row_begin, int row_end) {
+    if (args.is_learning) {
+        step_rows_impl<T, true>(args, row_begin, row_end);
+    } else {
+        step_rows_impl<T, false>(args, row_begin, row_end);
+    }
+}
+
+template void step_rows<double>(const RSTNStepArgsT<double>&, int, int);
+template void step_rows<float>(const RSTNStepArgsT<float>&, int, int);
+
+RSTNKernelVariant kernel_variant() {
+    return RSTNKernelVariant{RSTN_ISA_NAME, &step_rows<double>, &step_rows<float>};
+}
+
+} // namespace RSTN_ISA_NAMESPACE
@@ -0,0 +1,73 @@
+#pragma once
+#include <cstddef>
+#include <cstdint>
+#include "RSTNParams.hpp"
+#include "RSTNState.hpp"
+#include "RSTNGauss.hpp"
+#include "RSTNIsa.hpp"
+
+// 1ステップ分のステンシル演算に必要な入出力一式
+// 行 (row) は x 方向に連続する nx ノードの並びで、row = y + z * ny と番号付けする。
+// T は演算精度 (double / float)。パラメータは double のまま参照し、カーネル内で T に変換する。
+template <typename T>
+struct RSTNStepArgsT {
+    int nx, ny, nz;              // 格子サイズ
+    int y_shift;                 // log2(ny)  (row -> z の算出用, ny が2のべき乗でない場合は -1)
+    int y_mask;                  // ny - 1    (row -> y の算出用)
+
+    const T* prev_amp;           // 世代 t の振幅
+    const T* prev_f;             // 世代 t の固有周波数
+    RSTNStateT<T> next;             // 書き込み先 (amplitude / f_self は世代 t+1)
+
+    const bool* input_active;    // 直接入力マップ
+    const unsigned char* input_rows; // 行ごとの入力有無 (nullptr の場合は全行の入力マップを参照)
+    const T* input_amp;
+    const T* input_freq;
+
+    // 転生用乱数のキー (ノードの大域インデックスとステップで決まる)
+    uint32_t rng_seed;
+    uint64_t rng_tick;
+    // 部分領域を処理する場合の大域座標への対応 (全体を処理する場合は 0, 0, ny)
+    int origin_y, origin_z;      // 局所 (y, z) = 0 に対応する大域座標
+    int global_ny;               // 大域の y 方向サイズ
+
+    const RSTNParams* params;
+    bool is_learning;
+
+    // 疎ステップ用の行フラグ出力 (nullptr の場合は計算しない)
+    unsigned char* row_amp_zero;  // 書き込んだ次世代振幅が行全体で 0 か
+    unsigned char* row_stable;    // 学習時: 行全体で f 不変かつ v_f = fatigue = 0 か
+
+    const RSTNGaussTable* gauss; // 共鳴曲線 (推論時は励起側のみ参照)
+
+    // 6 近傍以外の近傍形状の場合に、カーネルの前に計算した近傍和と近傍数 (RSTNStencil.hpp, 大域のノード番号)
+    // nullptr の場合は 6 近傍をカーネル内で集計する
+    const T* stencil_sum_a;
+    const T* stencil_sum_f;
+    const T* stencil_count;
+};
+
+// 行 [row_begin, row_end) を更新する
+// 内部行 (y, z 方向の近傍が全て存在) と境界行を分けて処理し、x 方向はベクトル化される。
+// is_learning = false の場合は推論専用の経路で、振幅のみを書き込む
+// (読み出しは振幅・周波数の現世代のみ。v_f / fatigue / inactivity_count と乱数は使用しない)。
+// 実行時に選択された命令セット別の実装へ委譲する (RSTNDispatch.cpp)。
+void rstn_step_rows(const RSTNStepArgsT<double>& args, int row_begin, int row_end);
+void rstn_step_rows(const RSTNStepArgsT<float>& args, int row_begin, int row_end);
+
+using RSTNStepArgs = RSTNStepArgsT<double>;
+
+// 命令セット別のカーネル実装一式
+struct RSTNKernelVariant {
+    const char* name;
+    void (*step_rows_f64)(const RSTNStepArgsT<double>&, int, int);
+    void (*step_rows_f32)(const RSTNStepArgsT<float>&, int, int);
+};
+
+namespace RSTN_ISA_NAMESPACE {
+// この命令セット向けにコンパイルされた rstn_step_rows の実体
+template <typename T>
+void step_rows(const RSTNStepArgsT<T>& args, int row_begin, int row_end);
+
+RSTNKernelVariant kernel_variant();
+}
@@ -0,0 +1,10 @@
+// 命令セット別のカーネル実装
+// setup.py がこのファイルを命令セットごとに -mavx2 などのオプションと
+// RSTN_ISA_NAMESPACE / RSTN_ISA_NAME を指定してコンパイルし、モジュールに追加する。
+// (通常のソース一覧には含めない。baseline 版は RSTNKernel.cpp / RSTNNode.cpp そのもの)
+#ifndef RSTN_ISA_NAMESPACE
+#error "RSTNKernelVariant.cpp must be compiled with RSTN_ISA_NAMESPACE and RSTN_ISA_NAME defined"
+#endif
+
+#include "RSTNNode.cpp"
+#include "RSTNKernel.cpp"
@@ -0,0 +1,213 @@
+#pragma once
+#include <algorithm>
+#include <atomic>
+#include <cstddef>
+#include <cstdint>
+#include <cstdlib>
+#include <memory>
+#include <new>
+#include <stdexcept>
+#include <string>
+#include <vector>
+#include <omp.h>
+#if defined(__linux__)
+#include <pthread.h>
+#include <sched.h>
+#include <sys/mman.h>
+#endif
+
+// ノード配列のメモリ配置 (NUMA・TLB 対策)
+//   RSTNAffinity : 並列領域のスレッドを CPU に固定する
+//   RSTNArray    : 行単位の並列 first touch で確保した配列 (任意で transparent huge page)
+//                  設定の変更時は同じアドレスのまま配置し直す (rstn_place_rows)
+//
+// Linux は既定でページを最初に書き込んだスレッドの NUMA ノードに置く (first touch)。
+// 配列をステップの行ループと同じ分割で初期化し、スレッドを CPU に固定しておくと、
+// 各スレッドが更新する行は自分のノードのメモリに載る。
+
+// 並列領域のスレッドの CPU 固定
+// チームのスレッド番号 i (>= 1) を cpus[i % cpus.size()] に固定する (空なら固定しない)。
+// スレッド 0 は呼び出し元のスレッド (Python のスレッド) のため固定しない
+// (固定するとその後に作られるスレッドにも引き継がれ、領域の外でも固定されたままになる)。
+class RSTNAffinity {
+public:
+    static bool supported() {
+#if defined(__linux__)
+        return true;
+#else
+        return false;
+#endif
+    }
+
+    void set(const std::vector<int>& cpus) {
+        if (!cpus.empty() && !supported()) {
+            throw std::runtime_error("Thread affinity is only supported on Linux.");
+        }
+#if defined(__linux__)
+        cpu_set_t allowed;
+        CPU_ZERO(&allowed);
+        if (!cpus.empty() && sched_getaffinity(0, sizeof(allowed), &allowed) != 0) {
+            throw std::runtime_error("sched_getaffinity failed.");
+        }
+        for (int cpu : cpus) {
+            if (cpu < 0 || cpu >= CPU_SETSIZE || !CPU_ISSET(cpu, &allowed)) {
+                throw std::invalid_argument("CPU " + std::to_string(cpu) + " is not available to this process.");
+            }
+        }
+#endif
+        cpu_list = cpus;
+        refresh();
+    }
+    const std::vector<int>& cpus() const { return cpu_list; }
+
+    // スレッド番号の割り当てが変わる場合 (チームのスレッド数の変更) に、次の並列領域で固定し直す
+    void refresh() { version = next_version.fetch_add(1) + 1; }
+
+    // 並列領域の先頭で各スレッドが呼ぶ
+    // 設定の世代が変わったスレッドだけが固定し直す (スレッドローカルに最後に適用した世代を持つ)。
+    // 固定をやめた設定 (空リスト) の領域では、固定済みのスレッドを最初の固定前の状態に戻す
+    void bind() const {
+        thread_local ThreadState state;
+        if (state.bound == version) return;
+        state.bound = version;
+        const int thread = omp_get_thread_num();
+        if (cpu_list.empty() || thread == 0) {
+            restore(state);
+        } else {
+            bind_to(state, cpu_list[static_cast<size_t>(thread) % cpu_list.size()]);
+        }
+    }
+
+private:
+    struct ThreadState {
+        uint64_t bound = 0;     // 最後に適用した設定の世代
+        bool pinned = false;    // 固定中 (original に固定前の CPU マスクを保存済み)
+#if defined(__linux__)
+        cpu_set_t original;
+#endif
+    };
+
+    static void bind_to(ThreadState& state, int cpu) {
+#if defined(__linux__)
+        if (!state.pinned) {
+            if (pthread_getaffinity_np(pthread_self(), sizeof(state.original), &state.original) != 0) return;
+            state.pinned = true;
+        }
+        cpu_set_t set;
+        CPU_ZERO(&set);
+        CPU_SET(cpu, &set);
+        pthread_setaffinity_np(pthread_self(), sizeof(set), &set);  // CPU は set() で検証済み
+#else
+        (void)state;
+        (void)cpu;
+#endif
+    }
+
+    static void restore(ThreadState& state) {
+#if defined(__linux__)
+        if (!state.pinned) return;
+        pthread_setaffinity_np(pthread_self(), sizeof(state.original), &state.original);
+        state.pinned = false;
+#else
+        (void)state;
+#endif
+    }
+
+    std::vector<int> cpu_list;
+    uint64_t version = 0;                                  // 設定の世代 (全 Box で一意)
+    static inline std::atomic<uint64_t> next_version{0};
+};
+
+// std::free で解放する配列 (RSTNArray は rstn_alloc_rows で確保する)
+struct RSTNFree {
+    void operator()(void* p) const noexcept { std::free(p); }
+};
+template <typename T>
+using RSTNArray = std::unique_ptr<T[], RSTNFree>;
+
+// 配列の配置方法 (Box の設定から作る)
+struct RSTNPlacement {
+    int threads = 1;                        // first touch を行う並列領域のスレッド数 (ステップと同じ)
+    bool huge_pages = false;                // madvise(MADV_HUGEPAGE) を指定する
+    const RSTNAffinity* affinity = nullptr;
+};
+
+constexpr size_t RSTN_HUGE_PAGE_BYTES = size_t(2) << 20;
+constexpr size_t RSTN_CACHE_LINE_BYTES = 64;
+constexpr size_t RSTN_PAGE_BYTES = 4096;
+
+// 要素数 n の配列の確保サイズ (4 KiB 単位)
+template <typename T>
+size_t rstn_array_bytes(size_t n) {
+    return (std::max<size_t>(n * sizeof(T), 1) + RSTN_PAGE_BYTES - 1) / RSTN_PAGE_BYTES * RSTN_PAGE_BYTES;
+}
+
+// huge page の指定 (2 MiB 以上の配列のみ, 確保時に 2 MiB 境界に揃えてある)
+// 一度指定した配列で無効にする場合は MADV_NOHUGEPAGE を指定する
+inline void rstn_advise_huge_pages(void* p, size_t bytes, bool enabled, bool was_enabled) {
+#if defined(__linux__) && defined(MADV_HUGEPAGE)
+    if (bytes < RSTN_HUGE_PAGE_BYTES) return;
+    if (enabled) {
+        madvise(p, bytes, MADV_HUGEPAGE);
+    } else if (was_enabled) {
+        madvise(p, bytes, MADV_NOHUGEPAGE);
+    }
+#else
+    (void)p; (void)bytes; (void)enabled; (void)was_enabled;
+#endif
+}
+
+// 行を schedule(static) で分割した並列ループで初期化する (src があればその内容をコピー, なければ T())。
+// ステップの行ループと同じ分割のため、各ページはそのページの行を更新するスレッドが最初に書き込む。
+template <typename T>
+void rstn_touch_rows(T* data, size_t rows, size_t row_len, const RSTNPlacement& placement, const T* src) {
+    const long long n_rows = static_cast<long long>(rows);
+    #pragma omp parallel num_threads(placement.threads)
+    {
+        if (placement.affinity) placement.affinity->bind();
+        #pragma omp for schedule(static)
+        for (long long r = 0; r < n_rows; ++r) {
+            T* dst = data + static_cast<size_t>(r) * row_len;
+            if (src) {
+                std::copy(src + static_cast<size_t>(r) * row_len, src + static_cast<size_t>(r + 1) * row_len, dst);
+            } else {
+                std::fill(dst, dst + row_len, T());
+            }
+        }
+    }
+}
+
+// rows x row_len 要素の配列を確保し、行単位の並列 first touch で初期化する
+// 2 MiB 以上の配列は huge page の指定に関わらず 2 MiB 境界に揃える (後から rstn_place_rows で有効にできるように)。
+// huge page は THP が無効な環境では通常のページのまま動作する (結果は変わらない)。
+template <typename T>
+RSTNArray<T> rstn_alloc_rows(size_t rows, size_t row_len, const RSTNPlacement& placement,
+                             const T* src = nullptr) {
+    const size_t bytes = rstn_array_bytes<T>(rows * row_len);
+    const size_t align = (bytes >= RSTN_HUGE_PAGE_BYTES) ? RSTN_HUGE_PAGE_BYTES : RSTN_CACHE_LINE_BYTES;
+    void* p = nullptr;
+    if (posix_memalign(&p, align, bytes) != 0) throw std::bad_alloc();
+    rstn_advise_huge_pages(p, bytes, placement.huge_pages, false);
+    RSTNArray<T> array(static_cast<T*>(p));
+    rstn_touch_rows(array.get(), rows, row_len, placement, src);
+    return array;
+}
+
+// rstn_alloc_rows で確保した配列を同じアドレスのまま現在の設定で配置し直す
+// (Python のビューが指しているため解放・再確保はしない)。
+// 内容を退避してページを返却 (MADV_DONTNEED) し、並列 first touch で書き戻す。
+template <typename T>
+void rstn_place_rows(T* data, size_t rows, size_t row_len, const RSTNPlacement& placement, bool was_huge_pages) {
+    const size_t n = rows * row_len;
+    std::unique_ptr<T[]> scratch(new T[n]);
+    std::copy(data, data + n, scratch.get());
+    const size_t bytes = rstn_array_bytes<T>(n);
+    rstn_advise_huge_pages(data, bytes, placement.huge_pages, was_huge_pages);
+#if defined(__linux__)
+    // 確保範囲に完全に含まれるページのみ返却する (小さい配列は前後のページを他の確保と共有しうる)
+    const uintptr_t begin = (reinterpret_cast<uintptr_t>(data) + RSTN_PAGE_BYTES - 1) / RSTN_PAGE_BYTES * RSTN_PAGE_BYTES;
+    const uintptr_t end = (reinterpret_cast<uintptr_t>(data) + bytes) / RSTN_PAGE_BYTES * RSTN_PAGE_BYTES;
+    if (begin < end) madvise(reinterpret_cast<void*>(begin), end - begin, MADV_DONTNEED);
+#endif
+    rstn_touch_rows(data, rows, row_len, placement, scratch.get());
+}
@@ -1,126 +1,402 @@
 #include "RSTNNode.hpp"
+#include "RSTNRandom.hpp"
 #include <cmath>
 #include <algorithm>
+#include <cstring>
+#include <type_traits>
+#if defined(__SSE__) || defined(_M_X64)
+#include <xmmintrin.h>
+#define RSTN_HAS_MXCSR 1
+#endif
 
-bool RSTNNode::update_state_lut(
+namespace RSTN_ISA_NAMESPACE {
+
+namespace {
+// LUT 参照と状態更新を分割して処理する単位 (スタック上の作業配列サイズ)
+constexpr size_t NODE_CHUNK = 256;
+
+// 符号付きゼロも区別した一致判定 (不動点の検出用)
+template <typename T>
+inline bool same_bits(T a, T b) {
+    return std::memcmp(&a, &b, sizeof(T)) == 0;
+}
+}
+
+template <typename T>
+void RSTNNode::update_row_inference(
     const RSTNParams& params,
-    RSTNState& state,
-    const double a_syn,
-    const double f_syn,
-    const double next_random_f,
-    const bool is_learning,
-    const double* lut_ex,
-    const double* lut_learn,
-    const double lut_resolution,
-    const int lut_max_idx
+    T* amp_out,
+    const T* prev_f,
+    const size_t begin,
+    const size_t count,
+    const T* a_syn,
+    const T* f_syn,
+    const RSTNGaussTable& gauss
 ) {
-    double diff = f_syn - state.f_self;
-
-    // 1. 励起 (Excitation) - LUT
-    gaussian_excitation_lut(params, &state.amplitude, diff, a_syn, lut_ex, lut_resolution, lut_max_idx);
-
-    if (is_learning) {
-        // 2. 適応 (Adaptation) - LUT
-        double force = rfa_update_lut(params, &state.f_self, &state.v_f, diff, a_syn, lut_learn, lut_resolution, lut_max_idx);
-
-        // 3. 代謝 (Metabolism)
-        update_fatigue(params, &state.fatigue, state.amplitude, force);
-        
-        // 膠着判定
-        if (std::abs(force) < params.dead_band) {
-            state.inactivity_count++;
-        } else {
-            state.inactivity_count = 0;
+    const RSTNNodeConstants<T> c(params);
+    T* __restrict amp = amp_out + begin;
+    const T* __restrict f_in = prev_f + begin;
+
+    alignas(64) T eff_ex[NODE_CHUNK];
+
+    for (size_t c0 = 0; c0 < count; c0 += NODE_CHUNK) {
+        const size_t n = std::min(NODE_CHUNK, count - c0);
+        resonance<T>(gauss, f_syn + c0, f_in + c0, n, eff_ex, nullptr);
+
+        // 励起 (Excitation) のみ
+        #pragma omp simd
+        for (size_t k = 0; k < n; ++k) {
+            amp[c0 + k] = gaussian_excitation(c, a_syn[c0 + k], eff_ex[k]);
         }
+    }
+}
+
+template <typename T>
+void RSTNNode::update_row_learning(
+    const RSTNParams& params,
+    const RSTNStateT<T>& next,
+    const T* prev_f,
+    const size_t begin,
+    const size_t count,
+    const T* a_syn,
+    const T* f_syn,
+    const uint32_t rng_seed,
+    const uint64_t rng_tick,
+    const uint64_t global_begin,
+    const RSTNGaussTable& gauss
+) {
+    const RSTNNodeConstants<T> c(params);
+    T* __restrict amp = next.amplitude + begin;
+    const T* __restrict f_in = prev_f + begin;
+
+    T* __restrict f_out = next.f_self + begin;
+    T* __restrict v_f = next.v_f + begin;
+    T* __restrict fatigue = next.fatigue + begin;
+    const T* __restrict fatigue_limit = next.fatigue_limit + begin;
+    int* __restrict inactivity = next.inactivity_count + begin;
+
+    alignas(64) T eff_ex[NODE_CHUNK];
+    alignas(64) T eff_learn[NODE_CHUNK];
+    alignas(64) unsigned char reborn_flags[NODE_CHUNK];
+
+    for (size_t c0 = 0; c0 < count; c0 += NODE_CHUNK) {
+        const size_t n = std::min(NODE_CHUNK, count - c0);
+
+        // 共鳴曲線の評価 (LUT のギャザー) を先にまとめて行い、後段のループを分岐なしにする
+        resonance<T>(gauss, f_syn + c0, f_in + c0, n, eff_ex, eff_learn);
 
-        // 4. 転生 (Rebirth)
-        return try_rebirth(state, next_random_f, params);
+        #pragma omp simd
+        for (size_t k = 0; k < n; ++k) {
+            const size_t j = c0 + k;
+            T diff = f_syn[j] - f_in[j];
+
+            // 1. 励起 (Excitation)
+            T a = gaussian_excitation(c, a_syn[j], eff_ex[k]);
+
+            // 2. 適応 (Adaptation)
+            T force = rfa_force(c, diff, a_syn[j], eff_learn[k]);
+            T new_v_f = (v_f[j] * c.inertia) + (force * (T(1) - c.inertia));
+            new_v_f *= c.viscosity;
+            T f = f_in[j] + new_v_f;
+
+            // 3. 代謝 (Metabolism)
+            T fat = update_fatigue(c, fatigue[j], a, force);
+
+            // 膠着判定
+            const int stuck = std::abs(force) < c.dead_band;
+            int inact = (inactivity[j] + 1) * stuck;
+
+            // 4. 転生 (Rebirth)
+            T current_limit = fatigue_limit[j] * c.limit_multiplier;
+            bool is_overwork = (fat > current_limit);
+            bool is_stagnant = (inact > c.inactivity_limit) & (a < c.a_threshold);
+            bool reborn = is_overwork | is_stagnant;
+
+            f_out[j] = f;
+            fatigue[j] = reborn ? T(0) : fat;
+            v_f[j] = reborn ? T(0) : new_v_f;
+            amp[j] = reborn ? T(0) : a;
+            inactivity[j] = reborn ? 0 : inact;
+            reborn_flags[k] = reborn;
+        }
+
+        // 転生したノードのみ新しい周波数を設定 (転生は稀なのでスカラー処理)
+        // 乱数はその場で (ノード番号, ティック) から生成する
+        for (size_t k = 0; k < n; ++k) {
+            if (reborn_flags[k]) {
+                f_out[c0 + k] = static_cast<T>(
+                    rstn_random::uniform(rng_seed, rstn_random::STREAM_REBIRTH,
+                                         global_begin + c0 + k, rng_tick,
+                                         params.f_min, params.f_max));
+            }
+        }
     }
-    return false;
 }
 
-// LUTを用いた高速ガウス励起
-inline void RSTNNode::gaussian_excitation_lut(
-    const RSTNParams& params, 
-    double* p_amp, 
-    double diff_f, 
-    double a_syn, 
-    const double* lut, 
-    double resolution, 
-    int max_idx
+template <typename T>
+void RSTNNode::update_row_idle(
+    const RSTNParams& params,
+    T* f_a,
+    T* f_b,
+    int* inactivity_count,
+    const size_t begin,
+    const size_t count,
+    const uint32_t rng_seed,
+    const uint64_t rng_tick,
+    const uint64_t global_begin
 ) {
-    // インデックス計算: abs(diff) * resolution
-    double abs_diff = std::abs(diff_f);
-    int idx = static_cast<int>(abs_diff * resolution);
-    
-    // 範囲外チェックとクリッピング
-    if (idx > max_idx) idx = max_idx; // 遠すぎる場合は最小値(0に近い値)を利用
-
-    double efficiency = lut[idx];
-    
-    double target = a_syn * efficiency;
-    *p_amp = std::min(target, params.a_limit);
+    const RSTNNodeConstants<T> c(params);
+    int* __restrict inactivity = inactivity_count + begin;
+
+    // a_syn = 0 の場合の RFA (周波数差 0, 振幅 0)
+    const T force = rfa_force(c, T(0), T(0), T(1));
+    const int stuck = std::abs(force) < c.dead_band;
+    const bool can_stagnate = T(0) < c.a_threshold;
+
+    alignas(64) unsigned char reborn_flags[NODE_CHUNK];
+
+    for (size_t c0 = 0; c0 < count; c0 += NODE_CHUNK) {
+        const size_t n = std::min(NODE_CHUNK, count - c0);
+
+        #pragma omp simd
+        for (size_t k = 0; k < n; ++k) {
+            const size_t j = c0 + k;
+            int inact = (inactivity[j] + 1) * stuck;
+            bool reborn = (inact > c.inactivity_limit) & can_stagnate;
+            inactivity[j] = reborn ? 0 : inact;
+            reborn_flags[k] = reborn;
+        }
+
+        for (size_t k = 0; k < n; ++k) {
+            if (reborn_flags[k]) {
+                const T f = static_cast<T>(
+                    rstn_random::uniform(rng_seed, rstn_random::STREAM_REBIRTH,
+                                         global_begin + c0 + k, rng_tick,
+                                         params.f_min, params.f_max));
+                f_a[begin + c0 + k] = f;
+                f_b[begin + c0 + k] = f;
+            }
+        }
+    }
 }
 
-// LUTを用いたRFA
-inline double RSTNNode::rfa_update_lut(
-    const RSTNParams& params, 
-    double* p_f_self, 
-    double* p_v_f, 
-    double diff_f, 
-    double a_syn, 
-    const double* lut, 
-    double resolution, 
-    int max_idx
+template <typename T>
+bool RSTNNode::idle_is_stationary(const RSTNParams& params) {
+    // 通常の更新式に静止状態 (a_syn = 0, v_f = 0, fatigue = 0) を代入し、状態が 0 のまま保たれるかを確認する
+    const RSTNNodeConstants<T> c(params);
+    const T a = gaussian_excitation(c, T(0), T(1));
+    const T force = rfa_force(c, T(0), T(0), T(1));
+    T new_v_f = (T(0) * c.inertia) + (force * (T(1) - c.inertia));
+    new_v_f *= c.viscosity;
+    const T fat = update_fatigue(c, T(0), a, force);
+    // 疲労限界が負だと fatigue = 0 でも過労転生が起こる
+    const bool no_overwork = params.fatigue_lim_min >= 0.0 && params.current_limit_multiplier >= 0.0;
+    return a == T(0) && new_v_f == T(0) && fat == T(0) && no_overwork;
+}
+
+template <typename T>
+void RSTNNode::update_row_quiet(
+    const RSTNParams& params,
+    T* f_self,
+    T* v_f,
+    T* fatigue,
+    const T* fatigue_limit,
+    int* inactivity_count,
+    const size_t begin,
+    const size_t count,
+    const int steps,
+    const T* limit_multiplier,
+    const uint32_t rng_seed,
+    const uint64_t rng_tick,
+    const uint64_t global_begin,
+    const RSTNGaussTable& gauss
 ) {
-    double force = 0.0;
-    double abs_diff = std::abs(diff_f);
-
-    if (abs_diff >= params.dead_band) {
-        int idx = static_cast<int>(abs_diff * resolution);
-        if (idx > max_idx) idx = max_idx;
-
-        double learn_efficiency = lut[idx];
-        force = (diff_f > 0 ? 1.0 : -1.0) * (a_syn * learn_efficiency);
-        
-        // エイジング (事前計算済み係数)
-        force *= params.current_learning_rate;
+#ifdef RSTN_HAS_MXCSR
+    // 単精度版のカーネルと同じく、計算中は非正規化数を 0 として扱う (FTZ/DAZ, v_f の減衰で現れる)
+    const unsigned int saved_csr = _mm_getcsr();
+    if (std::is_same<T, float>::value) _mm_setcsr(saved_csr | 0x8040u);
+#endif
+
+    const RSTNNodeConstants<T> c(params);
+
+    // 合成入力 (a_syn = 0, 周波数差 0) とそれに対する励起・力は全ノード・全ステップで一定
+    const T zero = T(0);
+    const T a_syn = zero * static_cast<T>(1.0 - params.attenuation);
+    T eff_ex, eff_learn;
+    resonance<T>(gauss, &zero, &zero, 1, &eff_ex, &eff_learn);
+    const T a = gaussian_excitation(c, a_syn, eff_ex);
+    const T force = rfa_force(c, zero, a_syn, eff_learn);
+    const int stuck = std::abs(force) < c.dead_band;
+    const bool low_amp = a < c.a_threshold;
+
+    // 疲労 0 のノードが過労で転生しないことを保証できるか (疲労限界倍率がすべて非負)
+    bool multiplier_nonneg = true;
+    for (int j = 0; j < steps; ++j) multiplier_nonneg = multiplier_nonneg && (limit_multiplier[j] >= T(0));
+
+    for (size_t k = 0; k < count; ++k) {
+        const size_t i = begin + k;
+        const T limit = fatigue_limit[i];
+        T f = f_self[i];
+        T v = v_f[i];
+        T fat = fatigue[i];
+        int inact = inactivity_count[i];
+
+        int j = 0;
+        while (j < steps) {
+            // 1 ステップ分 (update_row_learning と同じ式)
+            T new_v = (v * c.inertia) + (force * (T(1) - c.inertia));
+            new_v *= c.viscosity;
+            const T new_f = f + new_v;
+            const T new_fat = update_fatigue(c, fat, a, force);
+            const int new_inact = (inact + 1) * stuck;
+            const bool is_overwork = new_fat > limit * limit_multiplier[j];
+            const bool is_stagnant = (new_inact > c.inactivity_limit) & low_amp;
+            if (is_overwork | is_stagnant) {
+                f = static_cast<T>(rstn_random::uniform(rng_seed, rstn_random::STREAM_REBIRTH,
+                                                        global_begin + k, rng_tick + j,
+                                                        params.f_min, params.f_max));
+                v = T(0);
+                fat = T(0);
+                inact = 0;
+                ++j;
+                continue;
+            }
+            const bool fixed = same_bits(new_f, f) && same_bits(new_v, v) && same_bits(new_fat, fat);
+            f = new_f;
+            v = new_v;
+            fat = new_fat;
+            inact = new_inact;
+            ++j;
+            if (!fixed || !(fat == T(0) && limit >= T(0) && multiplier_nonneg)) continue;
+
+            // 不動点: 以降は不活動カウンタだけが進む。不活動の転生が起こるステップの直前まで読み飛ばす
+            const int rest = steps - j;
+            if (!stuck) break;   // カウンタは 0 のまま
+            const long long until_rebirth = low_amp
+                ? std::max<long long>(1, static_cast<long long>(c.inactivity_limit) - inact + 1)
+                : static_cast<long long>(rest) + 1;
+            if (until_rebirth > rest) {
+                inact += rest;
+                break;
+            }
+            inact += static_cast<int>(until_rebirth - 1);
+            j += static_cast<int>(until_rebirth - 1);
+        }
+
+        f_self[i] = f;
+        v_f[i] = v;
+        fatigue[i] = fat;
+        inactivity_count[i] = inact;
     }
-    
-    double new_v_f = ((*p_v_f) * params.inertia) + (force * (1.0 - params.inertia));
-    new_v_f *= params.viscosity;
-    
-    *p_v_f = new_v_f;
-    *p_f_self += new_v_f;
-    
-    return force;
+
+#ifdef RSTN_HAS_MXCSR
+    if (std::is_same<T, float>::value) _mm_setcsr(saved_csr);
+#endif
 }
 
-// 疲労計算 (変更なし)
-inline void RSTNNode::update_fatigue(const RSTNParams& params, double* p_fatigue, double amplitude, double force) {
-    if (std::abs(force) < params.dead_band) {
-        *p_fatigue += params.c_load * (amplitude / params.a_limit);
-    } else {
-        *p_fatigue = std::max(0.0, *p_fatigue - params.c_recover);
+// 共鳴曲線: 周波数差 f_syn - f_in に対する励起・学習の効率を n ノード分求める
+// (eff_learn が nullptr の場合は励起のみ)。評価方法の分岐はループの外で行う。
+template <typename T>
+inline void RSTNNode::resonance(const RSTNGaussTable& gauss, const T* f_syn, const T* f_in,
+                                size_t n, T* eff_ex, T* eff_learn) {
+    if (gauss.mode == GAUSS_FAST_EXP) {
+        const T coeff_ex = static_cast<T>(gauss.coeff_ex);
+        const T coeff_learn = static_cast<T>(gauss.coeff_learn);
+        const T log_eps = static_cast<T>(gauss.log_epsilon);
+        #pragma omp simd
+        for (size_t k = 0; k < n; ++k) {
+            const T diff = f_syn[k] - f_in[k];
+            eff_ex[k] = rstn_gauss::exp_curve(diff * diff, coeff_ex, log_eps);
+        }
+        if (eff_learn) {
+            #pragma omp simd
+            for (size_t k = 0; k < n; ++k) {
+                const T diff = f_syn[k] - f_in[k];
+                eff_learn[k] = rstn_gauss::exp_curve(diff * diff, coeff_learn, log_eps);
+            }
+        }
+        return;
     }
-    if (amplitude < params.a_threshold) {
-        *p_fatigue = std::max(0.0, *p_fatigue - params.c_recover);
+
+    // テーブル上の位置の計算 (ベクトル化) と、エントリの読み出し (ギャザー) を分けて行う
+    // 遠すぎる差分は末尾のエントリ (値 0) を参照する
+    const float* __restrict table = gauss.entries.data();
+    const T inv_step = static_cast<T>(gauss.inv_step);
+    const T max_pos = static_cast<T>(gauss.max_idx);
+    alignas(64) int idx[NODE_CHUNK];
+    alignas(64) T frac[NODE_CHUNK];
+
+    #pragma omp simd
+    for (size_t k = 0; k < n; ++k) {
+        const T pos = rstn_gauss::lut_position(f_syn[k] - f_in[k], inv_step, max_pos);
+        const int i = static_cast<int>(pos);
+        idx[k] = i * RSTNGaussTable::STRIDE;
+        frac[k] = pos - static_cast<T>(i);
+    }
+    if (eff_learn) {
+        for (size_t k = 0; k < n; ++k) {
+            const float* e = table + idx[k];
+            eff_ex[k] = static_cast<T>(e[0]) + frac[k] * static_cast<T>(e[1]);
+            eff_learn[k] = static_cast<T>(e[2]) + frac[k] * static_cast<T>(e[3]);
+        }
+    } else {
+        for (size_t k = 0; k < n; ++k) {
+            const float* e = table + idx[k];
+            eff_ex[k] = static_cast<T>(e[0]) + frac[k] * static_cast<T>(e[1]);
+        }
     }
 }
 
-// 転生ロジック (変更なし)
-inline bool RSTNNode::try_rebirth(RSTNState& state, double next_random_f, const RSTNParams& params) {
-    double current_limit = state.fatigue_limit * params.current_limit_multiplier;
-    bool is_overwork = (state.fatigue > current_limit);
-    bool is_stagnant = (state.inactivity_count > params.inactivity_limit) && (state.amplitude < params.a_threshold);
-
-    if (is_overwork || is_stagnant) {
-        state.f_self = next_random_f;
-        state.fatigue = 0.0;
-        state.v_f = 0.0;
-        state.amplitude = 0.0;
-        state.inactivity_count = 0;
-        return true;
-    }
-    return false;
-}
\ No newline at end of file
+// ガウス励起 (efficiency は LUT から取得済み)
+template <typename T>
+inline T RSTNNode::gaussian_excitation(const RSTNNodeConstants<T>& c, T a_syn, T efficiency) {
+    T target = a_syn * efficiency;
+    return std::min(target, c.a_limit);
+}
+
+// RFA: 周波数を引き寄せる力 (learn_efficiency は LUT から取得済み)
+template <typename T>
+inline T RSTNNode::rfa_force(const RSTNNodeConstants<T>& c, T diff_f, T a_syn, T learn_efficiency) {
+    T force = (diff_f > 0 ? T(1) : T(-1)) * (a_syn * learn_efficiency);
+
+    // エイジング (事前計算済み係数)
+    force *= c.learning_rate;
+
+    // 不感帯内では力を発生させない
+    return (std::abs(diff_f) >= c.dead_band) ? force : T(0);
+}
+
+// 疲労計算
+template <typename T>
+inline T RSTNNode::update_fatigue(const RSTNNodeConstants<T>& c, T fatigue, T amplitude, T force) {
+    // 膠着中は負荷を蓄積、それ以外は回復
+    T loaded = fatigue + c.c_load * (amplitude / c.a_limit);
+    T recovered = std::max(T(0), fatigue - c.c_recover);
+    fatigue = (std::abs(force) < c.dead_band) ? loaded : recovered;
+    // 低振幅時は追加で回復
+    T rested = std::max(T(0), fatigue - c.c_recover);
+    return (amplitude < c.a_threshold) ? rested : fatigue;
+}
+
+// 倍精度版と単精度版を明示的にインスタンス化する
+#define RSTN_INSTANTIATE_UPDATE_ROW(T)                                            \
+    template void RSTNNode::update_row_learning<T>(                               \
+        const RSTNParams&, const RSTNStateT<T>&, const T*, const size_t,          \
+        const size_t, const T*, const T*, const uint32_t, const uint64_t,         \
+        const uint64_t, const RSTNGaussTable&);                                   \
+    template void RSTNNode::update_row_inference<T>(                              \
+        const RSTNParams&, T*, const T*, const size_t, const size_t,              \
+        const T*, const T*, const RSTNGaussTable&);                               \
+    template void RSTNNode::update_row_idle<T>(                                   \
+        const RSTNParams&, T*, T*, int*, const size_t, const size_t,              \
+        const uint32_t, const uint64_t, const uint64_t);                          \
+    template bool RSTNNode::idle_is_stationary<T>(const RSTNParams&);             \
+    template void RSTNNode::update_row_quiet<T>(                                  \
+        const RSTNParams&, T*, T*, T*, const T*, int*, const size_t,              \
+        const size_t, const int, const T*, const uint32_t, const uint64_t,        \
+        const uint64_t, const RSTNGaussTable&);
+RSTN_INSTANTIATE_UPDATE_ROW(double)
+RSTN_INSTANTIATE_UPDATE_ROW(float)
+#undef RSTN_INSTANTIATE_UPDATE_ROW
+
+} // namespace RSTN_ISA_NAMESPACE
@@ -1,44 +1,138 @@
 #pragma once
+#include <cstddef>
+#include <cstdint>
 #include "RSTNState.hpp"
 #include "RSTNParams.hpp"
+#include "RSTNGauss.hpp"
+#include "RSTNIsa.hpp"
+
+// 命令セット別にコンパイルされるため、名前空間 RSTN_ISA_NAMESPACE に置く (RSTNIsa.hpp)
+namespace RSTN_ISA_NAMESPACE {
+
+// ノード更新で参照する物理定数 (演算精度 T に変換済み)
+// float 版で double への昇格が起きないよう、行の更新前に一度だけ変換する。
+template <typename T>
+struct RSTNNodeConstants {
+    T inertia;
+    T viscosity;
+    T dead_band;
+    T c_load;
+    T c_recover;
+    T a_threshold;
+    T a_limit;
+    T learning_rate;      // current_learning_rate
+    T limit_multiplier;   // current_limit_multiplier
+    int inactivity_limit;
+
+    explicit RSTNNodeConstants(const RSTNParams& p)
+        : inertia(static_cast<T>(p.inertia)),
+          viscosity(static_cast<T>(p.viscosity)),
+          dead_band(static_cast<T>(p.dead_band)),
+          c_load(static_cast<T>(p.c_load)),
+          c_recover(static_cast<T>(p.c_recover)),
+          a_threshold(static_cast<T>(p.a_threshold)),
+          a_limit(static_cast<T>(p.a_limit)),
+          learning_rate(static_cast<T>(p.current_learning_rate)),
+          limit_multiplier(static_cast<T>(p.current_limit_multiplier)),
+          inactivity_limit(p.inactivity_limit) {}
+};
 
 class RSTNNode {
 public:
-    static bool update_state_lut(
+    // x 方向に連続する count ノード (先頭インデックス begin) の状態を一括更新する (学習時)。
+    // 分岐をマスク演算に置き換えた実装で、行単位の SIMD ベクトル化を前提とする。
+    //   next   : 書き込み先 (amplitude / f_self は次世代バッファ, その他は単一バッファ)
+    //   prev_f : 現世代の固有周波数 (全体配列)
+    //   a_syn, f_syn : 各ノードへの合成入力 (count 要素)
+    //   rng_seed, rng_tick, global_begin : 転生時の乱数キー (begin に対応する大域ノード番号)
+    //   gauss  : 共鳴曲線の評価方法とテーブル
+    template <typename T>
+    static void update_row_learning(
         const RSTNParams& params,
-        RSTNState& state,
-        const double a_syn,
-        const double f_syn,
-        const double next_random_f,
-        const bool is_learning,
-        const double* lut_ex,
-        const double* lut_learn,
-        const double lut_resolution,
-        const int lut_max_idx
+        const RSTNStateT<T>& next,
+        const T* prev_f,
+        const size_t begin,
+        const size_t count,
+        const T* a_syn,
+        const T* f_syn,
+        const uint32_t rng_seed,
+        const uint64_t rng_tick,
+        const uint64_t global_begin,
+        const RSTNGaussTable& gauss
     );
 
-private:
-    static inline void gaussian_excitation_lut(
-        const RSTNParams& params, 
-        double* p_amp, 
-        double diff_f, 
-        double a_syn, 
-        const double* lut, 
-        double resolution, 
-        int max_idx
+    // 推論時の行更新: 励起 (Excitation) のみを計算し、次世代の振幅 amp_out だけを書き込む。
+    // 周波数・疲労・速度などは凍結されているため読み書きしない。
+    template <typename T>
+    static void update_row_inference(
+        const RSTNParams& params,
+        T* amp_out,
+        const T* prev_f,
+        const size_t begin,
+        const size_t count,
+        const T* a_syn,
+        const T* f_syn,
+        const RSTNGaussTable& gauss
+    );
+
+    // 静止ノード (近傍振幅がすべて 0・入力なし・v_f = fatigue = 0) の学習時の行更新。
+    // このとき振幅・v_f・fatigue・周波数は変化せず、不活動カウンタの加算と転生だけが起こる。
+    // 転生した周波数は f_a / f_b (周波数の両世代) の両方に書き込む。
+    template <typename T>
+    static void update_row_idle(
+        const RSTNParams& params,
+        T* f_a,
+        T* f_b,
+        int* inactivity_count,
+        const size_t begin,
+        const size_t count,
+        const uint32_t rng_seed,
+        const uint64_t rng_tick,
+        const uint64_t global_begin
     );
-    
-    static inline double rfa_update_lut(
-        const RSTNParams& params, 
-        double* p_f_self, 
-        double* p_v_f, 
-        double diff_f, 
-        double a_syn, 
-        const double* lut, 
-        double resolution, 
-        int max_idx
+
+    // 上記の静止ノードの更新が (通常の更新式で計算した場合と) 厳密に一致するパラメータかを判定する
+    template <typename T>
+    static bool idle_is_stationary(const RSTNParams& params);
+
+    // 全ノードの振幅が 0 で入力のない状態 (冷却中など) の学習時の更新を steps ステップ分まとめて行う。
+    // このとき合成入力は a_syn = 0, f_syn = f (自身) で一定なので、各ノードは近傍と独立に
+    // 通常の更新式 (v_f の減衰・疲労の回復・不活動カウンタ・転生) を 1 ステップずつ適用すればよい。
+    // (f, v_f, fatigue) が変化しなくなったノードは、次の不活動による転生までカウンタを直接進める。
+    // 結果は同じステップ数を通常どおり実行した場合とビット単位で一致する。
+    //   limit_multiplier : 各ステップの疲労限界倍率 (steps 要素, エイジング適用後の値)
+    //   rng_tick         : 最初のステップの転生用ティック (以降 1 ステップ毎に 1 進む)
+    // 前提: 振幅がすべて 0 のまま保たれる (a_limit >= 0 など) こと、f がすべて有限値であること
+    template <typename T>
+    static void update_row_quiet(
+        const RSTNParams& params,
+        T* f_self,
+        T* v_f,
+        T* fatigue,
+        const T* fatigue_limit,
+        int* inactivity_count,
+        const size_t begin,
+        const size_t count,
+        const int steps,
+        const T* limit_multiplier,
+        const uint32_t rng_seed,
+        const uint64_t rng_tick,
+        const uint64_t global_begin,
+        const RSTNGaussTable& gauss
     );
 
-    static inline void update_fatigue(const RSTNParams& params, double* p_fatigue, double amplitude, double force);
-    static inline bool try_rebirth(RSTNState& state, double next_random_f, const RSTNParams& params);
-};
\ No newline at end of file
+private:
+    template <typename T>
+    static inline void resonance(const RSTNGaussTable& gauss, const T* f_syn, const T* f_in,
+                                 size_t n, T* eff_ex, T* eff_learn);
+    template <typename T>
+    static inline T gaussian_excitation(const RSTNNodeConstants<T>& c, T a_syn, T efficiency);
+    template <typename T>
+    static inline T rfa_force(const RSTNNodeConstants<T>& c, T diff_f, T a_syn, T learn_efficiency);
+    template <typename T>
+    static inline T update_fatigue(const RSTNNodeConstants<T>& c, T fatigue, T amplitude, T force);
+};
+
+} // namespace RSTN_ISA_NAMESPACE
+
+using RSTN_ISA_NAMESPACE::RSTNNode;
@@ -1,6 +1,12 @@
 #pragma once
 #include <cmath>
 
+// 共鳴曲線 (ガウス関数) の評価方法 (RSTNGauss.hpp)
+enum GaussMode : int {
+    GAUSS_LUT = 0,        // 線形補間テーブル
+    GAUSS_FAST_EXP = 1,   // 多項式近似の exp
+};
+
 struct RSTNParams {
     // 物理定数
     double sigma_ex = 10.0;      // 共鳴帯域 (狭く設定)
@@ -13,6 +19,11 @@ struct RSTNParams {
     double a_threshold = 1.0;
     double a_limit = 100.0;
 
+    // 共鳴曲線の評価 (変更後は update_tables() を呼ぶ)
+    GaussMode gauss_mode = GAUSS_LUT;
+    double lut_epsilon = 1e-6;   // これを下回る値は 0 として扱う (テーブルの打ち切り位置)
+    double lut_step = 0.1;       // テーブルの周波数差の刻み幅 (線形補間)
+
     // 空間減衰率
     double attenuation = 0.15;
 
@@ -0,0 +1,161 @@
+#pragma once
+#include <algorithm>
+#include <chrono>
+#include <vector>
+#include <omp.h>
+#include "RSTNTrace.hpp"
+
+// step 内部のフェーズ別計測 (壁時計時間・呼び出し回数・並列領域のスレッド間の偏り)
+// トレースの記録中 (RSTNTrace.hpp) は、同じタイマーがフェーズのスパンも記録する。
+// RSTN_PROFILE=0 でコンパイルすると計測処理 (時刻の取得) とスパンの記録は完全に除去される。
+#ifndef RSTN_PROFILE
+#define RSTN_PROFILE 1
+#endif
+
+enum RSTNPhase : int {
+    PHASE_CONVERT = 0,   // Python の入力リスト -> C++ への変換 (bindings)
+    PHASE_STEP,          // step / step_arrays 全体 (以下の inputs 〜 idle を含む)
+    PHASE_INPUTS,        // 入力マップのクリアと設定
+    PHASE_AGING,         // エイジング係数の更新
+    PHASE_SCHEDULE,      // 疎ステップの更新行の選別
+    PHASE_STENCIL,       // 6 近傍以外の近傍和の一括計算 (並列, RSTNStencil.hpp)
+    PHASE_KERNEL,        // 物理演算カーネル (並列)
+    PHASE_IDLE,          // 疎ステップの静止行の簡略更新 (並列)
+    PHASE_TEMPORAL,      // run() の時間方向ブロッキング (並列, 1 ブロック = 複数ステップ)
+    PHASE_RECORD,        // run() のフレーム記録
+    PHASE_QUIET,         // advance_until_quiet の静止状態の早送り (並列)
+    PHASE_SNAPSHOT,      // 非同期実行中に読むスナップショットへの状態のコピー (RSTNAsync.hpp)
+    PHASE_CONVERGE,      // infer_until_converged の振幅の変化量の集計 (並列)
+    PHASE_SETTLE,        // ビューの参照中に現世代の振幅・周波数をバッファ 0 に揃えるコピー (並列)
+    PHASE_COUNT
+};
+
+struct RSTNPhaseStats {
+    long long calls = 0;
+    double seconds = 0.0;        // 壁時計時間の合計
+    // 並列領域のみ: 呼び出し毎の「最も遅いスレッド」「スレッド平均」の実行時間の合計
+    // thread_max / thread_mean が 1 に近いほど負荷が均等 (差はバリアでの待ち時間)
+    long long parallel_calls = 0;
+    double thread_max = 0.0;
+    double thread_mean = 0.0;
+};
+
+class RSTNProfiler {
+public:
+    using Clock = std::chrono::steady_clock;
+    static constexpr bool enabled = (RSTN_PROFILE != 0);
+
+    static const char* phase_name(int phase) {
+        static const char* const names[PHASE_COUNT] = {
+            "convert", "step", "inputs", "aging", "schedule", "stencil", "kernel", "idle", "temporal", "record", "quiet",
+            "snapshot", "converge", "settle"};
+        return names[phase];
+    }
+
+    const RSTNPhaseStats& stats(int phase) const { return phases[phase]; }
+
+    void reset() {
+        for (auto& s : phases) s = RSTNPhaseStats();
+    }
+
+    void add(int phase, double seconds) {
+        phases[phase].calls++;
+        phases[phase].seconds += seconds;
+    }
+
+    // 並列領域のスレッド数 (Box の num_threads, 0 は OpenMP の既定 = omp_get_max_threads())
+    void set_team_size(int n) { team = n; }
+    int team_size() const { return (team > 0) ? team : omp_get_max_threads(); }
+
+    // 並列領域の開始前に呼ぶ (team_size: 領域のスレッド数の上限)
+    void begin_parallel(int team_size) {
+        thread_seconds.assign(static_cast<size_t>(std::max(team_size, 1)), -1.0);
+    }
+
+    // 並列領域内で各スレッドが自身の実行時間を書き込む
+    void add_thread(double seconds) {
+        const size_t tid = static_cast<size_t>(omp_get_thread_num());
+        if (tid < thread_seconds.size()) thread_seconds[tid] = seconds;
+    }
+
+    // 並列領域の終了後に呼び、スレッド別の時間を集計する
+    void end_parallel(int phase) {
+        double max_s = 0.0, sum_s = 0.0;
+        int n = 0;
+        for (double s : thread_seconds) {
+            if (s < 0.0) continue;  // 領域に参加しなかったスレッド
+            max_s = std::max(max_s, s);
+            sum_s += s;
+            n++;
+        }
+        if (n == 0) return;
+        phases[phase].parallel_calls++;
+        phases[phase].thread_max += max_s;
+        phases[phase].thread_mean += sum_s / n;
+    }
+
+private:
+    RSTNPhaseStats phases[PHASE_COUNT];
+    std::vector<double> thread_seconds;
+    int team = 0;
+};
+
+#if RSTN_PROFILE
+
+// スコープの壁時計時間を phase に加算する
+// parallel = true の場合は、スコープ内の並列領域で RSTNThreadTimer が記録した時間も集計する
+class RSTNPhaseTimer {
+public:
+    RSTNPhaseTimer(RSTNProfiler& profiler, int phase, bool parallel = false)
+        : prof(profiler), phase(phase), parallel(parallel), t0(RSTNProfiler::Clock::now()) {
+        if (parallel) prof.begin_parallel(prof.team_size());
+    }
+    ~RSTNPhaseTimer() {
+        const auto t1 = RSTNProfiler::Clock::now();
+        prof.add(phase, std::chrono::duration<double>(t1 - t0).count());
+        if (parallel) prof.end_parallel(phase);
+        if (rstn_trace::enabled()) rstn_trace::record(RSTNProfiler::phase_name(phase), "rstn_cpp", t0, t1);
+    }
+    RSTNPhaseTimer(const RSTNPhaseTimer&) = delete;
+    RSTNPhaseTimer& operator=(const RSTNPhaseTimer&) = delete;
+
+private:
+    RSTNProfiler& prof;
+    int phase;
+    bool parallel;
+    RSTNProfiler::Clock::time_point t0;
+};
+
+// 並列領域内 (omp for nowait の外側) に置き、スレッド毎の実行時間を記録する
+class RSTNThreadTimer {
+public:
+    RSTNThreadTimer(RSTNProfiler& profiler, int phase)
+        : prof(profiler), phase(phase), t0(RSTNProfiler::Clock::now()) {}
+    ~RSTNThreadTimer() {
+        const auto t1 = RSTNProfiler::Clock::now();
+        prof.add_thread(std::chrono::duration<double>(t1 - t0).count());
+        if (rstn_trace::enabled()) rstn_trace::record(RSTNProfiler::phase_name(phase), "rstn_cpp.omp", t0, t1);
+    }
+    RSTNThreadTimer(const RSTNThreadTimer&) = delete;
+    RSTNThreadTimer& operator=(const RSTNThreadTimer&) = delete;
+
+private:
+    RSTNProfiler& prof;
+    int phase;
+    RSTNProfiler::Clock::time_point t0;
+};
+
+#else
+
+// 計測無効時は何もしない
+class RSTNPhaseTimer {
+public:
+    RSTNPhaseTimer(RSTNProfiler&, int, bool = false) {}
+};
+
+class RSTNThreadTimer {
+public:
+    RSTNThreadTimer(RSTNProfiler&, int) {}
+};
+
+#endif
@@ -0,0 +1,57 @@
+#pragma once
+#include <cstdint>
+
+// カウンタベース乱数 (Philox4x32-10)
+// 状態を持たず、(seed, ストリーム, ノード番号, ティック) から乱数を直接計算する。
+// スレッド数や分割方法に関係なく、同じ引数からは常に同じ値が得られる。
+namespace rstn_random {
+
+// 乱数の用途ごとの系列 (同じノード・ティックでも用途が異なれば独立な値になる)
+enum Stream : uint32_t {
+    STREAM_REBIRTH = 0,      // 転生時の新周波数
+    STREAM_INIT_F = 1,       // 初期化時の固有周波数
+    STREAM_INIT_LIMIT = 2,   // 初期化時の疲労限界
+};
+
+inline uint32_t mulhilo32(uint32_t a, uint32_t b, uint32_t& hi) {
+    const uint64_t p = static_cast<uint64_t>(a) * b;
+    hi = static_cast<uint32_t>(p >> 32);
+    return static_cast<uint32_t>(p);
+}
+
+// Philox4x32-10 の 1 ブロック (4 x 32bit) を計算する (結果は c に上書き)
+inline void philox4x32(uint32_t c[4], uint32_t k0, uint32_t k1) {
+    constexpr uint32_t M0 = 0xD2511F53u, M1 = 0xCD9E8D57u;
+    constexpr uint32_t W0 = 0x9E3779B9u, W1 = 0xBB67AE85u;
+    for (int r = 0; r < 10; ++r) {
+        uint32_t hi0, hi1;
+        const uint32_t lo0 = mulhilo32(M0, c[0], hi0);
+        const uint32_t lo1 = mulhilo32(M1, c[2], hi1);
+        const uint32_t n0 = hi1 ^ c[1] ^ k0;
+        const uint32_t n2 = hi0 ^ c[3] ^ k1;
+        c[0] = n0; c[1] = lo1; c[2] = n2; c[3] = lo0;
+        k0 += W0; k1 += W1;
+    }
+}
+
+// [0, 1) の一様乱数 (53bit 精度)
+//   seed   : RSTNBox の seed
+//   stream : 用途 (Stream)
+//   index  : ノードの大域インデックス
+//   tick   : ステップ (初期化時はリセット回数)
+inline double uniform(uint32_t seed, uint32_t stream, uint64_t index, uint64_t tick) {
+    uint32_t c[4] = {
+        static_cast<uint32_t>(index), static_cast<uint32_t>(index >> 32),
+        static_cast<uint32_t>(tick),  static_cast<uint32_t>(tick >> 32),
+    };
+    philox4x32(c, seed, stream);
+    const uint64_t bits = (static_cast<uint64_t>(c[0]) << 21) ^ (c[1] >> 11);
+    return static_cast<double>(bits & ((1ull << 53) - 1)) * (1.0 / 9007199254740992.0);
+}
+
+// [lo, hi) の一様乱数
+inline double uniform(uint32_t seed, uint32_t stream, uint64_t index, uint64_t tick, double lo, double hi) {
+    return lo + (hi - lo) * uniform(seed, stream, index, tick);
+}
+
+} // namespace rstn_random
@@ -0,0 +1,232 @@
+#include "RSTNReference.hpp"
+#include "RSTNRandom.hpp"
+#include <algorithm>
+#include <cmath>
+#include <limits>
+#include <stdexcept>
+#include <type_traits>
+#if defined(__SSE__) || defined(_M_X64)
+#include <xmmintrin.h>
+#define RSTN_HAS_MXCSR 1
+#endif
+
+template <typename T>
+RSTNReferenceBoxT<T>::RSTNReferenceBoxT(int n, int seed) : RSTNReferenceBoxT(n, n, n, seed) {}
+
+template <typename T>
+RSTNReferenceBoxT<T>::RSTNReferenceBoxT(int nx_, int ny_, int nz_, int seed)
+    : nx(nx_), ny(ny_), nz(nz_), current_step(0),
+      rng_seed(static_cast<uint32_t>(seed)), rng_tick(0), reset_count(0) {
+    if (nx <= 0 || ny <= 0 || nz <= 0) {
+        throw std::invalid_argument("Box dimensions must be positive.");
+    }
+    total_nodes = static_cast<size_t>(nx) * ny * nz;
+    if (total_nodes > static_cast<size_t>(std::numeric_limits<int>::max())) {
+        throw std::invalid_argument("Box has too many nodes (max 2^31 - 1).");
+    }
+    f_self.resize(total_nodes);
+    amplitude.resize(total_nodes);
+    v_f.resize(total_nodes);
+    fatigue.resize(total_nodes);
+    fatigue_limit.resize(total_nodes);
+    inactivity_count.resize(total_nodes);
+    input_active.assign(total_nodes, 0);
+    input_amp.assign(total_nodes, T(0));
+    input_freq.assign(total_nodes, T(0));
+
+    update_tables();
+    reset_states();
+}
+
+template <typename T>
+void RSTNReferenceBoxT<T>::update_tables() {
+    m_params.update_derived();
+    gauss_table.build(m_params);
+    aging_max_steps = m_params.max_steps;
+    aging_p_critical = m_params.p_critical;
+    aging_p_mature = m_params.p_mature;
+    aging_decay_alpha = m_params.decay_alpha;
+    aging_growth_beta = m_params.growth_beta;
+}
+
+template <typename T>
+void RSTNReferenceBoxT<T>::reset_states() {
+    current_step = 0;
+    apply_aging(0);
+
+    const uint64_t tick = reset_count++;
+    for (size_t i = 0; i < total_nodes; ++i) {
+        f_self[i] = static_cast<T>(rstn_random::uniform(rng_seed, rstn_random::STREAM_INIT_F, i, tick,
+                                                        m_params.f_min, m_params.f_max));
+        fatigue_limit[i] = static_cast<T>(rstn_random::uniform(rng_seed, rstn_random::STREAM_INIT_LIMIT, i, tick,
+                                                               m_params.fatigue_lim_min, m_params.fatigue_lim_max));
+        amplitude[i] = T(0);
+        v_f[i] = T(0);
+        fatigue[i] = T(0);
+        inactivity_count[i] = 0;
+    }
+}
+
+template <typename T>
+void RSTNReferenceBoxT<T>::apply_aging(long long step) {
+    const double p = static_cast<double>(step) / static_cast<double>(aging_max_steps);
+    m_params.current_learning_rate = 1.0 / std::pow(1.0 + p / aging_p_critical, aging_decay_alpha);
+    m_params.current_limit_multiplier = std::pow(1.0 + p / aging_p_mature, aging_growth_beta);
+}
+
+template <typename T>
+void RSTNReferenceBoxT<T>::set_input(int idx, double amp, double freq) {
+    if (idx < 0) return;
+    if (static_cast<size_t>(idx) >= total_nodes) {
+        throw std::out_of_range("Input node index out of range.");
+    }
+    input_active[idx] = 1;
+    input_amp[idx] = static_cast<T>(amp);
+    input_freq[idx] = static_cast<T>(freq);
+}
+
+template <typename T>
+void RSTNReferenceBoxT<T>::step(const std::vector<std::pair<int, std::pair<double, double>>>& inputs, bool is_learning) {
+    std::fill(input_active.begin(), input_active.end(), 0);
+    for (const auto& inp : inputs) set_input(inp.first, inp.second.first, inp.second.second);
+
+    // エイジングは学習ステップでのみ進む (max_steps 以降は最終値を維持)
+    if (is_learning) {
+        if (current_step < aging_max_steps) current_step++;
+        apply_aging(current_step);
+    }
+    update_nodes(is_learning);
+    rng_tick++;
+}
+
+template <typename T>
+void RSTNReferenceBoxT<T>::step_arrays(const int* indices, const double* amps, const double* freqs,
+                                       size_t count, bool is_learning) {
+    std::vector<std::pair<int, std::pair<double, double>>> inputs(count);
+    for (size_t k = 0; k < count; ++k) inputs[k] = {indices[k], {amps[k], freqs[k]}};
+    step(inputs, is_learning);
+}
+
+template <typename T>
+T RSTNReferenceBoxT<T>::resonance(T diff, int curve) const {
+    if (gauss_table.mode == GAUSS_FAST_EXP) {
+        const double coeff = (curve == 0) ? gauss_table.coeff_ex : gauss_table.coeff_learn;
+        return rstn_gauss::exp_curve(diff * diff, static_cast<T>(coeff), static_cast<T>(gauss_table.log_epsilon));
+    }
+    const T pos = rstn_gauss::lut_position(diff, static_cast<T>(gauss_table.inv_step),
+                                           static_cast<T>(gauss_table.max_idx));
+    return rstn_gauss::lut_interp(gauss_table.entries.data(), pos, curve);
+}
+
+template <typename T>
+void RSTNReferenceBoxT<T>::update_nodes(bool is_learning) {
+#ifdef RSTN_HAS_MXCSR
+    // 単精度版の最適化カーネルと同じく、計算中は非正規化数を 0 として扱う (FTZ/DAZ)
+    const unsigned int saved_csr = _mm_getcsr();
+    if (std::is_same<T, float>::value) _mm_setcsr(saved_csr | 0x8040u);
+#endif
+
+    const RSTNParams& p = m_params;
+    const T attenuation_gain = static_cast<T>(1.0 - p.attenuation);
+    const T inertia = static_cast<T>(p.inertia);
+    const T viscosity = static_cast<T>(p.viscosity);
+    const T dead_band = static_cast<T>(p.dead_band);
+    const T c_load = static_cast<T>(p.c_load);
+    const T c_recover = static_cast<T>(p.c_recover);
+    const T a_threshold = static_cast<T>(p.a_threshold);
+    const T a_limit = static_cast<T>(p.a_limit);
+    const T learning_rate = static_cast<T>(p.current_learning_rate);
+    const T limit_multiplier = static_cast<T>(p.current_limit_multiplier);
+
+    // 現世代のスナップショット (近傍はすべてここから読む)
+    const std::vector<T> prev_amp = amplitude;
+    const std::vector<T> prev_f = f_self;
+
+    for (int z = 0; z < nz; ++z) {
+        for (int y = 0; y < ny; ++y) {
+            for (int x = 0; x < nx; ++x) {
+                const size_t i = index_of(x, y, z);
+
+                // --- 1. 近傍 (x-1, x+1, y-1, y+1, z-1, z+1 の順) の振幅と振幅加重の周波数を集計 ---
+                T sum_a = T(0);
+                T sum_af = T(0);
+                int count = 0;
+                auto add_neighbor = [&](size_t j) {
+                    const T a = std::abs(prev_amp[j]);
+                    sum_a += a;
+                    sum_af += a * prev_f[j];
+                    count++;
+                };
+                if (x > 0)      add_neighbor(index_of(x - 1, y, z));
+                if (x < nx - 1) add_neighbor(index_of(x + 1, y, z));
+                if (y > 0)      add_neighbor(index_of(x, y - 1, z));
+                if (y < ny - 1) add_neighbor(index_of(x, y + 1, z));
+                if (z > 0)      add_neighbor(index_of(x, y, z - 1));
+                if (z < nz - 1) add_neighbor(index_of(x, y, z + 1));
+
+                // --- 2. 合成入力 (直接入力があればそれで置き換える) ---
+                T a_syn, f_syn;
+                if (input_active[i]) {
+                    a_syn = std::abs(input_amp[i]);
+                    f_syn = input_freq[i];
+                } else {
+                    const T c = static_cast<T>(count);
+                    a_syn = ((c > T(0)) ? sum_a / c : T(0)) * attenuation_gain;
+                    f_syn = (sum_a > T(1e-9)) ? sum_af / sum_a : prev_f[i];
+                }
+
+                const T f_in = prev_f[i];
+                const T diff = f_syn - f_in;
+
+                // --- 3. 励起 ---
+                const T a = std::min(a_syn * resonance(diff, 0), a_limit);
+                if (!is_learning) {
+                    amplitude[i] = a;   // 推論: 振幅のみ更新し、他の状態は凍結
+                    continue;
+                }
+
+                // --- 4. 適応 (RFA) ---
+                T force = T(0);
+                if (std::abs(diff) >= dead_band) {
+                    force = (diff > 0 ? T(1) : T(-1)) * (a_syn * resonance(diff, 2));
+                    force *= learning_rate;
+                }
+                T new_v_f = (v_f[i] * inertia) + (force * (T(1) - inertia));
+                new_v_f *= viscosity;
+                const T f = f_in + new_v_f;
+
+                // --- 5. 代謝 (疲労) ---
+                const bool stuck = std::abs(force) < dead_band;
+                T fat = stuck ? fatigue[i] + c_load * (a / a_limit)
+                              : std::max(T(0), fatigue[i] - c_recover);
+                if (a < a_threshold) fat = std::max(T(0), fat - c_recover);
+                const int inact = stuck ? inactivity_count[i] + 1 : 0;
+
+                // --- 6. 転生 (過労または不活動) ---
+                const bool overwork = fat > fatigue_limit[i] * limit_multiplier;
+                const bool stagnant = inact > p.inactivity_limit && a < a_threshold;
+                if (overwork || stagnant) {
+                    f_self[i] = static_cast<T>(rstn_random::uniform(rng_seed, rstn_random::STREAM_REBIRTH,
+                                                                    i, rng_tick, p.f_min, p.f_max));
+                    amplitude[i] = T(0);
+                    v_f[i] = T(0);
+                    fatigue[i] = T(0);
+                    inactivity_count[i] = 0;
+                } else {
+                    f_self[i] = f;
+                    amplitude[i] = a;
+                    v_f[i] = new_v_f;
+                    fatigue[i] = fat;
+                    inactivity_count[i] = inact;
+                }
+            }
+        }
+    }
+
+#ifdef RSTN_HAS_MXCSR
+    if (std::is_same<T, float>::value) _mm_setcsr(saved_csr);
+#endif
+}
+
+template class RSTNReferenceBoxT<double>;
+template class RSTNReferenceBoxT<float>;
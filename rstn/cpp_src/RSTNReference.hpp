@@ -0,0 +1,79 @@
+#pragma once
+
+#include <cstdint>
+#include <utility>
+#include <vector>
+#include "RSTNParams.hpp"
+#include "RSTNGauss.hpp"
+
+// 参照実装 (検証用)
+// RSTNBoxT と同じ 1 ステップの意味論を、最適化なしで 1 ノードずつ素直に計算する。
+// ピンポンバッファ・行単位のベクトル化・疎ステップ・ブロッキング・命令セット別の実装は一切使わず、
+// 各ステップの開始時に現世代の振幅・周波数をコピーしてから全ノードを z, y, x の順に更新する。
+// 演算の順序と精度 (T への変換位置) は最適化版と同じにしてあるため、結果はビット単位で一致する。
+// 差分検証 (experiments/benchmarks/check_engines.py) の基準として使い、速度は考慮しない。
+template <typename T>
+class RSTNReferenceBoxT {
+public:
+    using value_type = T;
+
+    RSTNReferenceBoxT(int nx, int ny, int nz, int seed = 42);
+    RSTNReferenceBoxT(int n, int seed = 42);
+
+    // 1 ステップ (入力は [(index, (amp, freq)), ...], index < 0 は無視, 重複時は後の値を使う)
+    void step(const std::vector<std::pair<int, std::pair<double, double>>>& inputs, bool is_learning);
+    void step_arrays(const int* indices, const double* amps, const double* freqs, size_t count, bool is_learning);
+    void reset_states();
+    void update_tables();
+
+    RSTNParams& get_params() { return m_params; }
+    long long get_current_step() const { return current_step; }
+
+    T* get_f_self_ptr() { return f_self.data(); }
+    T* get_amplitude_ptr() { return amplitude.data(); }
+    T* get_v_f_ptr() { return v_f.data(); }
+    T* get_fatigue_ptr() { return fatigue.data(); }
+    T* get_fatigue_limit_ptr() { return fatigue_limit.data(); }
+    int* get_inactivity_count_ptr() { return inactivity_count.data(); }
+    size_t get_total_nodes() const { return total_nodes; }
+
+    int get_nx() const { return nx; }
+    int get_ny() const { return ny; }
+    int get_nz() const { return nz; }
+
+private:
+    int nx, ny, nz;
+    size_t total_nodes;
+    RSTNParams m_params;
+    long long current_step;
+    uint32_t rng_seed;
+    uint64_t rng_tick;
+    uint64_t reset_count;
+    RSTNGaussTable gauss_table;
+
+    // エイジングスケジュール (update_tables() 時点のパラメータ)
+    long long aging_max_steps;
+    double aging_p_critical, aging_p_mature, aging_decay_alpha, aging_growth_beta;
+
+    std::vector<T> f_self, amplitude, v_f, fatigue, fatigue_limit;
+    std::vector<int> inactivity_count;
+
+    // 直接入力 (ステップ毎に全体をクリアする)
+    std::vector<char> input_active;
+    std::vector<T> input_amp, input_freq;
+
+    size_t index_of(int x, int y, int z) const {
+        return static_cast<size_t>(x) + static_cast<size_t>(y) * nx + static_cast<size_t>(z) * nx * ny;
+    }
+    void set_input(int idx, double amp, double freq);
+    void apply_aging(long long step);
+    void update_nodes(bool is_learning);
+    // 共鳴曲線 (curve: 0 = 励起, 2 = 学習) の値
+    T resonance(T diff, int curve) const;
+};
+
+extern template class RSTNReferenceBoxT<double>;
+extern template class RSTNReferenceBoxT<float>;
+
+using RSTNReferenceBox = RSTNReferenceBoxT<double>;
+using RSTNReferenceBoxF32 = RSTNReferenceBoxT<float>;
@@ -1,10 +1,16 @@
 #pragma once
 
-struct RSTNState {
-    double f_self;          // 固有周波数
-    double amplitude;       // 振幅
-    double v_f;             // 周波数速度
-    double fatigue;         // 疲労度
-    double fatigue_limit;   // 疲労限界
-    int inactivity_count;   // 不活動カウンタ (for Inactivity Death)
-};
\ No newline at end of file
+// SoA (Structure of Arrays) 形式のノード状態ビュー
+// 実体 (メモリ) は RSTNBox が所有し、ここでは各フィールド配列の先頭ポインタのみを保持する。
+// T は演算精度 (double / float)
+template <typename T>
+struct RSTNStateT {
+    T* f_self;               // 固有周波数
+    T* amplitude;            // 振幅
+    T* v_f;                  // 周波数速度
+    T* fatigue;              // 疲労度
+    T* fatigue_limit;        // 疲労限界
+    int* inactivity_count;   // 不活動カウンタ (for Inactivity Death)
+};
+
+using RSTNState = RSTNStateT<double>;
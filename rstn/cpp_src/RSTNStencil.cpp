@@ -0,0 +1,248 @@
+#include "RSTNStencil.hpp"
+#include <algorithm>
+#include <cmath>
+#include <stdexcept>
+#include <type_traits>
+#if defined(__SSE__) || defined(_M_X64)
+#include <xmmintrin.h>
+#define RSTN_HAS_MXCSR 1
+#endif
+
+RSTNStencil RSTNStencil::parse(const std::string& name, int radius) {
+    RSTNStencil s;
+    if (name == "von_neumann") {
+        s.shape = RSTNStencilShape::VON_NEUMANN;
+    } else if (name == "moore") {
+        s.shape = RSTNStencilShape::MOORE;
+    } else if (name == "cube") {
+        s.shape = RSTNStencilShape::CUBE;
+    } else if (name == "sphere") {
+        s.shape = RSTNStencilShape::SPHERE;
+    } else {
+        throw std::invalid_argument("unknown stencil: " + name + " (expected von_neumann, moore, cube or sphere)");
+    }
+    if (radius < 1) {
+        throw std::invalid_argument("stencil radius must be >= 1.");
+    }
+    if ((s.shape == RSTNStencilShape::VON_NEUMANN || s.shape == RSTNStencilShape::MOORE) && radius != 1) {
+        throw std::invalid_argument("von_neumann and moore stencils have radius 1; use cube or sphere.");
+    }
+    s.radius = radius;
+    return s;
+}
+
+const char* RSTNStencil::name() const {
+    switch (shape) {
+        case RSTNStencilShape::MOORE: return "moore";
+        case RSTNStencilShape::CUBE: return "cube";
+        case RSTNStencilShape::SPHERE: return "sphere";
+        default: return "von_neumann";
+    }
+}
+
+namespace {
+
+// 長さ n の直線 lines 本 (直線 l の k 番目の要素の位置 = k * step + l * line_step) について、
+// 各要素の両側 r 個ずつの和 (範囲外は除く) を求める:
+//   out[i] = (Σ_{k=i-r}^{i-1} in[k]) + (Σ_{k=i+1}^{i+r} in[k])   (空の窓は 0)
+// 長さ r 以下の窓は長さ r のブロックを高々 2 つしかまたがないため、ブロック内の後方累積和 suf と
+// 前方累積和 pre を使って suf[a] + pre[b] (同じブロック内なら suf[a] か pre[b] の一方) で表せる。
+// pre / suf は作業領域 (n * lines 要素, 要素 k・直線 l を k * lines + l に置く)
+template <typename T>
+void side_sums(const T* in, T* out, int n, size_t step, int lines, size_t line_step, int r, T* pre, T* suf) {
+    for (int k = 0; k < n; ++k) {
+        const T* src = in + k * step;
+        T* p = pre + static_cast<size_t>(k) * lines;
+        if (k % r == 0) {
+            for (int l = 0; l < lines; ++l) p[l] = src[l * line_step];
+        } else {
+            const T* prev = p - lines;
+            for (int l = 0; l < lines; ++l) p[l] = prev[l] + src[l * line_step];
+        }
+    }
+    for (int k = n - 1; k >= 0; --k) {
+        const T* src = in + k * step;
+        T* s = suf + static_cast<size_t>(k) * lines;
+        if (k % r == r - 1 || k == n - 1) {
+            for (int l = 0; l < lines; ++l) s[l] = src[l * line_step];
+        } else {
+            const T* next = s + lines;
+            for (int l = 0; l < lines; ++l) s[l] = next[l] + src[l * line_step];
+        }
+    }
+
+    // 窓 [lo, hi] の和を表す項 (first[l] または first[l] + second[l], 空の窓は first = nullptr)
+    struct Window {
+        const T* first;
+        const T* second;
+    };
+    auto window = [&](int lo, int hi) -> Window {
+        if (lo > hi) return {nullptr, nullptr};
+        const T* s = suf + static_cast<size_t>(lo) * lines;
+        const T* p = pre + static_cast<size_t>(hi) * lines;
+        if (lo / r != hi / r) return {s, p};
+        const int block_end = std::min((lo / r + 1) * r, n) - 1;
+        return (hi == block_end) ? Window{s, nullptr} : Window{p, nullptr};
+    };
+    auto value = [](const Window& w, int l) -> T {
+        if (!w.first) return T(0);
+        return w.second ? w.first[l] + w.second[l] : w.first[l];
+    };
+
+    for (int i = 0; i < n; ++i) {
+        const Window left = window(std::max(0, i - r), i - 1);
+        const Window right = window(i + 1, std::min(n - 1, i + r));
+        T* dst = out + i * step;
+        for (int l = 0; l < lines; ++l) dst[l * line_step] = value(left, l) + value(right, l);
+    }
+}
+
+// floor(sqrt(v)) (v >= 0)
+int isqrt(int v) {
+    int w = 0;
+    while ((w + 1) * (w + 1) <= v) ++w;
+    return w;
+}
+
+} // namespace
+
+template <typename T>
+void RSTNStencilSums<T>::configure(const RSTNStencil& s, int nx_, int ny_, int nz_, int num_threads) {
+    stencil = s;
+    nx = nx_;
+    ny = ny_;
+    nz = nz_;
+    nodes = static_cast<size_t>(nx) * ny * nz;
+    sum_a_.reset();
+    sum_f_.reset();
+    count_.reset();
+    work.clear();
+    if (!stencil.precomputed()) return;
+
+    sum_a_ = std::make_unique<T[]>(nodes);
+    sum_f_ = std::make_unique<T[]>(nodes);
+    count_ = std::make_unique<T[]>(nodes);
+    // 量 (|a|, |a| * f) ごとの中間結果
+    // 立方体: y 方向まで集計した和 (自身の x-y 面を除く / 含む) の 2 配列
+    // 球: 集計する値そのもの・x 方向の半径 r の両側和・半径 1 .. r-1 の窓和 (自身を含む)
+    const int per_quantity = (stencil.shape == RSTNStencilShape::SPHERE) ? stencil.radius + 1 : 2;
+    for (int k = 0; k < 2 * per_quantity; ++k) work.push_back(std::make_unique<T[]>(nodes));
+
+    // 近傍数: すべて 1 の配列の近傍和 (整数値なので誤差なく求まる)
+    std::vector<T> ones(nodes, T(1));
+    RSTNProfiler unused;
+    accumulate(ones.data(), nullptr, count_.get(), nullptr, unused, num_threads);
+}
+
+template <typename T>
+void RSTNStencilSums<T>::compute(const T* amp, const T* f, RSTNProfiler& profiler, int num_threads) {
+    if (!stencil.precomputed()) return;
+    RSTNPhaseTimer timer(profiler, PHASE_STENCIL, true);
+    accumulate(amp, f, sum_a_.get(), sum_f_.get(), profiler, num_threads);
+}
+
+template <typename T>
+void RSTNStencilSums<T>::accumulate(const T* amp, const T* f, T* out_a, T* out_f, RSTNProfiler& profiler,
+                                     int num_threads) {
+    const int r = stencil.radius;
+    const bool sphere = (stencil.shape == RSTNStencilShape::SPHERE);
+    const size_t plane = static_cast<size_t>(nx) * ny;
+    const size_t strip = static_cast<size_t>(nz) * nx;
+    const int quantities = f ? 2 : 1;
+    const int per_quantity = sphere ? r + 1 : 2;
+    T* out[2] = {out_a, out_f};
+
+    #pragma omp parallel num_threads(num_threads)
+    {
+        RSTNThreadTimer thread_timer(profiler, PHASE_STENCIL);
+#ifdef RSTN_HAS_MXCSR
+        // 単精度版のカーネルと同じく、計算中は非正規化数を 0 として扱う (FTZ/DAZ)
+        const unsigned int saved_csr = _mm_getcsr();
+        if (std::is_same<T, float>::value) _mm_setcsr(saved_csr | 0x8040u);
+#endif
+        std::vector<T> pre(std::max(plane, strip)), suf(std::max(plane, strip));
+        std::vector<T> v(plane), xe(plane), xf(plane), sy(plane);
+
+        // --- 1. z 面ごと: x 方向 (球) / x, y 方向 (立方体) の集計 ---
+        #pragma omp for schedule(static)
+        for (int z = 0; z < nz; ++z) {
+            const size_t zo = static_cast<size_t>(z) * plane;
+            for (int q = 0; q < quantities; ++q) {
+                std::unique_ptr<T[]>* w = work.data() + q * per_quantity;
+                // 集計する量: |a| または |a| * f
+                for (size_t i = 0; i < plane; ++i) {
+                    const T a = std::abs(amp[zo + i]);
+                    v[i] = (q == 0) ? a : a * f[zo + i];
+                }
+                if (!sphere) {
+                    // 同じ行 (自身を除く / 含む) -> 同じ面 (自身を除く / 含む)
+                    side_sums(v.data(), xe.data(), nx, 1, ny, nx, r, pre.data(), suf.data());
+                    for (size_t i = 0; i < plane; ++i) xf[i] = xe[i] + v[i];
+                    side_sums(xf.data(), sy.data(), ny, nx, nx, 1, r, pre.data(), suf.data());
+                    T* ye = w[0].get() + zo;
+                    T* yf = w[1].get() + zo;
+                    for (size_t i = 0; i < plane; ++i) {
+                        ye[i] = sy[i] + xe[i];
+                        yf[i] = sy[i] + xf[i];
+                    }
+                } else {
+                    std::copy(v.begin(), v.end(), w[0].get() + zo);
+                    side_sums(v.data(), w[1].get() + zo, nx, 1, ny, nx, r, pre.data(), suf.data());
+                    for (int hw = 1; hw < r; ++hw) {
+                        side_sums(v.data(), xe.data(), nx, 1, ny, nx, hw, pre.data(), suf.data());
+                        T* xw = w[1 + hw].get() + zo;
+                        for (size_t i = 0; i < plane; ++i) xw[i] = xe[i] + v[i];
+                    }
+                }
+            }
+        }
+
+        // --- 2. 残りの方向の集計 (1 の結果を全 z 面分参照する) ---
+        if (!sphere) {
+            // 立方体: 前後の面 (z 方向の両側和) + 自身の面 (自身を除く)
+            #pragma omp for schedule(static) nowait
+            for (int y = 0; y < ny; ++y) {
+                const size_t yo = static_cast<size_t>(y) * nx;
+                for (int q = 0; q < quantities; ++q) {
+                    const T* ye = work[q * per_quantity].get();
+                    const T* yf = work[q * per_quantity + 1].get();
+                    T* o = out[q];
+                    side_sums(yf + yo, o + yo, nz, plane, nx, 1, r, pre.data(), suf.data());
+                    for (int z = 0; z < nz; ++z) {
+                        const size_t base = static_cast<size_t>(z) * plane + yo;
+                        for (int x = 0; x < nx; ++x) o[base + x] = o[base + x] + ye[base + x];
+                    }
+                }
+            }
+        } else {
+            // 球: (dz, dy) ごとに x 方向の半幅 floor(sqrt(r^2 - dy^2 - dz^2)) の窓和を足す
+            const int rows = ny * nz;
+            #pragma omp for schedule(static) nowait
+            for (int row = 0; row < rows; ++row) {
+                const int y = row % ny;
+                const int z = row / ny;
+                for (int q = 0; q < quantities; ++q) {
+                    const std::unique_ptr<T[]>* w = work.data() + q * per_quantity;
+                    T* o = out[q] + static_cast<size_t>(row) * nx;
+                    std::fill(o, o + nx, T(0));
+                    for (int dz = std::max(-r, -z); dz <= std::min(r, nz - 1 - z); ++dz) {
+                        for (int dy = std::max(-r, -y); dy <= std::min(r, ny - 1 - y); ++dy) {
+                            const int rest = r * r - dy * dy - dz * dz;
+                            if (rest < 0) continue;
+                            const int hw = isqrt(rest);
+                            const T* src = (dz == 0 && dy == 0) ? w[1].get() : (hw == 0 ? w[0].get() : w[1 + hw].get());
+                            src += static_cast<size_t>((z + dz) * ny + (y + dy)) * nx;
+                            for (int x = 0; x < nx; ++x) o[x] = o[x] + src[x];
+                        }
+                    }
+                }
+            }
+        }
+#ifdef RSTN_HAS_MXCSR
+        if (std::is_same<T, float>::value) _mm_setcsr(saved_csr);
+#endif
+    }
+}
+
+template class RSTNStencilSums<double>;
+template class RSTNStencilSums<float>;
@@ -0,0 +1,61 @@
+#pragma once
+#include <cstddef>
+#include <memory>
+#include <string>
+#include <vector>
+#include "RSTNProfile.hpp"
+
+// 空間伝播に使う近傍の形状
+//   VON_NEUMANN : x, y, z 方向の 6 近傍 (既定, カーネル内で直接集計する)
+//   MOORE       : 周囲 26 近傍 (半径 1 の立方体)
+//   CUBE        : 半径 r の立方体 ((2r+1)^3 - 1 近傍)
+//   SPHERE      : 半径 r の球 (dx^2 + dy^2 + dz^2 <= r^2 の格子点, 自身を除く)
+enum class RSTNStencilShape { VON_NEUMANN, MOORE, CUBE, SPHERE };
+
+struct RSTNStencil {
+    RSTNStencilShape shape = RSTNStencilShape::VON_NEUMANN;
+    int radius = 1;
+
+    // 名前 ("von_neumann" / "moore" / "cube" / "sphere") と半径から作る (不正な組み合わせは例外)
+    static RSTNStencil parse(const std::string& name, int radius);
+    const char* name() const;
+    // 6 近傍以外は近傍の集計をカーネルの前に全ノード分まとめて行う
+    bool precomputed() const { return shape != RSTNStencilShape::VON_NEUMANN; }
+};
+
+// 近傍の振幅・振幅 x 周波数の和 (自身を除く, 範囲外の近傍は含めない) の一括計算
+//   sum_a[i] = Σ |amp[j]|,  sum_f[i] = Σ |amp[j]| * f[j]
+// 立方体は x, y, z 方向の窓和の合成で求める。窓和は長さ r のブロックごとの前方・後方累積和の
+// 2 項で表せるため、半径によらず 1 ノードあたりの加算回数は一定になる。
+// 球は半径ごとの x 方向の窓和を (dy, dz) ごとに足し合わせる (1 ノードあたり O(r^2))。
+// 減算を使わないため、近傍の振幅がすべて 0 なら和も厳密に 0 になる。
+// 加算順序は固定で、スレッド数に依存しない (NumPy 版 rstn/numpy_backend.py も同じ順序で計算する)。
+template <typename T>
+class RSTNStencilSums {
+public:
+    // 形状とサイズを設定し、作業領域の確保と近傍数の計算を行う (6 近傍の場合はすべて解放する)
+    // num_threads: 並列領域のスレッド数 (Box の設定)
+    void configure(const RSTNStencil& stencil, int nx, int ny, int nz, int num_threads);
+    // 現世代の振幅・周波数から sum_a / sum_f を計算する (並列, 計測フェーズ "stencil")
+    void compute(const T* amp, const T* f, RSTNProfiler& profiler, int num_threads);
+
+    const T* sum_a() const { return sum_a_.get(); }
+    const T* sum_f() const { return sum_f_.get(); }
+    // 各ノードの実際の近傍数 (境界では少なくなる)
+    const T* count() const { return count_.get(); }
+
+private:
+    void accumulate(const T* amp, const T* f, T* out_a, T* out_f, RSTNProfiler& profiler, int num_threads);
+
+    RSTNStencil stencil;
+    int nx = 0, ny = 0, nz = 0;
+    size_t nodes = 0;
+    std::unique_ptr<T[]> sum_a_;
+    std::unique_ptr<T[]> sum_f_;
+    std::unique_ptr<T[]> count_;
+    // 中間結果 (量ごとに, 立方体: y 方向まで集計した 2 配列, 球: x 方向の窓和を半径ごとに)
+    std::vector<std::unique_ptr<T[]>> work;
+};
+
+extern template class RSTNStencilSums<double>;
+extern template class RSTNStencilSums<float>;
@@ -0,0 +1,88 @@
+#pragma once
+#include <atomic>
+#include <chrono>
+#include <cstdint>
+#include <functional>
+#include <mutex>
+#include <thread>
+#include <vector>
+#include <omp.h>
+#if defined(__linux__)
+#include <sys/syscall.h>
+#include <unistd.h>
+#endif
+
+// プロセス全体のスパン記録 (Chrome / Perfetto のトレース形式への書き出し用)
+// RSTNProfile.hpp のフェーズタイマーが、記録中 (start() 〜 stop()) のみスパンを追加する。
+// 書き出し (JSON 化) は Python 側 (experiments/tracing.py) が collect() の結果から行う。
+namespace rstn_trace {
+
+using Clock = std::chrono::steady_clock;
+
+// 記録するイベント数の上限 (超過分は破棄して dropped に数える)
+constexpr size_t MAX_EVENTS = 1 << 22;
+
+struct Event {
+    const char* name;      // フェーズ名 (静的な文字列)
+    const char* category;  // "rstn_cpp" (呼び出し全体) / "rstn_cpp.omp" (並列領域内の各スレッド)
+    uint64_t tid;          // OS のスレッド ID (Python の threading.get_native_id() と同じ値)
+    int omp_thread;        // OpenMP のスレッド番号
+    int64_t ts_ns;         // 開始時刻 (now_ns() と同じ時計)
+    int64_t dur_ns;
+};
+
+namespace detail {
+inline std::atomic<bool> g_enabled{false};
+inline std::mutex g_mutex;
+inline std::vector<Event> g_events;
+inline size_t g_dropped = 0;
+} // namespace detail
+
+inline bool enabled() { return detail::g_enabled.load(std::memory_order_relaxed); }
+
+inline int64_t to_ns(Clock::time_point t) {
+    return std::chrono::duration_cast<std::chrono::nanoseconds>(t.time_since_epoch()).count();
+}
+
+inline int64_t now_ns() { return to_ns(Clock::now()); }
+
+inline uint64_t native_thread_id() {
+#if defined(__linux__)
+    static thread_local const uint64_t tid = static_cast<uint64_t>(::syscall(SYS_gettid));
+#else
+    static thread_local const uint64_t tid = std::hash<std::thread::id>()(std::this_thread::get_id());
+#endif
+    return tid;
+}
+
+// 記録を開始する (それまでに記録したイベントは破棄する)
+inline void start() {
+    std::lock_guard<std::mutex> lock(detail::g_mutex);
+    detail::g_events.clear();
+    detail::g_dropped = 0;
+    detail::g_enabled.store(true, std::memory_order_relaxed);
+}
+
+inline void stop() { detail::g_enabled.store(false, std::memory_order_relaxed); }
+
+inline void record(const char* name, const char* category, Clock::time_point t0, Clock::time_point t1) {
+    const Event ev{name, category, native_thread_id(), omp_get_thread_num(), to_ns(t0), to_ns(t1) - to_ns(t0)};
+    std::lock_guard<std::mutex> lock(detail::g_mutex);
+    if (detail::g_events.size() >= MAX_EVENTS) {
+        detail::g_dropped++;
+        return;
+    }
+    detail::g_events.push_back(ev);
+}
+
+// 記録済みのイベントを取り出す (バッファは空になる)
+inline std::vector<Event> collect(size_t* dropped = nullptr) {
+    std::lock_guard<std::mutex> lock(detail::g_mutex);
+    std::vector<Event> out;
+    out.swap(detail::g_events);
+    if (dropped) *dropped = detail::g_dropped;
+    detail::g_dropped = 0;
+    return out;
+}
+
+} // namespace rstn_trace
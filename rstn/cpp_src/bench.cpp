@@ -0,0 +1,234 @@
+// R-STN エンジンのベンチマーク (ネイティブ版)
+// experiments/benchmarks/bench_engine.py と同じ条件・同じ JSON 形式で結果を出力する。
+//
+//   ./rstn_bench --sizes 16,32,64,128 --threads 1,4 --inputs point,plane,faces --modes learn,infer
+//                --precision f64,f32 --repeat 3 --json result.json
+//
+// 条件の組み合わせごとに warmup ステップ実行した後、steps ステップの run() を repeat 回計測し、中央値を報告する。
+// steps を省略した場合は 1 回の計測がおよそ NODE_BUDGET ノード更新になるよう N から決める。
+#include <algorithm>
+#include <chrono>
+#include <cstdio>
+#include <cstring>
+#include <ctime>
+#include <fstream>
+#include <iostream>
+#include <sstream>
+#include <stdexcept>
+#include <string>
+#include <vector>
+#include <omp.h>
+#include "RSTNBox.hpp"
+#include "RSTNDispatch.hpp"
+
+namespace {
+
+constexpr double NODE_BUDGET = 4.0e7;
+
+struct Options {
+    std::vector<int> sizes{16, 32, 64, 128};
+    std::vector<int> threads;
+    std::vector<std::string> inputs{"point", "plane", "faces"};
+    std::vector<std::string> modes{"learn", "infer"};
+    std::vector<std::string> precision{"f64"};
+    int steps = 0;        // 0: NODE_BUDGET から決める
+    int warmup = 10;
+    int repeat = 3;
+    std::string json_path;
+};
+
+struct Result {
+    std::string precision, inputs, mode;
+    int n, threads, steps;
+    double seconds;        // 中央値
+    double seconds_min;
+    double bytes_per_update;
+};
+
+std::vector<std::string> split(const std::string& s) {
+    std::vector<std::string> out;
+    std::stringstream ss(s);
+    std::string item;
+    while (std::getline(ss, item, ',')) {
+        if (!item.empty()) out.push_back(item);
+    }
+    return out;
+}
+
+std::vector<int> split_int(const std::string& s) {
+    std::vector<int> out;
+    for (const auto& item : split(s)) out.push_back(std::stoi(item));
+    return out;
+}
+
+// 入力パターン (実験 Case の入力と同じ配置)
+//   point: Z=0 中央の送信点と Z=N-1 の受信点 (Case 5 / 6)
+//   plane: Z=0 面全体 (Case 1 / 3 / 4)
+//   faces: X=0 面と X=N-1 面の対 (Case 2)
+void make_inputs(const std::string& pattern, int n,
+                 std::vector<int>& idx, std::vector<double>& amp, std::vector<double>& freq) {
+    idx.clear();
+    amp.clear();
+    freq.clear();
+    auto add = [&](int i, double f) { idx.push_back(i); amp.push_back(100.0); freq.push_back(f); };
+    if (pattern == "point") {
+        const int c = n / 2;
+        const int t = std::max(n - 4, 0);
+        add(c + c * n, 20.0);
+        add(t + t * n + (n - 1) * n * n, 20.0);
+    } else if (pattern == "plane") {
+        for (int i = 0; i < n * n; ++i) add(i, 25.0);
+    } else if (pattern == "faces") {
+        for (int z = 0; z < n; ++z) {
+            for (int y = 0; y < n; ++y) {
+                const int base = y * n + z * n * n;
+                add(base, -30.0);
+                add(base + n - 1, 30.0);
+            }
+        }
+    } else {
+        throw std::invalid_argument("unknown input pattern: " + pattern);
+    }
+}
+
+// 1 ノード更新あたりの必須メモリ転送量 (各配列を 1 回ずつ読み書きするモデル, 近傍はキャッシュ上で再利用)
+//   学習: 読み出し amp, f, v_f, fatigue, fatigue_limit, inactivity / 書き込み amp, f, v_f, fatigue, inactivity
+//   推論: 読み出し amp, f / 書き込み amp
+double bytes_per_update(size_t value_bytes, bool learning) {
+    return learning ? 9.0 * value_bytes + 2.0 * sizeof(int) : 3.0 * value_bytes;
+}
+
+template <typename Box>
+Result run_case(const Options& opt, const std::string& precision, int n, int threads,
+                const std::string& pattern, const std::string& mode) {
+    using T = typename Box::value_type;
+    const bool learning = (mode == "learn");
+    if (!learning && mode != "infer") throw std::invalid_argument("unknown mode: " + mode);
+
+    const double nodes = static_cast<double>(n) * n * n;
+    const int steps = (opt.steps > 0) ? opt.steps
+                                      : std::max(10, std::min(1000, static_cast<int>(NODE_BUDGET / nodes)));
+
+    std::vector<int> idx;
+    std::vector<double> amp, freq;
+    make_inputs(pattern, n, idx, amp, freq);
+    RSTNInputSchedule schedule;
+    schedule.indices = idx.data();
+    schedule.amps = amp.data();
+    schedule.freqs = freq.data();
+    schedule.rows = 1;
+    schedule.cols = idx.size();
+
+    omp_set_num_threads(threads);
+    Box box(n, 42);
+    if (opt.warmup > 0) box.run(opt.warmup, schedule, nullptr, learning, 0, nullptr, nullptr);
+
+    std::vector<double> times;
+    for (int r = 0; r < opt.repeat; ++r) {
+        const auto t0 = std::chrono::steady_clock::now();
+        box.run(steps, schedule, nullptr, learning, 0, nullptr, nullptr);
+        times.push_back(std::chrono::duration<double>(std::chrono::steady_clock::now() - t0).count());
+    }
+    std::sort(times.begin(), times.end());
+
+    Result res;
+    res.precision = precision;
+    res.inputs = pattern;
+    res.mode = mode;
+    res.n = n;
+    res.threads = threads;
+    res.steps = steps;
+    res.seconds = times[times.size() / 2];
+    res.seconds_min = times.front();
+    res.bytes_per_update = bytes_per_update(sizeof(T), learning);
+    return res;
+}
+
+void write_json(std::ostream& os, const Options& opt, const std::vector<Result>& results) {
+    char stamp[32];
+    const std::time_t now = std::time(nullptr);
+    std::strftime(stamp, sizeof(stamp), "%Y-%m-%dT%H:%M:%S", std::localtime(&now));
+
+    os << "{\n  \"meta\": {\"driver\": \"native\", \"kernel_variant\": \"" << rstn_dispatch::active_variant()
+       << "\", \"timestamp\": \"" << stamp << "\", \"warmup\": " << opt.warmup
+       << ", \"repeat\": " << opt.repeat << "},\n  \"results\": [";
+    for (size_t i = 0; i < results.size(); ++i) {
+        const Result& r = results[i];
+        const double updates = static_cast<double>(r.n) * r.n * r.n * r.steps / r.seconds;
+        char buf[512];
+        std::snprintf(buf, sizeof(buf),
+                      "%s\n    {\"precision\": \"%s\", \"n\": %d, \"threads\": %d, \"inputs\": \"%s\", \"mode\": \"%s\", "
+                      "\"steps\": %d, \"seconds\": %.6g, \"seconds_min\": %.6g, \"steps_per_sec\": %.6g, "
+                      "\"node_updates_per_sec\": %.6g, \"bandwidth_gbs\": %.6g}",
+                      (i == 0) ? "" : ",", r.precision.c_str(), r.n, r.threads, r.inputs.c_str(), r.mode.c_str(),
+                      r.steps, r.seconds, r.seconds_min, r.steps / r.seconds, updates,
+                      updates * r.bytes_per_update / 1e9);
+        os << buf;
+    }
+    os << "\n  ]\n}\n";
+}
+
+} // namespace
+
+int main(int argc, char** argv) {
+    Options opt;
+    opt.threads = {omp_get_max_threads()};
+    try {
+        for (int i = 1; i < argc; ++i) {
+            const std::string arg = argv[i];
+            if (arg == "-h" || arg == "--help") {
+                std::cout << "usage: rstn_bench [--sizes 16,32] [--threads 1,4] [--inputs point,plane,faces]\n"
+                             "                  [--modes learn,infer] [--precision f64,f32] [--steps S]\n"
+                             "                  [--warmup W] [--repeat R] [--json PATH]\n";
+                return 0;
+            }
+            if (i + 1 >= argc) throw std::invalid_argument("missing value for " + arg);
+            const std::string val = argv[++i];
+            if (arg == "--sizes") opt.sizes = split_int(val);
+            else if (arg == "--threads") opt.threads = split_int(val);
+            else if (arg == "--inputs") opt.inputs = split(val);
+            else if (arg == "--modes") opt.modes = split(val);
+            else if (arg == "--precision") opt.precision = split(val);
+            else if (arg == "--steps") opt.steps = std::stoi(val);
+            else if (arg == "--warmup") opt.warmup = std::stoi(val);
+            else if (arg == "--repeat") opt.repeat = std::max(1, std::stoi(val));
+            else if (arg == "--json") opt.json_path = val;
+            else throw std::invalid_argument("unknown option " + arg);
+        }
+
+        std::vector<Result> results;
+        std::fprintf(stderr, "kernel: %s\n", rstn_dispatch::active_variant());
+        std::fprintf(stderr, "%-4s %5s %7s %6s %5s | %10s %12s %8s\n",
+                     "prec", "N", "threads", "inputs", "mode", "steps/s", "updates/s", "GB/s");
+        for (const auto& precision : opt.precision) {
+            for (int n : opt.sizes) {
+                for (int threads : opt.threads) {
+                    for (const auto& pattern : opt.inputs) {
+                        for (const auto& mode : opt.modes) {
+                            Result r;
+                            if (precision == "f64") r = run_case<RSTNBox>(opt, precision, n, threads, pattern, mode);
+                            else if (precision == "f32") r = run_case<RSTNBoxF32>(opt, precision, n, threads, pattern, mode);
+                            else throw std::invalid_argument("unknown precision: " + precision);
+                            const double updates = static_cast<double>(n) * n * n * r.steps / r.seconds;
+                            std::fprintf(stderr, "%-4s %5d %7d %6s %5s | %10.1f %12.4g %8.2f\n",
+                                         precision.c_str(), n, threads, pattern.c_str(), mode.c_str(),
+                                         r.steps / r.seconds, updates, updates * r.bytes_per_update / 1e9);
+                            results.push_back(r);
+                        }
+                    }
+                }
+            }
+        }
+
+        if (opt.json_path.empty() || opt.json_path == "-") {
+            write_json(std::cout, opt, results);
+        } else {
+            std::ofstream f(opt.json_path);
+            write_json(f, opt, results);
+        }
+    } catch (const std::exception& e) {
+        std::cerr << "error: " << e.what() << std::endl;
+        return 2;
+    }
+    return 0;
+}
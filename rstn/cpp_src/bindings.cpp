@@ -1,18 +1,654 @@
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h>
 #include <pybind11/numpy.h>
+#include <chrono>
+#include <future>
+#include <memory>
+#include <string>
 #include "RSTNBox.hpp"
+#include "RSTNDispatch.hpp"
 #include "RSTNParams.hpp"
+#include "RSTNReference.hpp"
 #include "RSTNState.hpp"
+#include "RSTNTrace.hpp"
 
 namespace py = pybind11;
 
+using IndexArray = py::array_t<int, py::array::c_style | py::array::forcecast>;
+using ValueArray = py::array_t<double, py::array::c_style | py::array::forcecast>;
+
+// 連続配列 (SoA の1フィールド) をコピーせずに NumPy 配列として公開する
+// base に self を渡すことで、ビューが生きている間は Box が解放されない
+template <typename Box, typename T>
+static py::array_t<T> make_view(Box& self, T* data, bool volume) {
+    if (volume) {
+        return py::array_t<T>({static_cast<py::ssize_t>(self.get_nz()), static_cast<py::ssize_t>(self.get_ny()),
+                               static_cast<py::ssize_t>(self.get_nx())}, data, py::cast(self));
+    }
+    return py::array_t<T>({static_cast<py::ssize_t>(self.get_total_nodes())}, data, py::cast(self));
+}
+
+// 振幅・周波数 (ピンポンバッファ) のビュー
+// ビューが生きている間は Box を pin し (RSTNBoxT::pin_buffers)、ステップ後も現世代を指し続けるようにする。
+// base のカプセルが Box への参照を持ち、ビューの解放時に pin を外す
+template <typename Box, typename T>
+static py::array_t<T> make_current_view(Box& self, T* (Box::*data)(), bool volume) {
+    struct Pin {
+        Box* box;
+        PyObject* owner;
+    };
+    self.pin_buffers();
+    py::object owner = py::cast(&self, py::return_value_policy::reference);
+    py::capsule base(new Pin{&self, owner.release().ptr()}, [](void* p) {
+        Pin* pin = static_cast<Pin*>(p);
+        pin->box->unpin_buffers();
+        Py_DECREF(pin->owner);
+        delete pin;
+    });
+    T* ptr = (self.*data)();
+    if (volume) {
+        return py::array_t<T>({static_cast<py::ssize_t>(self.get_nz()), static_cast<py::ssize_t>(self.get_ny()),
+                               static_cast<py::ssize_t>(self.get_nx())}, ptr, base);
+    }
+    return py::array_t<T>({static_cast<py::ssize_t>(self.get_total_nodes())}, ptr, base);
+}
+
+// 計測値を Python の dict に変換する (呼び出しのないフェーズは含めない)
+static py::dict profile_dict(const RSTNProfiler& profiler) {
+    py::dict out;
+    for (int p = 0; p < PHASE_COUNT; ++p) {
+        const RSTNPhaseStats& st = profiler.stats(p);
+        if (st.calls == 0) continue;
+        py::dict d;
+        d["calls"] = st.calls;
+        d["seconds"] = st.seconds;
+        if (st.parallel_calls > 0) {
+            d["thread_max"] = st.thread_max;
+            d["thread_mean"] = st.thread_mean;
+            d["imbalance"] = (st.thread_mean > 0.0) ? st.thread_max / st.thread_mean : 1.0;
+        }
+        out[RSTNProfiler::phase_name(p)] = d;
+    }
+    return out;
+}
+
+// 非同期ジョブ (step_async / run_async) の完了を GIL を解放して待つ
+// 状態・パラメータ・計測値に触れる同期 API は、先にこれを呼んでジョブとの競合を避ける
+template <typename Box>
+static Box& synced(Box& self) {
+    py::gil_scoped_release release;
+    self.wait_async();
+    return self;
+}
+
+namespace {
+
+// run / run_async の引数を検証し、C++ 側の形式に変換したもの
+// 配列 (py::array) はジョブが終わるまで保持する必要があるため、ポインタと一緒に持つ
+template <typename Scalar>
+struct RunArgs {
+    IndexArray idx;
+    ValueArray amp, freq;
+    RSTNInputSchedule schedule;
+    py::array_t<bool, py::array::c_style | py::array::forcecast> learn_arr;
+    const bool* learn_ptr = nullptr;
+    bool learn_default = true;
+    py::ssize_t frames = 0;
+    py::array_t<Scalar> rec_a, rec_f;
+    Scalar* p_rec_a = nullptr;
+    Scalar* p_rec_f = nullptr;
+
+    // run の戻り値 (記録フレームがなければ None)
+    py::object result() const {
+        if (frames == 0) return py::none();
+        return py::make_tuple(rec_a, rec_f);
+    }
+    // ジョブが参照する配列
+    py::tuple arrays() const { return py::make_tuple(idx, amp, freq, learn_arr, rec_a, rec_f); }
+};
+
+template <typename Box>
+static RunArgs<typename Box::value_type> parse_run_args(Box& self, int steps, py::object inputs, py::object is_learning,
+                                                        int record_every, py::object out_amps, py::object out_freqs) {
+    using Scalar = typename Box::value_type;
+    if (steps < 0) throw py::value_error("steps must be non-negative");
+    RunArgs<Scalar> args;
+
+    // --- 入力スケジュール ---
+    if (!inputs.is_none()) {
+        py::tuple t = inputs.cast<py::tuple>();
+        if (t.size() != 3) throw py::value_error("inputs must be a tuple (indices, amps, freqs)");
+        args.idx = t[0].cast<IndexArray>();
+        args.amp = t[1].cast<ValueArray>();
+        args.freq = t[2].cast<ValueArray>();
+        const IndexArray& idx = args.idx;
+        if (idx.ndim() < 1 || idx.ndim() > 2) throw py::value_error("inputs must be 1-D (K,) or 2-D (T, K)");
+        if (idx.ndim() != args.amp.ndim() || idx.ndim() != args.freq.ndim() ||
+            idx.size() != args.amp.size() || idx.size() != args.freq.size()) {
+            throw py::value_error("indices, amps and freqs must have the same shape");
+        }
+        args.schedule.indices = idx.data();
+        args.schedule.amps = args.amp.data();
+        args.schedule.freqs = args.freq.data();
+        args.schedule.rows = (idx.ndim() == 2) ? idx.shape(0) : 1;
+        args.schedule.cols = (idx.ndim() == 2) ? idx.shape(1) : idx.shape(0);
+    }
+
+    // --- 学習フラグ ---
+    if (py::isinstance<py::bool_>(is_learning)) {
+        args.learn_default = is_learning.cast<bool>();
+    } else {
+        args.learn_arr = is_learning.cast<decltype(args.learn_arr)>();
+        if (args.learn_arr.ndim() != 1 || args.learn_arr.shape(0) != steps) {
+            throw py::value_error("is_learning array must have shape (steps,)");
+        }
+        args.learn_ptr = args.learn_arr.data();
+    }
+
+    // --- 記録バッファ ---
+    args.frames = (record_every > 0) ? (steps + record_every - 1) / record_every : 0;
+    const py::ssize_t frames = args.frames;
+    const py::ssize_t total = static_cast<py::ssize_t>(self.get_total_nodes());
+    const std::string dtype_name = py::str(py::dtype::of<Scalar>());
+    auto prepare = [&](py::object out) {
+        if (out.is_none()) return py::array_t<Scalar>({frames, total});
+        // dtype が異なる配列を暗黙に変換すると書き込みが呼び出し元に届かないため、厳密に検査する
+        if (!py::isinstance<py::array_t<Scalar>>(out)) {
+            throw py::value_error(std::string("output buffer must be a ") + dtype_name + " array");
+        }
+        auto arr = out.cast<py::array_t<Scalar>>();
+        if (!arr.writeable() || !(arr.flags() & py::array::c_style) || arr.size() != frames * total) {
+            throw py::value_error(std::string("output buffer must be a writeable C-contiguous ") + dtype_name +
+                                  " array of size frames * total nodes");
+        }
+        return arr;
+    };
+    if (frames > 0) {
+        args.rec_a = prepare(out_amps);
+        args.rec_f = prepare(out_freqs);
+        args.p_rec_a = args.rec_a.mutable_data();
+        args.p_rec_f = args.rec_f.mutable_data();
+    }
+    return args;
+}
+
+// step_async / run_async の戻り値 (concurrent.futures.Future と同じく done() / result(timeout) を持つ)
+class RSTNFuture {
+public:
+    RSTNFuture(std::shared_future<void> future, py::object value, py::object keep)
+        : future(std::move(future)), value(std::move(value)), keep(std::move(keep)) {}
+    RSTNFuture(RSTNFuture&&) = default;
+    ~RSTNFuture() {
+        // ジョブが参照している配列 (keep) を先に解放しないよう、完了を待ってから破棄する
+        if (future.valid() && !keep.is_none() && !done()) {
+            py::gil_scoped_release release;
+            future.wait();
+        }
+    }
+
+    bool done() const { return future.wait_for(std::chrono::seconds(0)) == std::future_status::ready; }
+
+    // 完了を待って結果を返す (ジョブ内の例外はここで送出する)
+    py::object result(py::object timeout) {
+        const bool forever = timeout.is_none();
+        const double seconds = forever ? 0.0 : timeout.cast<double>();
+        bool ready = true;
+        {
+            py::gil_scoped_release release;
+            if (forever) {
+                future.wait();
+            } else {
+                ready = future.wait_for(std::chrono::duration<double>(seconds)) == std::future_status::ready;
+            }
+        }
+        if (!ready) {
+            PyErr_SetString(PyExc_TimeoutError, "the engine job did not finish within the timeout");
+            throw py::error_already_set();
+        }
+        future.get();
+        return value;
+    }
+
+private:
+    std::shared_future<void> future;
+    py::object value;   // result() の戻り値 (run_async の記録フレームなど)
+    py::object keep;    // ジョブが参照する Python オブジェクト (入力配列・記録バッファ, なければ None)
+};
+
+} // namespace
+
+// スナップショット (RSTNSnapshotT) の読み取り専用ビュー (base のスナップショットが生きている間有効)
+template <typename Snapshot, typename T>
+static py::array_t<T> snapshot_view(const Snapshot& snap, py::object base, const std::vector<T>& data, bool volume) {
+    py::array_t<T> arr = volume
+        ? py::array_t<T>({static_cast<py::ssize_t>(snap.nz), static_cast<py::ssize_t>(snap.ny),
+                          static_cast<py::ssize_t>(snap.nx)}, data.data(), base)
+        : py::array_t<T>({static_cast<py::ssize_t>(data.size())}, data.data(), base);
+    arr.attr("setflags")(py::arg("write") = false);
+    return arr;
+}
+
+// RSTNSnapshotT<T> のバインディング (Box の状態ビューと同じ名前の読み取り専用アクセサを持つ)
+template <typename T>
+static void bind_snapshot(py::module_& m, const char* name) {
+    using Snapshot = RSTNSnapshotT<T>;
+    py::class_<Snapshot, std::shared_ptr<Snapshot>>(m, name)
+        .def_readonly("generation", &Snapshot::generation)
+        .def_readonly("step", &Snapshot::step)
+        .def_readonly("nx", &Snapshot::nx)
+        .def_readonly("ny", &Snapshot::ny)
+        .def_readonly("nz", &Snapshot::nz)
+        .def_property_readonly("shape", [](const Snapshot& self) {
+            return py::make_tuple(self.nz, self.ny, self.nx);
+        })
+        .def("get_frequencies", [](py::object self, bool volume) {
+            const Snapshot& s = self.cast<const Snapshot&>();
+            return snapshot_view(s, self, s.f_self, volume);
+        }, py::arg("volume") = false)
+        .def("get_amplitudes", [](py::object self, bool volume) {
+            const Snapshot& s = self.cast<const Snapshot&>();
+            return snapshot_view(s, self, s.amplitude, volume);
+        }, py::arg("volume") = false)
+        .def("get_velocities", [](py::object self, bool volume) {
+            const Snapshot& s = self.cast<const Snapshot&>();
+            return snapshot_view(s, self, s.v_f, volume);
+        }, py::arg("volume") = false)
+        .def("get_fatigue", [](py::object self, bool volume) {
+            const Snapshot& s = self.cast<const Snapshot&>();
+            return snapshot_view(s, self, s.fatigue, volume);
+        }, py::arg("volume") = false)
+        .def("get_fatigue_limits", [](py::object self, bool volume) {
+            const Snapshot& s = self.cast<const Snapshot&>();
+            return snapshot_view(s, self, s.fatigue_limit, volume);
+        }, py::arg("volume") = false)
+        .def("get_inactivity_counts", [](py::object self, bool volume) {
+            const Snapshot& s = self.cast<const Snapshot&>();
+            return snapshot_view(s, self, s.inactivity_count, volume);
+        }, py::arg("volume") = false);
+}
+
+// RSTNBoxT<T> のバインディング (倍精度版・単精度版で共通の API)
+// 状態ビュー・記録フレームの dtype は T、入力値と RSTNParams は常に float64。
+template <typename Box>
+static void bind_box(py::module_& m, const char* name) {
+    using Scalar = typename Box::value_type;
+
+    py::class_<Box>(m, name)
+        // num_threads (キーワード専用): 並列領域のスレッド数 (0 は OpenMP の既定, set_num_threads と同じ)
+        // huge_pages (キーワード専用): ノード配列を transparent huge page で確保する (set_huge_pages と同じ)
+        .def(py::init([](int n, int seed, int num_threads, bool huge_pages) {
+                 return new Box(n, n, n, seed, num_threads, huge_pages);
+             }),
+             py::arg("n"), py::arg("seed") = 42, py::kw_only(), py::arg("num_threads") = 0,
+             py::arg("huge_pages") = false)
+        .def(py::init<int, int, int, int, int, bool>(), py::arg("nx"), py::arg("ny"), py::arg("nz"),
+             py::arg("seed") = 42, py::kw_only(), py::arg("num_threads") = 0, py::arg("huge_pages") = false)
+        
+        // 物理シミュレーション実行 (リストの変換後は GIL解放)
+        // inputs: [(index, (amp, freq)), ...] (リストの変換時間は計測フェーズ "convert" に加算する)
+        .def("step", [](Box& self, py::object inputs, bool is_learning) {
+            synced(self);
+            std::vector<std::pair<int, std::pair<double, double>>> converted;
+            {
+                RSTNPhaseTimer timer(self.get_profiler(), PHASE_CONVERT);
+                converted = inputs.cast<std::vector<std::pair<int, std::pair<double, double>>>>();
+            }
+            py::gil_scoped_release release;
+            self.step(converted, is_learning);
+        }, py::arg("inputs"), py::arg("is_learning") = true)
+
+        // NumPy 配列による入力 (バッファプロトコル経由, int32/float64 の連続配列ならコピーなし)
+        .def("step", [](Box& self, IndexArray indices, ValueArray amps, ValueArray freqs, bool is_learning) {
+            if (indices.ndim() != 1 || amps.ndim() != 1 || freqs.ndim() != 1 ||
+                indices.size() != amps.size() || indices.size() != freqs.size()) {
+                throw py::value_error("indices, amps and freqs must be 1-D arrays of the same length");
+            }
+            py::gil_scoped_release release;
+            self.wait_async();
+            self.step_arrays(indices.data(), amps.data(), freqs.data(), indices.size(), is_learning);
+        }, py::arg("indices"), py::arg("amps"), py::arg("freqs"), py::arg("is_learning") = true)
+        
+        // 複数ステップの一括実行 (GIL解放)
+        // inputs: (indices, amps, freqs) の組。各配列は (K,) なら全ステップ共通、(T, K) ならステップ毎
+        // is_learning: bool または (T,) の bool 配列
+        // record_every > 0 の場合、(振幅, 周波数) の記録フレーム (F, 全ノード数) を返す
+        .def("run", [](Box& self, int steps, py::object inputs, py::object is_learning,
+                       int record_every, py::object out_amps, py::object out_freqs) -> py::object {
+            RunArgs<Scalar> a = parse_run_args(self, steps, inputs, is_learning, record_every, out_amps, out_freqs);
+            {
+                py::gil_scoped_release release;
+                self.wait_async();
+                self.run(steps, a.schedule, a.learn_ptr, a.learn_default, record_every, a.p_rec_a, a.p_rec_f);
+            }
+            return a.result();
+        }, py::arg("steps"), py::arg("inputs") = py::none(), py::arg("is_learning") = true,
+           py::arg("record_every") = 0, py::arg("out_amps") = py::none(), py::arg("out_freqs") = py::none())
+
+        // ------------------------------------------------------------------
+        // 非同期実行: ワーカースレッドでステップを進め、完了を待つ RSTNFuture を返す (GIL を保持しない)
+        // 実行中の状態は snapshot() で読む。同期 API (step / run / get_* / params など) は実行中のジョブの完了を待つ
+        // ------------------------------------------------------------------
+
+        // step の非同期版 (入力は呼び出し時にコピーする, result() は None)
+        // publish=True なら完了時にステップ後の状態をスナップショットとして公開する
+        // (コピーはワーカースレッドで行う。読まないステップは False にすればコピーを省ける)
+        // (配列形式を先に登録する: 3 つの配列による呼び出しがリスト形式の引数に暗黙変換されないように)
+        .def("step_async", [](Box& self, IndexArray indices, ValueArray amps, ValueArray freqs, bool is_learning,
+                              bool publish) {
+            if (indices.ndim() != 1 || amps.ndim() != 1 || freqs.ndim() != 1 ||
+                indices.size() != amps.size() || indices.size() != freqs.size()) {
+                throw py::value_error("indices, amps and freqs must be 1-D arrays of the same length");
+            }
+            std::vector<int> idx(indices.data(), indices.data() + indices.size());
+            std::vector<double> amp(amps.data(), amps.data() + amps.size());
+            std::vector<double> freq(freqs.data(), freqs.data() + freqs.size());
+            Box* box = &self;
+            auto future = self.submit([box, idx = std::move(idx), amp = std::move(amp), freq = std::move(freq),
+                                       is_learning, publish]() {
+                box->step_arrays(idx.data(), amp.data(), freq.data(), idx.size(), is_learning);
+                if (publish) box->publish_snapshot();
+            });
+            return RSTNFuture(future, py::none(), py::none());
+        }, py::arg("indices"), py::arg("amps"), py::arg("freqs"), py::arg("is_learning") = true,
+           py::arg("publish") = true)
+
+        .def("step_async", [](Box& self, py::object inputs, bool is_learning, bool publish) {
+            auto converted = inputs.cast<std::vector<std::pair<int, std::pair<double, double>>>>();
+            Box* box = &self;
+            auto future = self.submit([box, converted = std::move(converted), is_learning, publish]() {
+                box->step(converted, is_learning);
+                if (publish) box->publish_snapshot();
+            });
+            return RSTNFuture(future, py::none(), py::none());
+        }, py::arg("inputs"), py::arg("is_learning") = true, py::arg("publish") = true)
+
+        // run の非同期版 (引数は run と同じ, result() は run の戻り値)
+        // snapshot_every > 0 なら snapshot_every ステップ毎にも途中の状態を公開する (完了時は常に公開する)
+        // 入力配列・記録バッファはジョブの完了まで書き換えないこと
+        .def("run_async", [](Box& self, int steps, py::object inputs, py::object is_learning,
+                             int record_every, py::object out_amps, py::object out_freqs, int snapshot_every) {
+            if (snapshot_every < 0) throw py::value_error("snapshot_every must be non-negative");
+            RunArgs<Scalar> a = parse_run_args(self, steps, inputs, is_learning, record_every, out_amps, out_freqs);
+            Box* box = &self;
+            auto future = self.submit([box, steps, schedule = a.schedule, learn_ptr = a.learn_ptr,
+                                       learn_default = a.learn_default, record_every, p_rec_a = a.p_rec_a,
+                                       p_rec_f = a.p_rec_f, snapshot_every]() {
+                box->run(steps, schedule, learn_ptr, learn_default, record_every, p_rec_a, p_rec_f, snapshot_every);
+                if (snapshot_every == 0 || steps == 0) box->publish_snapshot();
+            });
+            return RSTNFuture(future, a.result(), a.arrays());
+        }, py::arg("steps"), py::arg("inputs") = py::none(), py::arg("is_learning") = true,
+           py::arg("record_every") = 0, py::arg("out_amps") = py::none(), py::arg("out_freqs") = py::none(),
+           py::arg("snapshot_every") = 0)
+
+        // 最後に公開されたスナップショット (読み取り専用, 実行中のジョブを待たない)
+        // 非同期実行を始める前は現在の状態を公開して返す
+        .def("snapshot", [](Box& self) {
+            return std::const_pointer_cast<RSTNSnapshotT<Scalar>>(self.get_snapshot());
+        })
+
+        // 入力なしで condition(box) が真になるまで (最大 max_steps ステップ) 進め、進めたステップ数を返す
+        // 振幅がすべて 0 の静止状態では近傍参照なしの早送りでまとめて進める (結果は step と完全一致)。
+        // 静止状態では condition を倍々・二分探索の時点でのみ呼ぶため、一度真になれば真のままの条件を渡すこと
+        .def("advance_until_quiet", [](Box& self, py::function condition, int max_steps, bool is_learning) {
+            if (max_steps < 0) throw py::value_error("max_steps must be non-negative");
+            py::object box = py::cast(&self, py::return_value_policy::reference);
+            py::gil_scoped_release release;
+            self.wait_async();
+            return self.advance_until_quiet([&]() {
+                py::gil_scoped_acquire acquire;
+                return py::bool_(condition(box)).cast<bool>();
+            }, max_steps, is_learning);
+        }, py::arg("condition"), py::arg("max_steps"), py::arg("is_learning") = true)
+
+        // 同じ入力で推論ステップを繰り返し、1 ステップでの振幅の変化量の最大値が tol 以下になった時点で止める
+        // inputs: (indices, amps, freqs) の 1-D 配列 (None は入力なし)。最大 max_steps ステップ
+        // 戻り値: (振幅のコピー, 進めたステップ数, 最後のステップの変化量)。変化量 <= tol なら収束している
+        // 結果は step(..., is_learning=False) を同じ回数呼んだ場合と完全一致する
+        .def("infer_until_converged", [](Box& self, py::object inputs, double tol, int max_steps, bool volume) {
+            if (max_steps < 0) throw py::value_error("max_steps must be non-negative");
+            if (!(tol >= 0.0)) throw py::value_error("tol must be non-negative");
+            IndexArray indices;
+            ValueArray amps, freqs;
+            if (!inputs.is_none()) {
+                py::tuple t = inputs.cast<py::tuple>();
+                if (t.size() != 3) throw py::value_error("inputs must be a tuple (indices, amps, freqs)");
+                indices = t[0].cast<IndexArray>();
+                amps = t[1].cast<ValueArray>();
+                freqs = t[2].cast<ValueArray>();
+                if (indices.ndim() != 1 || amps.ndim() != 1 || freqs.ndim() != 1 ||
+                    indices.size() != amps.size() || indices.size() != freqs.size()) {
+                    throw py::value_error("indices, amps and freqs must be 1-D arrays of the same length");
+                }
+            }
+            const size_t count = inputs.is_none() ? 0 : static_cast<size_t>(indices.size());
+            double residual = 0.0;
+            int steps = 0;
+            {
+                py::gil_scoped_release release;
+                self.wait_async();
+                steps = self.infer_until_converged(count ? indices.data() : nullptr, count ? amps.data() : nullptr,
+                                                   count ? freqs.data() : nullptr, count, tol, max_steps, &residual);
+            }
+            py::array field = make_view(self, self.get_amplitude_ptr(), volume).attr("copy")();
+            return py::make_tuple(field, steps, residual);
+        }, py::arg("inputs") = py::none(), py::arg("tol") = 1e-6, py::arg("max_steps") = 1000,
+           py::arg("volume") = false)
+
+        // フェーズ別の計測値 {フェーズ名: {"calls", "seconds", ...}}
+        // 並列フェーズ (stencil / kernel / idle / temporal / quiet / converge / settle) は "thread_max" / "thread_mean" (呼び出し毎の最も遅いスレッド・
+        // スレッド平均の実行時間の合計) と "imbalance" (= thread_max / thread_mean) も含む
+        .def_property_readonly("profile", [](Box& self) {
+            return profile_dict(synced(self).get_profiler());
+        })
+        .def("reset_profile", [](Box& self) { synced(self).get_profiler().reset(); })
+
+        // 状態強制リセット
+        .def("reset_states", [](Box& self) {
+            py::gil_scoped_release release;
+            self.wait_async();
+            self.reset_states();
+        })
+        
+        // LUTの再計算トリガー
+        .def("update_tables", [](Box& self) {
+            py::gil_scoped_release release;
+            self.wait_async();
+            self.update_tables();
+        })
+        .def_property_readonly("lut_bytes", &Box::get_lut_bytes)
+        
+        // パラメータオブジェクトへの参照を返す (box.params でアクセス可能)
+        .def_property_readonly("params", [](Box& self) -> RSTNParams& {
+            return synced(self).get_params();
+        }, py::return_value_policy::reference)
+        
+        // Boxサイズ取得 (get_size は立方体のみ)
+        .def("get_size", &Box::get_size)
+        .def_property_readonly("nx", &Box::get_nx)
+        .def_property_readonly("ny", &Box::get_ny)
+        .def_property_readonly("nz", &Box::get_nz)
+        // ビュー (volume=True) の形状 (nz, ny, nx)
+        .def_property_readonly("shape", [](const Box& self) {
+            return py::make_tuple(self.get_nz(), self.get_ny(), self.get_nx());
+        })
+
+        // 並列領域のスレッド数 (0 は OpenMP の既定)。複数の Box を別スレッドで同時に進める場合に Box ごとに割り当てる
+        .def("set_num_threads", [](Box& self, int n) { synced(self).set_num_threads(n); }, py::arg("n"))
+        .def_property_readonly("num_threads", &Box::get_num_threads)
+
+        // ノード配列のメモリ配置 (結果には影響しない)。変更時は同じアドレスのまま配置し直す (ビューは有効なまま)
+        // set_huge_pages: transparent huge page を要求する (THP が無効なら通常のページ)
+        // set_affinity: 並列領域のスレッド番号 i (>= 1) を cpus[i % len(cpus)] に固定する
+        //               (呼び出し元のスレッドは固定しない, 空リストで固定前の状態に戻す, Linux のみ)
+        .def("set_huge_pages", [](Box& self, bool enabled) {
+            Box& box = synced(self);
+            py::gil_scoped_release release;
+            box.set_huge_pages(enabled);
+        }, py::arg("enabled"))
+        .def_property_readonly("huge_pages", &Box::get_huge_pages)
+        .def("set_affinity", [](Box& self, const std::vector<int>& cpus) {
+            Box& box = synced(self);
+            py::gil_scoped_release release;
+            box.set_affinity(cpus);
+        }, py::arg("cpus"))
+        .def_property_readonly("affinity", &Box::get_affinity)
+
+        // キャッシュブロッキング設定 (tile_y / tile_z = 0 は自動決定, time_block > 1 は run() でのみ有効)
+        .def("set_blocking", [](Box& self, bool enabled, int tile_y, int tile_z, int time_block) {
+            synced(self).set_blocking(enabled, tile_y, tile_z, time_block);
+        },
+             py::arg("enabled"), py::arg("tile_y") = 0, py::arg("tile_z") = 0, py::arg("time_block") = 1)
+        .def_property_readonly("blocking_enabled", &Box::get_blocking_enabled)
+        .def_property_readonly("tile_y", &Box::get_tile_y)
+        .def_property_readonly("tile_z", &Box::get_tile_z)
+        .def_property_readonly("time_block", &Box::get_time_block)
+
+        // 疎ステップ設定 (振幅 0 の静止領域を省略, 結果は全行更新と同一)
+        .def("set_sparse", [](Box& self, bool enabled, double dense_threshold) {
+            synced(self).set_sparse(enabled, dense_threshold);
+        }, py::arg("enabled"), py::arg("dense_threshold") = 0.5)
+        .def_property_readonly("sparse_enabled", &Box::get_sparse_enabled)
+        .def_property_readonly("dense_threshold", &Box::get_dense_threshold)
+        // 直前のステップでカーネル計算した行の割合 (全行更新の場合は 1.0)
+        .def_property_readonly("active_fraction", [](Box& self) { return synced(self).get_active_fraction(); })
+        // ビュー経由で状態を書き換えた後に呼ぶ
+        .def("sync_activity", [](Box& self) { synced(self).sync_activity(); })
+
+        // 空間伝播の近傍の形状 ("von_neumann" / "moore" / "cube" / "sphere", 半径は cube / sphere のみ指定可)
+        .def("set_stencil", [](Box& self, const std::string& shape, int radius) {
+            synced(self).set_stencil(shape, radius);
+        }, py::arg("shape"), py::arg("radius") = 1)
+        .def_property_readonly("stencil", &Box::get_stencil)
+        .def_property_readonly("stencil_radius", &Box::get_stencil_radius)
+
+        // ------------------------------------------------------------------
+        // ゼロコピー NumPy アクセサ (SoA View, 連続配列)
+        // volume=True で (nz, ny, nx) 形状 (z, y, x 順) のビューを返す
+        // ------------------------------------------------------------------
+
+        // 周波数 (f_self) のビューを取得
+        .def("get_frequencies", [](Box& self, bool volume) {
+            return make_current_view(synced(self), &Box::get_f_self_ptr, volume);
+        }, py::arg("volume") = false)
+
+        // 振幅 (amplitude) のビューを取得
+        .def("get_amplitudes", [](Box& self, bool volume) {
+            return make_current_view(synced(self), &Box::get_amplitude_ptr, volume);
+        }, py::arg("volume") = false)
+
+        // 周波数速度 (v_f) のビューを取得
+        .def("get_velocities", [](Box& self, bool volume) {
+            return make_view(self, synced(self).get_v_f_ptr(), volume);
+        }, py::arg("volume") = false)
+
+        // 疲労度 (fatigue) のビューを取得
+        .def("get_fatigue", [](Box& self, bool volume) {
+            return make_view(self, synced(self).get_fatigue_ptr(), volume);
+        }, py::arg("volume") = false)
+
+        // 疲労限界 (fatigue_limit) のビューを取得
+        .def("get_fatigue_limits", [](Box& self, bool volume) {
+            return make_view(self, synced(self).get_fatigue_limit_ptr(), volume);
+        }, py::arg("volume") = false)
+
+        // 不活動カウンタ (inactivity_count) のビューを取得
+        .def("get_inactivity_counts", [](Box& self, bool volume) {
+            return make_view(self, synced(self).get_inactivity_count_ptr(), volume);
+        }, py::arg("volume") = false);
+}
+
+// 参照実装 RSTNReferenceBoxT<T> のバインディング (差分検証用, step と状態の参照のみ)
+template <typename Box>
+static void bind_reference_box(py::module_& m, const char* name) {
+    py::class_<Box>(m, name)
+        .def(py::init<int, int>(), py::arg("n"), py::arg("seed") = 42)
+        .def(py::init<int, int, int, int>(), py::arg("nx"), py::arg("ny"), py::arg("nz"), py::arg("seed") = 42)
+        .def("step", &Box::step, py::arg("inputs"), py::arg("is_learning") = true)
+        .def("step", [](Box& self, IndexArray indices, ValueArray amps, ValueArray freqs, bool is_learning) {
+            if (indices.ndim() != 1 || amps.ndim() != 1 || freqs.ndim() != 1 ||
+                indices.size() != amps.size() || indices.size() != freqs.size()) {
+                throw py::value_error("indices, amps and freqs must be 1-D arrays of the same length");
+            }
+            py::gil_scoped_release release;
+            self.step_arrays(indices.data(), amps.data(), freqs.data(), indices.size(), is_learning);
+        }, py::arg("indices"), py::arg("amps"), py::arg("freqs"), py::arg("is_learning") = true)
+        .def("reset_states", &Box::reset_states)
+        .def("update_tables", &Box::update_tables)
+        .def_property_readonly("params", &Box::get_params, py::return_value_policy::reference)
+        .def_property_readonly("current_step", &Box::get_current_step)
+        .def_property_readonly("nx", &Box::get_nx)
+        .def_property_readonly("ny", &Box::get_ny)
+        .def_property_readonly("nz", &Box::get_nz)
+        .def_property_readonly("shape", [](const Box& self) {
+            return py::make_tuple(self.get_nz(), self.get_ny(), self.get_nx());
+        })
+        .def("get_frequencies", [](Box& self, bool volume) {
+            return make_view(self, self.get_f_self_ptr(), volume);
+        }, py::arg("volume") = false)
+        .def("get_amplitudes", [](Box& self, bool volume) {
+            return make_view(self, self.get_amplitude_ptr(), volume);
+        }, py::arg("volume") = false)
+        .def("get_velocities", [](Box& self, bool volume) {
+            return make_view(self, self.get_v_f_ptr(), volume);
+        }, py::arg("volume") = false)
+        .def("get_fatigue", [](Box& self, bool volume) {
+            return make_view(self, self.get_fatigue_ptr(), volume);
+        }, py::arg("volume") = false)
+        .def("get_fatigue_limits", [](Box& self, bool volume) {
+            return make_view(self, self.get_fatigue_limit_ptr(), volume);
+        }, py::arg("volume") = false)
+        .def("get_inactivity_counts", [](Box& self, bool volume) {
+            return make_view(self, self.get_inactivity_count_ptr(), volume);
+        }, py::arg("volume") = false);
+}
+
 PYBIND11_MODULE(rstn_cpp, m) {
-    m.doc() = "R-STN C++ Core Module optimized for N^3 scale with AoS memory layout";
+    m.doc() = "R-STN C++ Core Module optimized for N^3 scale with SoA memory layout";
+
+    // ------------------------------------------------------------------
+    // カーネルの命令セット別実装 (import 時に CPUID / 環境変数 RSTN_KERNEL から選択)
+    // ------------------------------------------------------------------
+    const std::string kernel_warning = rstn_dispatch::init_from_env();
+    if (!kernel_warning.empty()) {
+        if (PyErr_WarnEx(PyExc_RuntimeWarning, kernel_warning.c_str(), 1) < 0) throw py::error_already_set();
+    }
+    m.def("kernel_variant", &rstn_dispatch::active_variant,
+          "Name of the active physics kernel variant (baseline / avx2 / avx512)");
+    m.def("available_kernel_variants", &rstn_dispatch::available_variants,
+          "Kernel variants built into this module and supported by the running CPU");
+    m.def("set_kernel_variant", &rstn_dispatch::select_variant, py::arg("name"),
+          "Switch the physics kernel variant ('auto' selects the best available)");
+
+    // フェーズ別の計測が有効なビルドか (RSTN_PROFILE=0 でビルドすると False)
+    m.attr("PROFILE_ENABLED") = py::bool_(RSTNProfiler::enabled);
+
+    // ------------------------------------------------------------------
+    // トレース (フェーズ毎のスパン, Chrome トレース形式への変換は experiments/tracing.py)
+    // ------------------------------------------------------------------
+    m.def("trace_start", &rstn_trace::start, "Start recording engine spans (discards earlier events)");
+    m.def("trace_stop", &rstn_trace::stop, "Stop recording engine spans");
+    m.def("trace_enabled", &rstn_trace::enabled);
+    m.def("trace_clock_ns", &rstn_trace::now_ns, "Current time on the clock used for span timestamps (ns)");
+    // 記録済みのスパンを取り出す: ([(name, category, tid, omp_thread, ts_ns, dur_ns), ...], 破棄した件数)
+    m.def("trace_collect", []() {
+        size_t dropped = 0;
+        const std::vector<rstn_trace::Event> events = rstn_trace::collect(&dropped);
+        py::list out;
+        for (const auto& ev : events) {
+            out.append(py::make_tuple(ev.name, ev.category, ev.tid, ev.omp_thread, ev.ts_ns, ev.dur_ns));
+        }
+        return py::make_tuple(out, dropped);
+    });
 
     // ------------------------------------------------------------------
     // RSTNParams のバインディング
     // ------------------------------------------------------------------
+    // 共鳴曲線の評価方法
+    py::enum_<GaussMode>(m, "GaussMode")
+        .value("LUT", GAUSS_LUT)
+        .value("FAST_EXP", GAUSS_FAST_EXP);
+
     py::class_<RSTNParams>(m, "RSTNParams")
         .def(py::init<>()) // デフォルトコンストラクタ
         
@@ -27,6 +663,11 @@ PYBIND11_MODULE(rstn_cpp, m) {
         .def_readwrite("a_threshold", &RSTNParams::a_threshold)
         .def_readwrite("a_limit", &RSTNParams::a_limit)
         
+        // 共鳴曲線の評価 (変更後は update_tables() が必要)
+        .def_readwrite("gauss_mode", &RSTNParams::gauss_mode)
+        .def_readwrite("lut_epsilon", &RSTNParams::lut_epsilon)
+        .def_readwrite("lut_step", &RSTNParams::lut_step)
+
         // 減衰率 (新規追加)
         .def_readwrite("attenuation", &RSTNParams::attenuation)
         
@@ -52,60 +693,21 @@ PYBIND11_MODULE(rstn_cpp, m) {
         .def("update_derived", &RSTNParams::update_derived);
 
     // ------------------------------------------------------------------
-    // RSTNBox のバインディング
+    // RSTNBox (float64) / RSTNBoxF32 (float32) のバインディング
     // ------------------------------------------------------------------
-    py::class_<RSTNBox>(m, "RSTNBox")
-        .def(py::init<int, int>(), py::arg("n"), py::arg("seed") = 42)
-        
-        // 物理シミュレーション実行
-        .def("step", &RSTNBox::step, py::arg("inputs"), py::arg("is_learning") = true)
-        
-        // 状態強制リセット
-        .def("reset_states", &RSTNBox::reset_states)
-        
-        // LUTの再計算トリガー
-        .def("update_tables", &RSTNBox::update_tables)
-        
-        // パラメータオブジェクトへの参照を返す (box.params でアクセス可能)
-        .def_property_readonly("params", &RSTNBox::get_params, py::return_value_policy::reference)
-        
-        // Boxサイズ取得
-        .def("get_size", &RSTNBox::get_size)
-
-        // ------------------------------------------------------------------
-        // ゼロコピー NumPy アクセサ (AoS View)
-        // ------------------------------------------------------------------
-        
-        // 周波数 (f_self) のビューを取得
-        .def("get_frequencies", [](RSTNBox& self) {
-            RSTNState* ptr = self.get_states_ptr();
-            return py::array_t<double>(
-                {self.get_total_nodes()},             // shape: (N^3,)
-                {sizeof(RSTNState)},                  // strides: 構造体1個分のバイト数
-                &ptr->f_self,                         // data: 先頭要素の f_self アドレス
-                py::cast(self)                        // base: 親オブジェクト(self)の寿命管理
-            );
-        })
+    bind_box<RSTNBox>(m, "RSTNBox");
+    bind_box<RSTNBoxF32>(m, "RSTNBoxF32");
 
-        // 振幅 (amplitude) のビューを取得
-        .def("get_amplitudes", [](RSTNBox& self) {
-            RSTNState* ptr = self.get_states_ptr();
-            return py::array_t<double>(
-                {self.get_total_nodes()},
-                {sizeof(RSTNState)},
-                &ptr->amplitude,
-                py::cast(self)
-            );
-        })
+    // 非同期実行の戻り値とスナップショット
+    py::class_<RSTNFuture>(m, "RSTNFuture")
+        .def("done", &RSTNFuture::done)
+        .def("result", &RSTNFuture::result, py::arg("timeout") = py::none());
+    bind_snapshot<double>(m, "RSTNSnapshot");
+    bind_snapshot<float>(m, "RSTNSnapshotF32");
 
-        // 疲労度 (fatigue) のビューを取得
-        .def("get_fatigue", [](RSTNBox& self) {
-            RSTNState* ptr = self.get_states_ptr();
-            return py::array_t<double>(
-                {self.get_total_nodes()},
-                {sizeof(RSTNState)},
-                &ptr->fatigue,
-                py::cast(self)
-            );
-        });
-}
\ No newline at end of file
+    // ------------------------------------------------------------------
+    // 参照実装 (最適化なしの 1 ノードずつの計算, RSTNBox / RSTNBoxF32 とビット単位で一致する)
+    // ------------------------------------------------------------------
+    bind_reference_box<RSTNReferenceBox>(m, "RSTNReferenceBox");
+    bind_reference_box<RSTNReferenceBoxF32>(m, "RSTNReferenceBoxF32");
+}
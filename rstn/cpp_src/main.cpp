@@ -6,10 +6,12 @@
 #include "RSTNBox.hpp"
 #include "RSTNState.hpp"
 #include "RSTNParams.hpp"
+#include "RSTNDispatch.hpp"
 
 // 統計情報の表示用ヘルパー
 void print_stats(int step, double elapsed_ms, RSTNBox& box, double input_freq, bool is_learning) {
-    RSTNState* states = box.get_states_ptr();
+    const double* amps = box.get_amplitude_ptr();
+    const double* fats = box.get_fatigue_ptr();
     size_t total = box.get_total_nodes();
     
     double max_amp = 0.0;
@@ -19,11 +21,11 @@ void print_stats(int step, double elapsed_ms, RSTNBox& box, double input_freq, b
 
     // 簡易統計 (表示用なのでシングルスレッドでOK)
     for(size_t i=0; i<total; ++i) {
-        double amp = states[i].amplitude;
+        double amp = amps[i];
         if (amp > 1.0) active_nodes++;
         if (amp > max_amp) max_amp = amp;
         avg_amp += amp;
-        avg_fatigue += states[i].fatigue;
+        avg_fatigue += fats[i];
     }
     avg_amp /= total;
     avg_fatigue /= total;
@@ -47,6 +49,7 @@ int main() {
 
     std::cout << "==============================================================" << std::endl;
     std::cout << " R-STN C++ Core Runner (N=" << N << ", Total Nodes=" << N*N*N << ")" << std::endl;
+    std::cout << " Kernel: " << rstn_dispatch::active_variant() << std::endl;
     std::cout << "==============================================================" << std::endl;
 
     // 1. Box初期化
@@ -105,6 +108,19 @@ int main() {
     std::cout << " Simulation Finished." << std::endl;
     std::cout << " Total Time: " << total_sec << " s" << std::endl;
     std::cout << " Avg Speed : " << (MAX_STEPS / total_sec) << " steps/sec" << std::endl;
+
+    // フェーズ別の内訳 (RSTN_PROFILE=0 でビルドした場合は表示なし)
+    const RSTNProfiler& prof = box.get_profiler();
+    for (int p = 0; p < PHASE_COUNT; ++p) {
+        const RSTNPhaseStats& st = prof.stats(p);
+        if (st.calls == 0) continue;
+        std::cout << "   " << std::left << std::setw(9) << RSTNProfiler::phase_name(p) << std::right
+                  << std::fixed << std::setprecision(3) << std::setw(9) << st.seconds * 1000.0 << " ms";
+        if (st.parallel_calls > 0 && st.thread_mean > 0.0) {
+            std::cout << "  (imbalance " << std::setprecision(2) << st.thread_max / st.thread_mean << ")";
+        }
+        std::cout << std::endl;
+    }
     std::cout << "==============================================================" << std::endl;
 
     return 0;
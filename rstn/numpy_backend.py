@@ -0,0 +1,824 @@
+"""
+R-STN エンジンの NumPy 実装 (rstn_cpp と同じ API)
+
+C++ 拡張 (rstn_cpp) をビルドしていない環境 (解析用のマシン・ノートブックなど) で、小さい N の実行や
+解析を行うためのバックエンド。全ノードを配列演算でまとめて更新する:
+  近傍の集計   : ずらしたスライスの加算 (x-1, x+1, y-1, y+1, z-1, z+1 の順, C++ 版と同じ加算順序)
+                 6 近傍以外の形状 (set_stencil) は C++ 版と同じ窓和の合成
+  共鳴曲線     : C++ 版と同じ float32 の補間テーブルを np.take で参照
+  転生         : マスクで選んだノードのみ Philox 乱数 (RSTNRandom.hpp と同じ値) で周波数を再設定
+
+倍精度版 (RSTNBox) は演算順序・丸めが C++ 版と同じで、同じ seed・入力なら結果はビット単位で一致する。
+単精度版 (RSTNBoxF32) は非正規化数を 0 に丸めない (C++ 版は FTZ/DAZ) ため、極小の振幅でわずかに異なる。
+
+キャッシュブロッキング・疎ステップ・フェーズ別計測は性能のための設定なので、設定値の保持のみ行い
+計算には影響しない (C++ 版でも結果は変わらない)。
+"""
+import concurrent.futures
+import enum
+import math
+
+import numpy as np
+
+# ----------------------------------------------------------------------
+# パラメータ (rstn/cpp_src/RSTNParams.hpp)
+# ----------------------------------------------------------------------
+
+
+class GaussMode(enum.IntEnum):
+    """共鳴曲線 (ガウス関数) の評価方法"""
+    LUT = 0        # 線形補間テーブル
+    FAST_EXP = 1   # 多項式近似の exp
+
+
+class RSTNParams:
+    """物理パラメータ (項目・既定値は C++ 版の RSTNParams と同じ)"""
+
+    def __init__(self):
+        # 物理定数
+        self.sigma_ex = 10.0
+        self.sigma_learn = 20.0
+        self.inertia = 0.95
+        self.viscosity = 0.5
+        self.dead_band = 1.0
+        self.c_load = 10.0
+        self.c_recover = 15.0
+        self.a_threshold = 1.0
+        self.a_limit = 100.0
+
+        # 共鳴曲線の評価 (変更後は update_tables() を呼ぶ)
+        self.gauss_mode = GaussMode.LUT
+        self.lut_epsilon = 1e-6
+        self.lut_step = 0.1
+
+        # 空間減衰率
+        self.attenuation = 0.15
+
+        # 初期化・転生範囲
+        self.f_min = -40.0
+        self.f_max = 40.0
+        self.fatigue_lim_min = 900.0
+        self.fatigue_lim_max = 1100.0
+
+        # エイジング & 代謝パラメータ
+        self.max_steps = 10000
+        self.p_critical = 0.05
+        self.p_mature = 0.33
+        self.decay_alpha = 2.0
+        self.growth_beta = 2.0
+        self.inactivity_limit = 100
+
+        # 動的係数 (step で更新される)
+        self.current_learning_rate = 1.0
+        self.current_limit_multiplier = 1.0
+
+        self.update_derived()
+
+    def update_derived(self):
+        self._coeff_ex = -1.0 / (2.0 * self.sigma_ex * self.sigma_ex)
+        self._coeff_learn = -1.0 / (2.0 * self.sigma_learn * self.sigma_learn)
+
+
+# ----------------------------------------------------------------------
+# カウンタベース乱数 (rstn/cpp_src/RSTNRandom.hpp の Philox4x32-10)
+# ----------------------------------------------------------------------
+
+STREAM_REBIRTH = 0
+STREAM_INIT_F = 1
+STREAM_INIT_LIMIT = 2
+
+_MASK32 = np.uint64(0xFFFFFFFF)
+_PHILOX_M0 = np.uint64(0xD2511F53)
+_PHILOX_M1 = np.uint64(0xCD9E8D57)
+_PHILOX_W0 = 0x9E3779B9
+_PHILOX_W1 = 0xBB67AE85
+
+
+def philox_uniform(seed, stream, index, tick, lo=0.0, hi=1.0):
+    """ノード番号の配列 index に対する [lo, hi) の一様乱数 (C++ 版 rstn_random::uniform と同じ値)"""
+    index = np.asarray(index, dtype=np.uint64)
+    tick = int(tick)
+    c0 = index & _MASK32
+    c1 = index >> np.uint64(32)
+    c2 = np.full_like(c0, tick & 0xFFFFFFFF)
+    c3 = np.full_like(c0, (tick >> 32) & 0xFFFFFFFF)
+    k0 = int(seed) & 0xFFFFFFFF
+    k1 = int(stream) & 0xFFFFFFFF
+    for _ in range(10):
+        p0 = _PHILOX_M0 * c0
+        p1 = _PHILOX_M1 * c2
+        n0 = (p1 >> np.uint64(32)) ^ c1 ^ np.uint64(k0)
+        n2 = (p0 >> np.uint64(32)) ^ c3 ^ np.uint64(k1)
+        c0, c1, c2, c3 = n0, p1 & _MASK32, n2, p0 & _MASK32
+        k0 = (k0 + _PHILOX_W0) & 0xFFFFFFFF
+        k1 = (k1 + _PHILOX_W1) & 0xFFFFFFFF
+    bits = ((c0 << np.uint64(21)) ^ (c1 >> np.uint64(11))) & np.uint64((1 << 53) - 1)
+    return lo + (hi - lo) * (bits.astype(np.float64) * (1.0 / 9007199254740992.0))
+
+
+# ----------------------------------------------------------------------
+# 共鳴曲線 (rstn/cpp_src/RSTNGauss.hpp)
+# ----------------------------------------------------------------------
+
+class GaussTable:
+    """励起用・学習用の補間テーブル ({値, 傾き, 値, 傾き} を float32 で交互に格納)"""
+
+    STRIDE = 4
+    MAX_ENTRIES = 1 << 22
+
+    def __init__(self, p):
+        if not (0.0 < p.lut_epsilon < 1.0):
+            raise ValueError("lut_epsilon must be in (0, 1).")
+        if not (p.lut_step > 0.0):
+            raise ValueError("lut_step must be positive.")
+        self.mode = GaussMode(p.gauss_mode)
+        self.coeff_ex = p._coeff_ex
+        self.coeff_learn = p._coeff_learn
+        self.log_epsilon = math.log(p.lut_epsilon)
+
+        # 両曲線が epsilon を下回る |Δf| までを lut_step 刻みで保持する
+        cutoff = math.sqrt(self.log_epsilon / max(self.coeff_ex, self.coeff_learn))
+        n_intervals = math.ceil(cutoff / p.lut_step)
+        if not (n_intervals < self.MAX_ENTRIES):
+            raise ValueError("Gaussian LUT too large; increase lut_step or lut_epsilon.")
+        self.max_idx = n_intervals + 1
+        self.inv_step = np.float32(1.0 / p.lut_step)
+
+        # exp はライブラリの実装差が出ないよう math.exp で 1 点ずつ求める
+        ex, learn = [], []
+        for i in range(self.max_idx + 1):
+            d = i * p.lut_step
+            e = math.exp(d * d * self.coeff_ex)
+            g = math.exp(d * d * self.coeff_learn)
+            ex.append(e if (e >= p.lut_epsilon and i < self.max_idx) else 0.0)
+            learn.append(g if (g >= p.lut_epsilon and i < self.max_idx) else 0.0)
+        ex = np.array(ex)
+        learn = np.array(learn)
+        entries = np.zeros((self.max_idx + 1, self.STRIDE), dtype=np.float32)
+        entries[:-1, 0] = ex[:-1]
+        entries[:-1, 1] = ex[1:] - ex[:-1]
+        entries[:-1, 2] = learn[:-1]
+        entries[:-1, 3] = learn[1:] - learn[:-1]
+        self.entries = entries.ravel()
+
+    @property
+    def nbytes(self):
+        return self.entries.nbytes
+
+    def evaluate(self, diff, curve):
+        """周波数差 diff に対する曲線の値 (curve: 0 = 励起, 2 = 学習)"""
+        T = diff.dtype.type
+        if self.mode == GaussMode.FAST_EXP:
+            coeff = self.coeff_ex if curve == 0 else self.coeff_learn
+            x = (diff * diff) * T(coeff)
+            return np.where(x >= T(self.log_epsilon), _fast_exp(x), T(0))
+        pos = np.minimum(np.abs(diff) * T(self.inv_step), T(self.max_idx))
+        i = pos.astype(np.int32)
+        frac = pos - i.astype(T)
+        offset = i * self.STRIDE + curve
+        return np.take(self.entries, offset).astype(T) + frac * np.take(self.entries, offset + 1).astype(T)
+
+
+def _fast_exp(x):
+    """exp(x) の多項式近似 (C++ 版 rstn_gauss::fast_exp と同じ手順, x <= 0)"""
+    T = x.dtype.type
+    x = np.maximum(x, T(-87))
+    n = -np.trunc(-(x * T(1.4426950408889634)) + T(0.5))
+    r = (x - n * T(0.693145751953125)) - n * T(1.428606820309417e-06)
+    p = np.full_like(r, T(1.0 / 5040))
+    for c in (1.0 / 720, 1.0 / 120, 1.0 / 24, 1.0 / 6, 0.5, 1.0, 1.0):
+        p = p * r + T(c)
+    return p * np.ldexp(T(1), n.astype(np.int32))
+
+
+# ----------------------------------------------------------------------
+# 近傍の形状 (rstn/cpp_src/RSTNStencil.cpp と同じ手順・加算順序)
+# ----------------------------------------------------------------------
+
+STENCILS = ("von_neumann", "moore", "cube", "sphere")
+
+
+def _check_stencil(shape, radius):
+    if shape not in STENCILS:
+        raise ValueError(f"unknown stencil: {shape} (expected von_neumann, moore, cube or sphere)")
+    if radius < 1:
+        raise ValueError("stencil radius must be >= 1.")
+    if shape in ("von_neumann", "moore") and radius != 1:
+        raise ValueError("von_neumann and moore stencils have radius 1; use cube or sphere.")
+
+
+def _side_sums(v, axis, r):
+    """
+    axis 方向の各要素の両側 r 個ずつの和 (範囲外は除く)
+    窓和は長さ r のブロックごとの後方累積和 suf と前方累積和 pre の 2 項 (同じブロック内なら一方) で表す
+    """
+    x = np.moveaxis(v, axis, 0)
+    n = x.shape[0]
+    pre = np.empty_like(x)
+    suf = np.empty_like(x)
+    for k in range(n):
+        pre[k] = x[k] if k % r == 0 else pre[k - 1] + x[k]
+    for k in range(n - 1, -1, -1):
+        suf[k] = x[k] if (k % r == r - 1 or k == n - 1) else suf[k + 1] + x[k]
+
+    zero = np.zeros_like(x[0])
+
+    def window(lo, hi):
+        if lo > hi:
+            return zero
+        if lo // r != hi // r:
+            return suf[lo] + pre[hi]
+        return suf[lo] if hi == min((lo // r + 1) * r, n) - 1 else pre[hi]
+
+    out = np.empty_like(x)
+    for i in range(n):
+        out[i] = window(max(0, i - r), i - 1) + window(i + 1, min(n - 1, i + r))
+    return np.moveaxis(out, 0, axis)
+
+
+def _stencil_sums(v, shape, r):
+    """(nz, ny, nx) 配列 v の近傍和 (自身を除く)。立方体は x, y, z 方向の窓和の合成、球は x 方向の窓和の和"""
+    if shape != "sphere":
+        xe = _side_sums(v, 2, r)
+        xf = xe + v
+        sy = _side_sums(xf, 1, r)
+        ye = sy + xe
+        yf = sy + xf
+        return _side_sums(yf, 0, r) + ye
+
+    nz, ny, _ = v.shape
+    x_excl = _side_sums(v, 2, r)
+    x_full = [v] + [_side_sums(v, 2, hw) + v for hw in range(1, r)]
+    out = np.zeros_like(v)
+    for dz in range(-r, r + 1):
+        for dy in range(-r, r + 1):
+            rest = r * r - dy * dy - dz * dz
+            if rest < 0:
+                continue
+            src = x_excl if dz == 0 and dy == 0 else x_full[math.isqrt(rest)]
+            dst_z = slice(max(0, -dz), min(nz, nz - dz))
+            dst_y = slice(max(0, -dy), min(ny, ny - dy))
+            src_z = slice(max(0, dz), min(nz, nz + dz))
+            src_y = slice(max(0, dy), min(ny, ny + dy))
+            out[dst_z, dst_y] = out[dst_z, dst_y] + src[src_z, src_y]
+    return out
+
+
+# ----------------------------------------------------------------------
+# Box
+# ----------------------------------------------------------------------
+
+class _RSTNBoxBase:
+    """N^3 (または nx x ny x nz) のノード格子 (状態は (nz, ny, nx) 形状の配列で保持する)"""
+
+    dtype = np.float64
+
+    def __init__(self, *dims, seed=42, num_threads=0, huge_pages=False):
+        # RSTNBox(n, seed) / RSTNBox(nx, ny, nz, seed) の位置引数にも対応する
+        if len(dims) == 2:
+            dims, seed = dims[:1], dims[1]
+        elif len(dims) == 4:
+            dims, seed = dims[:3], dims[3]
+        if len(dims) == 1:
+            dims = (dims[0],) * 3
+        if len(dims) != 3:
+            raise TypeError("expected RSTNBox(n, seed=42) or RSTNBox(nx, ny, nz, seed=42)")
+        self._nx, self._ny, self._nz = (int(d) for d in dims)
+        if self._nx <= 0 or self._ny <= 0 or self._nz <= 0:
+            raise ValueError("Box dimensions must be positive.")
+
+        self._params = RSTNParams()
+        self._current_step = 0
+        self._rng_seed = int(seed) & 0xFFFFFFFF
+        self._rng_tick = 0
+        self._reset_count = 0
+        self._global_index = np.arange(self.total_nodes, dtype=np.uint64).reshape(self.shape)
+
+        self._stencil = ("von_neumann", 1)
+        self._neighbor_count = self._count_neighbors()
+
+        self._blocking = (False, 0, 0, 1)
+        self._sparse = (False, 0.5)
+        self._snapshot = None
+        self.set_num_threads(num_threads)
+        self._huge_pages = bool(huge_pages)
+        self._affinity = []
+
+        self.update_tables()
+        self.reset_states()
+
+    # --- 設定 ---
+
+    def update_tables(self):
+        """パラメータ変更時に共鳴曲線テーブルとエイジングスケジュールを再計算する"""
+        p = self._params
+        p.update_derived()
+        self._gauss = GaussTable(p)
+        self._aging = (p.max_steps, p.p_critical, p.p_mature, p.decay_alpha, p.growth_beta)
+
+    @property
+    def params(self):
+        return self._params
+
+    @property
+    def lut_bytes(self):
+        return self._gauss.nbytes
+
+    def reset_states(self):
+        self._current_step = 0
+        self._apply_aging(0)
+        p = self._params
+        tick = self._reset_count
+        self._reset_count += 1
+        idx = self._global_index
+        self._store("_f", philox_uniform(self._rng_seed, STREAM_INIT_F, idx, tick, p.f_min, p.f_max))
+        self._store("_fatigue_limit", philox_uniform(self._rng_seed, STREAM_INIT_LIMIT, idx, tick,
+                                                     p.fatigue_lim_min, p.fatigue_lim_max))
+        self._store("_amp", 0)
+        self._store("_v_f", 0)
+        self._store("_fatigue", 0)
+        self._store("_inactivity", 0, np.int32)
+
+    def _store(self, name, value, dtype=None):
+        # 状態は確保済みの配列に書き込む (取得済みのビューが常に現在の状態を指すように, C++ 版と同じ)
+        arr = getattr(self, name, None)
+        if arr is None:
+            arr = np.empty(self.shape, dtype=dtype or self.dtype)
+            setattr(self, name, arr)
+        arr[...] = value
+
+    def _apply_aging(self, step):
+        max_steps, p_critical, p_mature, decay_alpha, growth_beta = self._aging
+        progress = step / max_steps
+        self._params.current_learning_rate = 1.0 / math.pow(1.0 + progress / p_critical, decay_alpha)
+        self._params.current_limit_multiplier = math.pow(1.0 + progress / p_mature, growth_beta)
+
+    def _count_neighbors(self):
+        """近傍数 (境界では少なくなる, 正規化に使う)"""
+        T = self.dtype
+        shape, radius = self._stencil
+        if shape != "von_neumann":
+            return _stencil_sums(np.ones(self.shape, dtype=T), shape, radius)
+        count = np.zeros(self.shape, dtype=T)
+        count[:, :, 1:] += 1
+        count[:, :, :-1] += 1
+        count[:, 1:, :] += 1
+        count[:, :-1, :] += 1
+        count[1:, :, :] += 1
+        count[:-1, :, :] += 1
+        return count
+
+    def set_stencil(self, shape, radius=1):
+        """空間伝播の近傍の形状 ("von_neumann" / "moore" / "cube" / "sphere")"""
+        _check_stencil(shape, radius)
+        self._stencil = (shape, int(radius))
+        self._neighbor_count = self._count_neighbors()
+
+    stencil = property(lambda self: self._stencil[0])
+    stencil_radius = property(lambda self: self._stencil[1])
+
+    # 性能のための設定 (NumPy 版では計算に影響しない。C++ 版でも結果は同一)
+    def set_num_threads(self, n):
+        if n < 0:
+            raise ValueError("num_threads must be >= 0 (0 = OpenMP default).")
+        self._num_threads = int(n)
+
+    def set_huge_pages(self, enabled):
+        self._huge_pages = bool(enabled)
+
+    def set_affinity(self, cpus):
+        cpus = [int(c) for c in cpus]
+        if any(c < 0 for c in cpus):
+            raise ValueError("CPU numbers must be >= 0.")
+        self._affinity = cpus
+
+    def set_blocking(self, enabled, tile_y=0, tile_z=0, time_block=1):
+        if tile_y < 0 or tile_z < 0 or time_block < 1:
+            raise ValueError("tile sizes must be >= 0 and time_block >= 1.")
+        self._blocking = (bool(enabled), tile_y, tile_z, time_block)
+
+    def set_sparse(self, enabled, dense_threshold=0.5):
+        if not (0.0 <= dense_threshold <= 1.0):
+            raise ValueError("dense_threshold must be in [0, 1].")
+        self._sparse = (bool(enabled), dense_threshold)
+
+    def sync_activity(self):
+        pass
+
+    blocking_enabled = property(lambda self: self._blocking[0])
+    tile_y = property(lambda self: self._blocking[1])
+    tile_z = property(lambda self: self._blocking[2])
+    time_block = property(lambda self: self._blocking[3])
+    sparse_enabled = property(lambda self: self._sparse[0])
+    dense_threshold = property(lambda self: self._sparse[1])
+    active_fraction = property(lambda self: 1.0)
+    num_threads = property(lambda self: self._num_threads)
+    huge_pages = property(lambda self: self._huge_pages)
+    affinity = property(lambda self: list(self._affinity))
+
+    # フェーズ別の計測は行わない (C++ 版を RSTN_PROFILE=0 でビルドした場合と同じ)
+    @property
+    def profile(self):
+        return {}
+
+    def reset_profile(self):
+        pass
+
+    # --- 実行 ---
+
+    def step(self, inputs, *args, amps=None, freqs=None, is_learning=True):
+        """
+        1 ステップ進める (C++ 版の 2 つのオーバーロードと同じ呼び出し方)
+          step([(index, (amp, freq)), ...], is_learning)
+          step(indices, amps, freqs, is_learning)   (NumPy 配列)
+        """
+        indices, amps, freqs, rest = self._step_inputs(inputs, args, amps, freqs)
+        if len(rest) > 1:
+            raise TypeError("step() got too many positional arguments")
+        if rest:
+            is_learning = rest[0]
+        self._step(indices, amps, freqs, bool(is_learning))
+
+    @staticmethod
+    def _step_inputs(inputs, args, amps, freqs):
+        """
+        step / step_async の位置引数を振り分ける (C++ 版のオーバーロードの解決と同じ)
+        2 番目の引数が bool (または省略) ならリスト形式、それ以外は配列形式 (indices, amps, freqs, ...) とみなす
+        戻り値: (indices, amps, freqs, 残りの位置引数)
+        """
+        if args and not isinstance(args[0], (bool, np.bool_)):
+            if len(args) < 2:
+                raise TypeError("step() takes (indices, amps, freqs) when inputs is an index array")
+            amps, freqs, args = args[0], args[1], args[2:]
+        if amps is None and freqs is None:
+            pairs = list(inputs)
+            indices = np.array([i for i, _ in pairs], dtype=np.int64)
+            amps = np.array([v[0] for _, v in pairs], dtype=np.float64)
+            freqs = np.array([v[1] for _, v in pairs], dtype=np.float64)
+        else:
+            if amps is None or freqs is None:
+                raise TypeError("step() takes both amps and freqs with an index array")
+            indices = np.asarray(inputs, dtype=np.int64)
+            amps = np.asarray(amps, dtype=np.float64)
+            freqs = np.asarray(freqs, dtype=np.float64)
+            if indices.ndim != 1 or amps.shape != indices.shape or freqs.shape != indices.shape:
+                raise ValueError("indices, amps and freqs must be 1-D arrays of the same length")
+        return indices, amps, freqs, args
+
+    def run(self, steps, inputs=None, is_learning=True, record_every=0, out_amps=None, out_freqs=None):
+        """
+        steps ステップを連続実行する (引数・戻り値は C++ 版と同じ)
+          inputs      : (indices, amps, freqs)。各配列は (K,) なら全ステップ共通、(T, K) ならステップ毎
+          is_learning : bool または (T,) の bool 配列
+          record_every > 0 の場合、(振幅, 周波数) の記録フレーム (F, 全ノード数) を返す
+        """
+        if steps < 0:
+            raise ValueError("steps must be non-negative")
+        if inputs is not None:
+            if len(inputs) != 3:
+                raise ValueError("inputs must be a tuple (indices, amps, freqs)")
+            indices, amps, freqs = (np.asarray(a) for a in inputs)
+            if indices.ndim not in (1, 2):
+                raise ValueError("inputs must be 1-D (K,) or 2-D (T, K)")
+            if amps.shape != indices.shape or freqs.shape != indices.shape:
+                raise ValueError("indices, amps and freqs must have the same shape")
+            if indices.ndim == 2 and indices.shape[0] != steps and indices.shape[0] != 1:
+                raise ValueError("Input schedule must have 1 or `steps` rows.")
+            indices = np.atleast_2d(indices).astype(np.int64)
+            amps = np.atleast_2d(amps).astype(np.float64)
+            freqs = np.atleast_2d(freqs).astype(np.float64)
+            if np.any(indices >= self.total_nodes):
+                raise IndexError("Input node index out of range.")
+        else:
+            indices = np.zeros((1, 0), dtype=np.int64)
+            amps = freqs = np.zeros((1, 0))
+
+        if isinstance(is_learning, (bool, np.bool_)):
+            learning = np.full(steps, bool(is_learning))
+        else:
+            learning = np.asarray(is_learning, dtype=bool)
+            if learning.shape != (steps,):
+                raise ValueError("is_learning array must have shape (steps,)")
+
+        frames = (steps + record_every - 1) // record_every if record_every > 0 else 0
+        rec_a = rec_f = None
+        if frames > 0:
+            rec_a = self._prepare_output(out_amps, frames)
+            rec_f = self._prepare_output(out_freqs, frames)
+
+        frame = 0
+        for s in range(steps):
+            row = s if indices.shape[0] > 1 else 0
+            self._step(indices[row], amps[row], freqs[row], bool(learning[s]))
+            if record_every > 0 and s % record_every == 0:
+                rec_a[frame] = self._amp.ravel()
+                rec_f[frame] = self._f.ravel()
+                frame += 1
+
+        if frames == 0:
+            return None
+        return rec_a, rec_f
+
+    def advance_until_quiet(self, condition, max_steps, is_learning=True):
+        """
+        入力なしで condition(box) が真になるまで (最大 max_steps ステップ) 進め、進めたステップ数を返す
+        (C++ 版の静止状態の早送りは行わず、1 ステップずつ進めて毎回 condition を評価する)
+        """
+        if max_steps < 0:
+            raise ValueError("max_steps must be non-negative")
+        empty = np.zeros(0, dtype=np.int64)
+        values = np.zeros(0)
+        done = 0
+        while not condition(self) and done < max_steps:
+            self._step(empty, values, values, bool(is_learning))
+            done += 1
+        return done
+
+    def infer_until_converged(self, inputs=None, tol=1e-6, max_steps=1000, volume=False):
+        """
+        同じ入力で推論ステップを繰り返し、1 ステップでの振幅の変化量の最大値が tol 以下になった時点で止める
+        (最大 max_steps ステップ)。戻り値は (振幅のコピー, 進めたステップ数, 最後のステップの変化量)
+        """
+        if max_steps < 0:
+            raise ValueError("max_steps must be non-negative")
+        if not tol >= 0.0:
+            raise ValueError("tol must be non-negative")
+        if inputs is not None:
+            if len(inputs) != 3:
+                raise ValueError("inputs must be a tuple (indices, amps, freqs)")
+            indices = np.asarray(inputs[0], dtype=np.int64)
+            amps = np.asarray(inputs[1], dtype=np.float64)
+            freqs = np.asarray(inputs[2], dtype=np.float64)
+            if indices.ndim != 1 or amps.shape != indices.shape or freqs.shape != indices.shape:
+                raise ValueError("indices, amps and freqs must be 1-D arrays of the same length")
+        else:
+            indices = np.zeros(0, dtype=np.int64)
+            amps = freqs = np.zeros(0)
+        residual = float("inf")
+        done = 0
+        while done < max_steps:
+            prev = self._amp.copy()
+            self._step(indices, amps, freqs, False)
+            done += 1
+            change = np.abs(self._amp - prev)
+            residual = float("inf") if np.isnan(change).any() else float(change.max(initial=0.0))
+            if residual <= tol:
+                break
+        return self.get_amplitudes(volume).copy(), done, residual
+
+    # --- 非同期実行 (C++ 版と同じ API, その場で実行して完了済みの Future を返す) ---
+
+    def step_async(self, inputs, *args, amps=None, freqs=None, is_learning=True, publish=True):
+        """step を実行し、完了済みの concurrent.futures.Future を返す (例外は result() で送出する)"""
+        indices, amps, freqs, rest = self._step_inputs(inputs, args, amps, freqs)
+        if len(rest) > 2:
+            raise TypeError("step_async() got too many positional arguments")
+        is_learning, publish = tuple(rest) + (is_learning, publish)[len(rest):]
+        return self._run_job(lambda: self._step(indices, amps, freqs, bool(is_learning)), publish)
+
+    def run_async(self, steps, inputs=None, is_learning=True, record_every=0, out_amps=None, out_freqs=None,
+                  snapshot_every=0):
+        """run を実行し、完了済みの Future を返す (result() は run の戻り値)"""
+        if snapshot_every < 0:
+            raise ValueError("snapshot_every must be non-negative")
+        return self._run_job(lambda: self.run(steps, inputs, is_learning, record_every, out_amps, out_freqs))
+
+    def snapshot(self):
+        """最後に公開されたスナップショット (非同期実行を始める前は現在の状態)"""
+        if self._snapshot is None:
+            self._publish_snapshot()
+        return self._snapshot
+
+    def _run_job(self, job, publish=True):
+        if self._snapshot is None:
+            self._publish_snapshot()
+        future = concurrent.futures.Future()
+        try:
+            result = job()
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        if publish:
+            self._publish_snapshot()
+        return future
+
+    def _publish_snapshot(self):
+        self._snapshot = RSTNSnapshot(self)
+
+    def _prepare_output(self, out, frames):
+        if out is None:
+            return np.empty((frames, self.total_nodes), dtype=self.dtype)
+        if not isinstance(out, np.ndarray) or out.dtype != self.dtype:
+            raise ValueError(f"output buffer must be a {np.dtype(self.dtype).name} array")
+        if not out.flags.writeable or not out.flags.c_contiguous or out.size != frames * self.total_nodes:
+            raise ValueError(f"output buffer must be a writeable C-contiguous {np.dtype(self.dtype).name} "
+                             "array of size frames * total nodes")
+        return out.reshape(frames, self.total_nodes)
+
+    def _step(self, indices, amps, freqs, is_learning):
+        # --- 直接入力 (index < 0 は無視, 同じノードへの重複は後の値を使う) ---
+        valid = indices >= 0
+        if np.any(indices[valid] >= self.total_nodes):
+            raise IndexError("Input node index out of range.")
+        indices, amps, freqs = indices[valid], amps[valid], freqs[valid]
+        if indices.size:
+            _, last = np.unique(indices[::-1], return_index=True)
+            keep = indices.size - 1 - last
+            indices, amps, freqs = indices[keep], amps[keep], freqs[keep]
+
+        # --- エイジング (学習ステップでのみ進む) ---
+        if is_learning:
+            if self._current_step < self._aging[0]:
+                self._current_step += 1
+            self._apply_aging(self._current_step)
+
+        self._update(indices, amps.astype(self.dtype), freqs.astype(self.dtype), is_learning)
+        self._rng_tick += 1
+
+    def _update(self, in_idx, in_amp, in_freq, is_learning):
+        T = self.dtype
+        p = self._params
+        amp, f_in = self._amp, self._f
+
+        # --- 近傍の集計 (x-1, x+1, y-1, y+1, z-1, z+1 の順に加算) ---
+        abs_a = np.abs(amp)
+        abs_af = abs_a * f_in
+        shape, radius = self._stencil
+        if shape == "von_neumann":
+            sum_a = np.zeros_like(amp)
+            sum_af = np.zeros_like(amp)
+            for dst, src in _NEIGHBOR_SLICES:
+                sum_a[dst] += abs_a[src]
+                sum_af[dst] += abs_af[src]
+        else:
+            sum_a = _stencil_sums(abs_a, shape, radius)
+            sum_af = _stencil_sums(abs_af, shape, radius)
+
+        # --- 合成入力 ---
+        count = self._neighbor_count
+        with np.errstate(divide="ignore", invalid="ignore"):
+            a_syn = np.where(count > T(0), sum_a / count, T(0)) * T(1.0 - p.attenuation)
+            f_syn = np.where(sum_a > T(1e-9), sum_af / sum_a, f_in)
+        if in_idx.size:
+            a_syn.ravel()[in_idx] = np.abs(in_amp)
+            f_syn.ravel()[in_idx] = in_freq
+
+        diff = f_syn - f_in
+
+        # --- 励起 ---
+        a = np.minimum(a_syn * self._gauss.evaluate(diff, 0), T(p.a_limit))
+        if not is_learning:
+            self._amp[...] = a   # 推論: 振幅のみ更新し、他の状態は凍結
+            return
+
+        # --- 適応 (RFA) ---
+        dead_band = T(p.dead_band)
+        inertia = T(p.inertia)
+        force = np.where(diff > T(0), T(1), T(-1)) * (a_syn * self._gauss.evaluate(diff, 2))
+        force *= T(p.current_learning_rate)
+        force = np.where(np.abs(diff) >= dead_band, force, T(0))
+        new_v_f = (self._v_f * inertia) + (force * (T(1) - inertia))
+        new_v_f *= T(p.viscosity)
+        f = f_in + new_v_f
+
+        # --- 代謝 (疲労) ---
+        stuck = np.abs(force) < dead_band
+        a_threshold = T(p.a_threshold)
+        loaded = self._fatigue + T(p.c_load) * (a / T(p.a_limit))
+        recovered = np.maximum(T(0), self._fatigue - T(p.c_recover))
+        fat = np.where(stuck, loaded, recovered)
+        fat = np.where(a < a_threshold, np.maximum(T(0), fat - T(p.c_recover)), fat)
+        inact = (self._inactivity + 1) * stuck
+
+        # --- 転生 (過労または不活動) ---
+        overwork = fat > self._fatigue_limit * T(p.current_limit_multiplier)
+        stagnant = (inact > p.inactivity_limit) & (a < a_threshold)
+        reborn = overwork | stagnant
+
+        self._fatigue[...] = np.where(reborn, T(0), fat)
+        self._v_f[...] = np.where(reborn, T(0), new_v_f)
+        self._amp[...] = np.where(reborn, T(0), a)
+        self._inactivity[...] = np.where(reborn, 0, inact)
+        if np.any(reborn):
+            f[reborn] = philox_uniform(self._rng_seed, STREAM_REBIRTH, self._global_index[reborn],
+                                       self._rng_tick, p.f_min, p.f_max).astype(T)
+        self._f[...] = f
+
+    # --- 状態の参照 ---
+    # ビューは状態配列そのもので、ステップ後も現在の状態を指す (C++ 版と同じ)
+
+    def _view(self, arr, volume):
+        return arr if volume else arr.reshape(-1)
+
+    def get_frequencies(self, volume=False):
+        return self._view(self._f, volume)
+
+    def get_amplitudes(self, volume=False):
+        return self._view(self._amp, volume)
+
+    def get_velocities(self, volume=False):
+        return self._view(self._v_f, volume)
+
+    def get_fatigue(self, volume=False):
+        return self._view(self._fatigue, volume)
+
+    def get_fatigue_limits(self, volume=False):
+        return self._view(self._fatigue_limit, volume)
+
+    def get_inactivity_counts(self, volume=False):
+        return self._view(self._inactivity, volume)
+
+    # --- 形状 ---
+
+    nx = property(lambda self: self._nx)
+    ny = property(lambda self: self._ny)
+    nz = property(lambda self: self._nz)
+
+    @property
+    def shape(self):
+        return (self._nz, self._ny, self._nx)
+
+    @property
+    def total_nodes(self):
+        return self._nx * self._ny * self._nz
+
+    def get_size(self):
+        if not (self._nx == self._ny == self._nz):
+            raise RuntimeError("get_size() is only defined for cubic boxes; use nx / ny / nz.")
+        return self._nx
+
+
+class RSTNSnapshot:
+    """ある世代の状態のコピー (C++ 版 RSTNSnapshot と同じ読み取り専用のアクセサ)"""
+
+    def __init__(self, box):
+        self.generation = box._rng_tick
+        self.step = box._current_step
+        self.nx, self.ny, self.nz = box.nx, box.ny, box.nz
+        self._fields = {}
+        for name in ("get_frequencies", "get_amplitudes", "get_velocities", "get_fatigue",
+                     "get_fatigue_limits", "get_inactivity_counts"):
+            arr = getattr(box, name)(volume=True).copy()
+            arr.flags.writeable = False
+            self._fields[name] = arr
+
+    @property
+    def shape(self):
+        return (self.nz, self.ny, self.nx)
+
+    def _view(self, name, volume):
+        arr = self._fields[name]
+        return arr if volume else arr.reshape(-1)
+
+    def get_frequencies(self, volume=False):
+        return self._view("get_frequencies", volume)
+
+    def get_amplitudes(self, volume=False):
+        return self._view("get_amplitudes", volume)
+
+    def get_velocities(self, volume=False):
+        return self._view("get_velocities", volume)
+
+    def get_fatigue(self, volume=False):
+        return self._view("get_fatigue", volume)
+
+    def get_fatigue_limits(self, volume=False):
+        return self._view("get_fatigue_limits", volume)
+
+    def get_inactivity_counts(self, volume=False):
+        return self._view("get_inactivity_counts", volume)
+
+
+# 近傍の (書き込み先, 読み出し元) スライス ((nz, ny, nx) 配列に対して x-1, x+1, y-1, y+1, z-1, z+1 の順)
+_ALL = slice(None)
+_NEIGHBOR_SLICES = (
+    ((_ALL, _ALL, slice(1, None)), (_ALL, _ALL, slice(None, -1))),
+    ((_ALL, _ALL, slice(None, -1)), (_ALL, _ALL, slice(1, None))),
+    ((_ALL, slice(1, None), _ALL), (_ALL, slice(None, -1), _ALL)),
+    ((_ALL, slice(None, -1), _ALL), (_ALL, slice(1, None), _ALL)),
+    ((slice(1, None), _ALL, _ALL), (slice(None, -1), _ALL, _ALL)),
+    ((slice(None, -1), _ALL, _ALL), (slice(1, None), _ALL, _ALL)),
+)
+
+
+class RSTNBox(_RSTNBoxBase):
+    """倍精度版 (C++ 版 RSTNBox とビット単位で一致する)"""
+    dtype = np.float64
+
+
+class RSTNBoxF32(_RSTNBoxBase):
+    """単精度版"""
+    dtype = np.float32
+
+
+# rstn_cpp と同じ問い合わせ関数
+PROFILE_ENABLED = False
+
+
+def kernel_variant():
+    return "numpy"
+
+
+def available_kernel_variants():
+    return ["numpy"]
@@ -1,6 +1,8 @@
 from setuptools import setup, Extension
+from setuptools.command.build_ext import build_ext
 import pybind11
 import os
+import platform
 
 # C++ソースファイルがあるディレクトリ
 LIB_DIR = "rstn/cpp_src"
@@ -10,12 +12,60 @@ sources = [
     os.path.join(LIB_DIR, "bindings.cpp"),
     os.path.join(LIB_DIR, "RSTNBox.cpp"),
     os.path.join(LIB_DIR, "RSTNNode.cpp"),
+    os.path.join(LIB_DIR, "RSTNKernel.cpp"),
+    os.path.join(LIB_DIR, "RSTNDispatch.cpp"),
+    os.path.join(LIB_DIR, "RSTNReference.cpp"),
+    os.path.join(LIB_DIR, "RSTNStencil.cpp"),
 ]
 
 # コンパイルオプション
-extra_compile_args = ['-O3', '-fopenmp', '-std=c++17']
+# -fno-trapping-math: 浮動小数点例外を捕捉しない前提で条件分岐のマスク選択化 (ベクトル化) を許可する。
+#                     演算結果 (丸め) は変わらない。
+# -ffp-contract=off:  FMA への縮約を禁止し、命令セット別のカーネル (下記) でも同じ丸め結果にする。
+extra_compile_args = ['-O3', '-fopenmp', '-std=c++17', '-fno-trapping-math', '-ffp-contract=off']
 extra_link_args = ['-fopenmp']
 
+# 環境変数 RSTN_PROFILE=0 でビルドすると、step のフェーズ別計測 (RSTNProfile.hpp) を除去する
+define_macros = []
+if os.environ.get("RSTN_PROFILE") == "0":
+    define_macros.append(("RSTN_PROFILE", "0"))
+
+# 命令セット別のカーネル (RSTNKernelVariant.cpp を命令セットごとにコンパイルし、実行時に CPUID で選択する)
+KERNEL_VARIANTS = [
+    ("avx2", ['-mavx2', '-mfma']),
+    ("avx512", ['-mavx512f', '-mavx512dq', '-mavx512bw', '-mavx512vl', '-mfma',
+                '-mprefer-vector-width=512']),
+]
+
+
+def kernel_variants_supported():
+    # GCC/Clang でビルドする x86-64 環境のみ (それ以外は baseline のみ)
+    return platform.machine().lower() in ("x86_64", "amd64") and os.name == "posix"
+
+
+class BuildExtWithKernelVariants(build_ext):
+    """カーネルの命令セット別実装を追加でコンパイルしてリンクする build_ext"""
+
+    def build_extension(self, ext):
+        if kernel_variants_supported():
+            objects = []
+            for name, flags in KERNEL_VARIANTS:
+                objects += self.compiler.compile(
+                    [os.path.join(LIB_DIR, "RSTNKernelVariant.cpp")],
+                    output_dir=os.path.join(self.build_temp, "kernel_" + name),
+                    macros=list(ext.define_macros) + [("RSTN_ISA_NAMESPACE", "rstn_isa_" + name),
+                                                      ("RSTN_ISA_NAME", '"%s"' % name)],
+                    include_dirs=ext.include_dirs,
+                    extra_postargs=ext.extra_compile_args + flags,
+                    depends=ext.depends,
+                )
+                ext.define_macros.append(("RSTN_KERNEL_" + name.upper(), "1"))
+            # 命令セット別のオブジェクトはリンク順の最後に置く
+            # (インライン関数などの重複定義は先に現れる baseline 側が採用される)
+            ext.extra_objects = list(ext.extra_objects or []) + objects
+        super().build_extension(ext)
+
+
 # 拡張モジュールの定義
 ext_modules = [
     Extension(
@@ -25,6 +75,7 @@ ext_modules = [
             pybind11.get_include(),
             LIB_DIR               # <--- 重要: .hpp ファイルを探す場所を指定
         ],
+        define_macros=define_macros,
         extra_compile_args=extra_compile_args,
         extra_link_args=extra_link_args,
         language='c++'
@@ -34,6 +85,8 @@ ext_modules = [
 setup(
     name="rstn_cpp",
     version="1.1.0",
+    packages=["rstn"],            # バックエンド選択と NumPy 版エンジン (rstn/__init__.py)
     ext_modules=ext_modules,
+    cmdclass={'build_ext': BuildExtWithKernelVariants},
     setup_requires=['pybind11'],
 )
\ No newline at end of file